@@ -0,0 +1,188 @@
+"""Component micro-benchmarks with stored baselines.
+
+Times PDFService.extract_text_from_pdf, PDFService.chunk_text, TextStorage.search_text
+and VectorService.search_similar in isolation against synthetic PDFs, and compares
+the results with a JSON baseline.
+
+    python -m benchmarks.component_bench                    # run and compare
+    python -m benchmarks.component_bench --update-baseline  # run and store as baseline
+    python -m benchmarks.component_bench --sizes 5,50 --threshold 0.25
+
+Exits with status 1 when any benchmark's p50 latency or peak memory regresses by more
+than --threshold (fraction) against the baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, Any, List
+
+from benchmarks.synthetic_pdf import make_pdf
+from config import Config
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+QUERIES = ["solve the equation", "derivative of a function", "triangle area theorem", "probability example"]
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def measure(fn: Callable[[], Any], repeat: int, items: int) -> Dict[str, float]:
+    """Time fn `repeat` times, then run it once more under tracemalloc for peak memory"""
+    fn()  # warm-up
+
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mean = statistics.mean(latencies)
+    return {
+        "runs": repeat,
+        "items_per_run": items,
+        "mean_ms": mean * 1000,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput_per_s": items / mean if mean > 0 else 0.0,
+        "peak_memory_kb": peak / 1024
+    }
+
+def run_benchmarks(sizes: List[int], repeat: int, vector_docs: int) -> Dict[str, Dict[str, float]]:
+    workdir = tempfile.mkdtemp(prefix="llm_note_bench_")
+    Config.SQLITE_DB_PATH = os.path.join(workdir, "metadata.db")
+    Config.CHROMADB_PATH = os.path.join(workdir, "chromadb")
+
+    try:
+        # Imported after the paths are redirected so nothing touches the real data directory
+        from models.text_storage import TextStorage
+        from services.llm_providers import FakeProvider
+        from services.pdf_service import PDFService
+        from services.vector_service import VectorService
+
+        pdf_service = PDFService()
+        text_storage = TextStorage()
+        results = {}
+
+        for pages in sizes:
+            pdf_bytes = make_pdf(pages)
+            extracted = asyncio.run(pdf_service.extract_text_from_pdf(pdf_bytes))
+            text = extracted["total_text"]
+            chunks = pdf_service.chunk_text(text)
+            file_id = f"bench-{pages}"
+            text_storage.store_text_chunks(file_id, chunks)
+
+            results[f"extract_text_from_pdf[{pages}p]"] = measure(
+                lambda: asyncio.run(pdf_service.extract_text_from_pdf(pdf_bytes)), repeat, pages
+            )
+            results[f"chunk_text[{pages}p]"] = measure(
+                lambda: pdf_service.chunk_text(text), repeat, len(text)
+            )
+
+            def search():
+                for query in QUERIES:
+                    text_storage.search_text(file_id, query, limit=3)
+            results[f"search_text[{pages}p]"] = measure(search, repeat, len(QUERIES))
+
+        # Vector search over a collection of fake embeddings
+        provider = FakeProvider(generate_latency_ms=0, embed_latency_ms=0, error_rate=0)
+        vector_service = VectorService()
+        docs = [f"synthetic chunk {i} " + " ".join(QUERIES) for i in range(vector_docs)]
+        embeddings = [provider.embedding_for(doc) for doc in docs]
+        for i in range(0, vector_docs, 1000):
+            asyncio.run(vector_service.add_documents(
+                docs[i:i + 1000], embeddings[i:i + 1000],
+                [{"file_id": "bench", "chunk_index": j, "chunk_type": "general_text"}
+                 for j in range(i, min(i + 1000, vector_docs))]
+            ))
+        query_embeddings = [provider.embedding_for(query) for query in QUERIES]
+
+        def vector_search():
+            for embedding in query_embeddings:
+                asyncio.run(vector_service.search_similar(embedding, n_results=5))
+        results[f"search_similar[{vector_docs}docs]"] = measure(vector_search, repeat, len(QUERIES))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return results
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[str]:
+    """Return a description of every metric that regressed past the threshold"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "peak_memory_kb"):
+            if previous[metric] > 0 and current[metric] > previous[metric] * (1 + threshold):
+                change = (current[metric] / previous[metric] - 1) * 100
+                regressions.append(f"{name} {metric}: {previous[metric]:.2f} -> {current[metric]:.2f} (+{change:.0f}%)")
+    return regressions
+
+def print_table(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]]):
+    print(f"{'benchmark':38} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'items/s':>12} {'peak KB':>10} {'vs base':>8}")
+    for name, r in results.items():
+        previous = baseline.get(name)
+        delta = f"{(r['p50_ms'] / previous['p50_ms'] - 1) * 100:+.0f}%" if previous and previous["p50_ms"] else "-"
+        print(f"{name:38} {r['p50_ms']:10.2f} {r['p95_ms']:10.2f} {r['p99_ms']:10.2f} "
+              f"{r['throughput_per_s']:12.1f} {r['peak_memory_kb']:10.0f} {delta:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Component micro-benchmarks")
+    parser.add_argument("--sizes", default="5,50,200", help="Comma-separated synthetic PDF page counts")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per benchmark")
+    parser.add_argument("--vector-docs", type=int, default=5000, help="Documents in the vector search collection")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed regression as a fraction (0.2 = 20%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    results = run_benchmarks(sizes, args.repeat, args.vector_docs)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+
+    print_table(results, baseline)
+
+    if args.update_baseline or not baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results
+            }, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+
+    print(f"\nNo regressions beyond {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
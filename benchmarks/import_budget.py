@@ -0,0 +1,90 @@
+"""Import-time budget check.
+
+Imports the app in a fresh interpreter with `python -X importtime` and reports what each
+module costs at startup, so heavy dependencies creeping back onto the import path show up
+before they slow down every worker.
+
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --budget-ms 400 --top 30
+
+Exits with status 1 when `import main` takes longer than the budget or when one of the
+deferred modules (chromadb, onnxruntime, google.generativeai) is imported at startup.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from config import Config
+
+# Only needed once a service is built; importing them at startup is a regression
+DEFERRED_MODULES = ("chromadb", "onnxruntime", "google.generativeai")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def measure(target: str = "main") -> List[Tuple[str, int, int, int]]:
+    """Return (module, self_us, cumulative_us, depth) for every module imported by `import target`"""
+    env = {**os.environ, "LLM_PROVIDER": os.environ.get("LLM_PROVIDER", "fake")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True, text=True, env=env
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {target} failed:\n{result.stderr[-2000:]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return modules
+
+def top_level_costs(modules: List[Tuple[str, int, int, int]]) -> Dict[str, int]:
+    """Own import time summed per top-level package"""
+    costs: Dict[str, int] = {}
+    for name, self_us, _, _ in modules:
+        package = name.split(".")[0]
+        costs[package] = costs.get(package, 0) + self_us
+    return costs
+
+def main():
+    parser = argparse.ArgumentParser(description="Report and enforce the app's import-time budget")
+    parser.add_argument("--target", default="main", help="Module to import")
+    parser.add_argument("--budget-ms", type=float, default=Config.IMPORT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=20, help="Modules to list")
+    parser.add_argument("--runs", type=int, default=3, help="Take the fastest of N runs to reduce noise")
+    args = parser.parse_args()
+
+    runs = [measure(args.target) for _ in range(args.runs)]
+    modules = min(runs, key=lambda mods: next((c for n, _, c, _ in mods if n == args.target), 0))
+    total_us = next((c for name, _, c, _ in modules if name == args.target), 0)
+
+    print(f"import {args.target}: {total_us / 1000:.0f}ms (budget {args.budget_ms:.0f}ms), "
+          f"{len(modules)} modules")
+
+    print(f"\n{'self ms':>9} {'cumul ms':>9}  module (slowest by own import time)")
+    for name, self_us, cumulative_us, _ in sorted(modules, key=lambda m: m[1], reverse=True)[:args.top]:
+        print(f"{self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}  {name}")
+
+    print(f"\n{'ms':>9}  package (sum of own import time)")
+    for package, us in sorted(top_level_costs(modules).items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{us / 1000:9.1f}  {package}")
+
+    failed = False
+    imported = {name for name, _, _, _ in modules}
+    eager = [module for module in DEFERRED_MODULES if module in imported]
+    if eager:
+        print(f"\nFAIL: deferred modules imported at startup: {', '.join(eager)}")
+        failed = True
+    if total_us / 1000 > args.budget_ms:
+        print(f"\nFAIL: import {args.target} took {total_us / 1000:.0f}ms, over the {args.budget_ms:.0f}ms budget")
+        failed = True
+    if not failed:
+        print("\nOK")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
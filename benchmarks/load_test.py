@@ -0,0 +1,259 @@
+"""End-to-end concurrent load generator.
+
+Drives the FastAPI app either in-process (default; the fake model provider is used and
+all data goes to a temporary directory) or over HTTP against a running server, with an
+open-loop Poisson arrival process at a target request rate.
+
+    python -m benchmarks.load_test --rate 20 --duration 30
+    python -m benchmarks.load_test --mix chat=10,progress=5,pdf=3,upload_fast=1,upload=1
+    python -m benchmarks.load_test --base-url http://localhost:8000 --rate 50
+    python -m benchmarks.load_test --find-saturation --slo-p95-ms 2000
+
+When targeting a running server, start it with LLM_PROVIDER=fake so the load test does
+not spend API quota. Reports p50/p95/p99 latency, throughput and error rate per endpoint.
+With --find-saturation the rate is raised step by step until the p95 SLO or the error
+budget breaks, or a backlog builds up that takes longer than the SLO to drain, and the
+last sustainable rate is reported.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Any, Optional, Tuple
+
+import httpx
+
+from benchmarks.component_bench import percentile
+from benchmarks.synthetic_pdf import make_pdf
+
+DEFAULT_MIX = {"chat": 10, "progress": 5, "pdf": 3, "upload_fast": 1, "upload": 1}
+QUESTIONS = [
+    "How do I solve this equation?",
+    "Explain the theorem in section 3",
+    "What is the derivative of this function?",
+    "Why does the triangle area formula work?",
+    "Give me an example problem about probability",
+]
+
+def build_in_process_client() -> Tuple[httpx.AsyncClient, str]:
+    """Import the app against a throwaway data directory with the fake model provider;
+    returns the client and the directory, which the caller removes"""
+    os.environ["LLM_PROVIDER"] = "fake"
+    from config import Config
+
+    workdir = tempfile.mkdtemp(prefix="llm_note_load_")
+    Config.LLM_PROVIDER = "fake"
+    Config.SQLITE_DB_PATH = os.path.join(workdir, "metadata.db")
+    Config.CHROMADB_PATH = os.path.join(workdir, "chromadb")
+    Config.UPLOAD_DIR = os.path.join(workdir, "uploads")
+
+    import main
+    transport = httpx.ASGITransport(app=main.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=120), workdir
+
+class LoadGenerator:
+    """Issue a weighted mix of operations at a target rate and record per-endpoint latency"""
+
+    def __init__(self, client: httpx.AsyncClient, mix: Dict[str, int], seed: int = 0,
+                 max_in_flight: int = 1000):
+        self.client = client
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.rng = random.Random(seed)
+        self.max_in_flight = max_in_flight
+        self.file_ids: List[str] = []
+        self.progress_ids: List[str] = []
+        self.session_ids: List[str] = []
+        self.pdfs = [make_pdf(pages, seed=i) for i, pages in enumerate((2, 5, 10))]
+
+    async def setup(self, documents: int = 3):
+        """Seed documents and sessions for the read-heavy operations"""
+        for i in range(documents):
+            response = await self.client.post(
+                "/upload-pdf",
+                files={"file": (f"seed-{i}.pdf", self.pdfs[i % len(self.pdfs)], "application/pdf")}
+            )
+            response.raise_for_status()
+            file_id = response.json()["file_id"]
+            self.file_ids.append(file_id)
+            self.progress_ids.append(file_id)
+
+            response = await self.client.post("/sessions", json={"file_ids": [file_id]})
+            response.raise_for_status()
+            self.session_ids.append(response.json()["session_id"])
+
+    async def _request(self, operation: str) -> httpx.Response:
+        if operation == "chat":
+            session_id = self.rng.choice(self.session_ids)
+            return await self.client.post(f"/sessions/{session_id}/chat",
+                                          json={"message": self.rng.choice(QUESTIONS)})
+        if operation == "progress":
+            return await self.client.get(f"/progress/{self.rng.choice(self.progress_ids)}")
+        if operation == "pdf":
+            return await self.client.get(f"/files/{self.rng.choice(self.file_ids)}/pdf")
+        if operation in ("upload", "upload_fast"):
+            path = "/upload-pdf" if operation == "upload" else "/upload-pdf-fast"
+            pdf = self.rng.choice(self.pdfs)
+            response = await self.client.post(path, files={"file": ("load.pdf", pdf, "application/pdf")})
+            if response.status_code == 200 and operation == "upload":
+                self.progress_ids.append(response.json()["file_id"])
+            return response
+        raise ValueError(f"Unknown operation: {operation}")
+
+    async def _timed(self, operation: str, samples: Dict[str, List], semaphore: asyncio.Semaphore):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await self._request(operation)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            samples[operation].append((time.perf_counter() - start, ok))
+
+    async def run(self, rate: float, duration: float) -> Dict[str, Any]:
+        """Open-loop run: arrivals follow a Poisson process regardless of response times"""
+        samples: Dict[str, List] = defaultdict(list)
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        tasks = []
+
+        start = time.perf_counter()
+        next_arrival = start
+        while next_arrival - start < duration:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            operation = self.rng.choices(self.operations, self.weights)[0]
+            tasks.append(asyncio.create_task(self._timed(operation, samples, semaphore)))
+            next_arrival += self.rng.expovariate(rate)
+
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        return summarize(samples, elapsed, rate, duration)
+
+def summarize(samples: Dict[str, List], elapsed: float, rate: float, duration: float) -> Dict[str, Any]:
+    endpoints = {}
+    all_latencies = []
+    all_errors = 0
+    for operation, entries in sorted(samples.items()):
+        latencies = [latency for latency, _ in entries]
+        errors = sum(1 for _, ok in entries if not ok)
+        all_latencies.extend(latencies)
+        all_errors += errors
+        endpoints[operation] = {
+            "requests": len(entries),
+            "throughput_rps": len(entries) / elapsed,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "error_rate": errors / len(entries)
+        }
+
+    total = len(all_latencies)
+    return {
+        "target_rps": rate,
+        "duration_s": duration,
+        "elapsed_s": elapsed,
+        "offered_rps": total / duration if duration else 0.0,
+        "endpoints": endpoints,
+        "overall": {
+            "requests": total,
+            "throughput_rps": total / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(all_latencies, 50) * 1000 if total else 0.0,
+            "p95_ms": percentile(all_latencies, 95) * 1000 if total else 0.0,
+            "p99_ms": percentile(all_latencies, 99) * 1000 if total else 0.0,
+            "error_rate": all_errors / total if total else 0.0
+        }
+    }
+
+def print_report(report: Dict[str, Any]):
+    print(f"\nTarget {report['target_rps']:.1f} req/s, offered {report['offered_rps']:.1f} req/s "
+          f"over {report['duration_s']:.0f}s (drained after {report['elapsed_s']:.1f}s)")
+    print(f"{'endpoint':14} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8}")
+    rows = list(report["endpoints"].items()) + [("overall", report["overall"])]
+    for name, r in rows:
+        print(f"{name:14} {r['requests']:9d} {r['throughput_rps']:8.1f} {r['p50_ms']:9.1f} "
+              f"{r['p95_ms']:9.1f} {r['p99_ms']:9.1f} {r['error_rate']:8.1%}")
+
+def sustainable(report: Dict[str, Any], slo_p95_ms: float, max_error_rate: float) -> bool:
+    """Within SLO, within error budget, and no backlog left to drain once arrivals stop"""
+    overall = report["overall"]
+    backlog_s = report["elapsed_s"] - report["duration_s"]
+    return (overall["p95_ms"] <= slo_p95_ms
+            and overall["error_rate"] <= max_error_rate
+            and backlog_s <= slo_p95_ms / 1000)
+
+async def find_saturation(generator: LoadGenerator, start_rate: float, max_rate: float, step: float,
+                          duration: float, slo_p95_ms: float, max_error_rate: float) -> Optional[float]:
+    """Raise the rate geometrically until the node stops keeping up; return the last good rate"""
+    best = None
+    rate = start_rate
+    while rate <= max_rate:
+        report = await generator.run(rate, duration)
+        print_report(report)
+        if not sustainable(report, slo_p95_ms, max_error_rate):
+            print(f"-> {rate:.1f} req/s is past saturation")
+            break
+        best = rate
+        rate *= step
+    return best
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown operation '{name}', expected one of {list(DEFAULT_MIX)}")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+async def run(args) -> int:
+    workdir = None
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=120)
+    else:
+        client, workdir = build_in_process_client()
+
+    try:
+        async with client:
+            generator = LoadGenerator(client, args.mix, seed=args.seed, max_in_flight=args.max_in_flight)
+            await generator.setup(args.documents)
+
+            if args.find_saturation:
+                best = await find_saturation(generator, args.rate, args.max_rate, args.step,
+                                             args.duration, args.slo_p95_ms, args.max_error_rate)
+                if best is None:
+                    print(f"\nStarting rate {args.rate:.1f} req/s is already past saturation")
+                    return 1
+                print(f"\nSaturation point: ~{best:.1f} req/s "
+                      f"(p95 <= {args.slo_p95_ms:.0f}ms, errors <= {args.max_error_rate:.0%})")
+            else:
+                print_report(await generator.run(args.rate, args.duration))
+        return 0
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end concurrent load generator")
+    parser.add_argument("--base-url", help="Target a running server instead of the in-process app")
+    parser.add_argument("--rate", type=float, default=10.0, help="Target requests per second (start rate with --find-saturation)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per run (per step with --find-saturation)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="Operation weights, e.g. chat=10,progress=5")
+    parser.add_argument("--documents", type=int, default=3, help="Documents and sessions seeded before the run")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Cap on concurrent requests")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--find-saturation", action="store_true", help="Step the rate up until the SLO breaks")
+    parser.add_argument("--max-rate", type=float, default=1000.0)
+    parser.add_argument("--step", type=float, default=1.5, help="Rate multiplier between saturation steps")
+    parser.add_argument("--slo-p95-ms", type=float, default=2000.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    args = parser.parse_args()
+    return asyncio.run(run(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
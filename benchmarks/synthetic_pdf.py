@@ -0,0 +1,31 @@
+import io
+import random
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+_WORDS = (
+    "equation solve derivative integral matrix vector probability function limit graph "
+    "theorem proof example exercise solution problem answer value variable constant "
+    "triangle angle area volume rate change sum product series sequence"
+).split()
+
+def make_pdf(pages: int, lines_per_page: int = 45, seed: int = 0) -> bytes:
+    """Build a text PDF of the given page count with reproducible pseudo-textbook content"""
+    rng = random.Random(seed)
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    for page in range(pages):
+        pdf.setFont("Helvetica", 10)
+        y = height - 50
+        pdf.drawString(40, y, f"Chapter {page // 10 + 1} - Section {page + 1}")
+        y -= 20
+        for line in range(lines_per_page):
+            words = " ".join(rng.choice(_WORDS) for _ in range(14))
+            pdf.drawString(40, y, f"{line + 1}. {words}.")
+            y -= 15
+        pdf.showPage()
+
+    pdf.save()
+    return buffer.getvalue()
@@ -1,6 +1,5 @@
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
 
 load_dotenv()
 
@@ -9,6 +8,37 @@ class Config:
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
     GEMINI_MODEL = "gemini-1.5-flash"  # Using 1.5-flash for cost efficiency in prototype
     EMBEDDING_MODEL = "models/text-embedding-004"
+    EMBEDDING_DIMENSION = 768
+    EMBEDDING_BATCH_SIZE = 100  # Texts per embedding request (the Gemini API limit)
+    
+    # Model provider: "gemini", or "fake" for offline load and regression testing
+    LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+    FAKE_GENERATE_LATENCY_MS = float(os.getenv("FAKE_GENERATE_LATENCY_MS", "0"))
+    FAKE_EMBED_LATENCY_MS = float(os.getenv("FAKE_EMBED_LATENCY_MS", "0"))
+    FAKE_ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))  # 0.0 - 1.0
+    FAKE_SEED = int(os.getenv("FAKE_SEED", "0"))
+    
+    # Model call resilience: retries with backoff, hedged requests, circuit breaker
+    MODEL_CALL_TIMEOUT_SECONDS = float(os.getenv("MODEL_CALL_TIMEOUT_SECONDS", "60"))
+    MODEL_RETRY_ATTEMPTS = int(os.getenv("MODEL_RETRY_ATTEMPTS", "3"))  # Including the first try
+    MODEL_RETRY_BASE_DELAY = 0.5  # Seconds; full jitter up to base * 2**attempt
+    MODEL_RETRY_MAX_DELAY = 8.0
+    # Operations that send a duplicate request once the first is slower than the percentile
+    MODEL_HEDGE_OPERATIONS = [op for op in os.getenv("MODEL_HEDGE_OPERATIONS", "query_embed").split(",") if op]
+    MODEL_HEDGE_PERCENTILE = 95
+    MODEL_HEDGE_MIN_SAMPLES = 20  # Latencies seen before hedging starts
+    CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive failed attempts that open the circuit
+    CIRCUIT_RESET_SECONDS = 30.0  # How long an open circuit rejects calls before probing
+    
+    # Provider quota per model, modelled with token buckets; 0 disables a limit
+    QUOTA_GENERATE_RPM = int(os.getenv("QUOTA_GENERATE_RPM", "1000"))
+    QUOTA_GENERATE_TPM = int(os.getenv("QUOTA_GENERATE_TPM", "1000000"))
+    QUOTA_EMBED_RPM = int(os.getenv("QUOTA_EMBED_RPM", "1500"))  # Each text in a batch counts as a request
+    QUOTA_EMBED_TPM = int(os.getenv("QUOTA_EMBED_TPM", "0"))
+    QUOTA_INTERACTIVE_RESERVE = 0.2  # Share of each budget that batch work leaves for chat
+    QUOTA_EXPECTED_OUTPUT_TOKENS = 400  # Reserved per generation, settled once the answer arrives
+    QUOTA_IMAGE_TOKENS = 258  # Gemini bills an image as a fixed number of tokens
+    QUOTA_POLL_SECONDS = 0.05  # How often batch calls re-check while interactive calls wait
     
     # Database
     SQLITE_DB_PATH = "data/metadata.db"
@@ -20,12 +50,124 @@ class Config:
     
     # Text processing
     CHUNK_SIZE = 2000  # Larger chunks = fewer API calls
-    CHUNK_OVERLAP = 300
+    CHUNK_OVERLAP = 300  # Characters repeated from the end of the previous chunk
+    CHUNKER_VERSION = 2  # Bump whenever chunk_text output changes for the same settings
+    
+    # Re-indexing after chunking/embedding settings change
+    REINDEX_BATCH_SIZE = 20  # Chunks embedded per batch
+    REINDEX_PAUSE_SECONDS = 1.0  # Pause between batches so live traffic keeps its API quota
+    
+    # PDF delivery to the viewer
+    PAGE_CACHE_DIR = "data/page_cache"  # Page ranges split out of stored PDFs
+    PAGE_RANGE_MAX_PAGES = 20  # Pages per /files/{id}/pages request
+    PDF_CACHE_MAX_AGE = 365 * 24 * 3600  # Stored PDFs never change, so browsers may keep them
+    
+    # Static assets: fingerprinted URLs, served from precompressed gzip/brotli variants
+    STATIC_BUILD_DIR = "data/static_build"
+    STATIC_GZIP_LEVEL = 9
+    STATIC_BROTLI_QUALITY = 11  # Used when the brotli package is installed
+    STATIC_CACHE_MAX_AGE = 365 * 24 * 3600
+    
+    # Ingestion pipeline, shared by single and bulk uploads
+    INGEST_EXTRACT_CONCURRENCY = int(os.getenv("INGEST_EXTRACT_CONCURRENCY", "2"))  # PDFs parsed at once
+    INGEST_EMBED_CONCURRENCY = int(os.getenv("INGEST_EMBED_CONCURRENCY", "2"))  # PDFs embedding at once
+    INGEST_MEMORY_BUDGET_MB = int(os.getenv("INGEST_MEMORY_BUDGET_MB", "512"))  # For all PDFs in flight
+    INGEST_MEMORY_FACTOR = 4  # Estimated peak memory of an ingestion as a multiple of the PDF size
+    BULK_DIR = "data/bulk"  # Bulk job manifests and staged uploads
+    BULK_MAX_FILES = 100  # Files per /upload-pdfs request
+    BULK_MAX_AREAS = 200  # Areas per /files/{id}/areas/bulk request
+    
+    # Translation
+    TRANSLATION_MAX_SEGMENT_CHARS = 1200  # Longer paragraphs are split into sentences
+    TRANSLATION_BATCH_CHARS = 6000  # Max source characters per batched prompt
+    TRANSLATION_BATCH_SEGMENTS = 20
+    TRANSLATION_CONCURRENCY = 4  # Batched prompts in flight at once
+    
+    # Prompt assembly
+    PROMPT_TOKEN_BUDGET = 4000  # Estimated tokens for the whole chat prompt
+    PROMPT_HISTORY_TOKENS = 800  # Max share of the budget for conversation history
+    PROMPT_MIN_SNIPPET_TOKENS = 60  # Skip truncated items smaller than this
+    PROMPT_MERGE_NEIGHBOR_WEIGHT = 0.25  # Share of the other hits' scores a merged chunk span gains
+    
+    # Admission control: interactive (chat, translate) work goes before batch (ingestion, areas)
+    ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))  # Slots shared by both lanes
+    ADMISSION_BATCH_MAX_CONCURRENT = int(os.getenv("ADMISSION_BATCH_MAX_CONCURRENT", "3"))
+    ADMISSION_INTERACTIVE_QUEUE = 32  # Waiting requests per lane before answering 429
+    ADMISSION_BATCH_QUEUE = 8
+    ADMISSION_QUEUE_TIMEOUT_SECONDS = 15.0
+    ADMISSION_SESSION_MAX_CONCURRENT = 2  # Requests in flight per chat session
+    
+    # Retrieval for a chat turn runs for all session documents at once; late ones are left out
+    RETRIEVAL_DEADLINE_SECONDS = 5.0
+    
+    # Problem/solution area retrieval
+    AREA_SEARCH_RESULTS = 3  # Areas retrieved per document, ranked by distance to the question
+    AREA_PAIR_MAX_SOLUTIONS = 2  # Solutions linked to each problem area
+    AREA_PAIR_MIN_SCORE = 0.5  # Beyond the best one, solutions need at least this pairing score
+    AREA_PAIR_SIMILARITY_WEIGHT = 0.5  # Share of embedding similarity vs page proximity in the score
+    
+    # Conversation summaries
+    SUMMARY_EVERY_TURNS = 4  # Fold older messages into the summary every K turns
+    SUMMARY_KEEP_MESSAGES = 4  # Most recent raw messages kept verbatim in the prompt
+    SUMMARY_MAX_WORDS = 200
+    
+    # Vision question images
+    MAX_IMAGE_PAYLOAD = 15 * 1024 * 1024  # Decoded size limit, checked before decoding
+    MAX_IMAGE_PIXELS = 50_000_000
+    IMAGE_MAX_SIDE = 1600  # Longest side after downscaling
+    IMAGE_MAX_BYTES = 400 * 1024  # Target size of the re-encoded image
+    IMAGE_FORMAT = "JPEG"  # or "WEBP"
+    IMAGE_GRAYSCALE_SATURATION = 12  # Mean HSV saturation (0-255) below which images go grayscale
+    IMAGE_CACHE_SIZE = 64
+    
+    # Request tracing and profiling
+    TRACE_SLOWEST_N = 50  # Slowest request traces kept for /debug/traces
+    # Honour the X-Profile header (with the debug token). The sampler sees the whole event loop
+    # thread, so a profile includes every request running at the same time, not just the caller's
+    REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "0") == "1"
+    DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")  # X-Debug-Token for /debug routes; unset disables them
+    PROFILE_SAMPLE_INTERVAL_MS = 5
+    PROFILE_KEEP_N = 20
+    
+    # Upload progress: "memory" (single worker) or "sqlite" (shared between worker processes)
+    PROGRESS_STORE = os.getenv("PROGRESS_STORE", "memory")
+    PROGRESS_DB_PATH = os.getenv("PROGRESS_DB_PATH")  # Defaults to SQLITE_DB_PATH
+    PROGRESS_RETENTION_SECONDS = 300  # Finished uploads stay visible this long
+    PROGRESS_STALE_SECONDS = 3600  # Unfinished records left by a dead worker expire after this
+    PROGRESS_POLL_INTERVAL = 0.5  # Seconds between shared-store polls for uploads on other workers
+    PROGRESS_HEARTBEAT_SECONDS = 15
+    PROGRESS_WAIT_SECONDS = 30  # How long an event stream waits for an upload to start
+    
+    # Opt-in tracemalloc profiling of uploads (slows ingestion noticeably)
+    MEMORY_PROFILING = os.getenv("MEMORY_PROFILING", "0") == "1"
+    MEMORY_REPORT_DIR = "data/memory_reports"
+    MEMORY_REPORT_TOP_N = 15  # Top allocation sites per stage in the report
+    MEMORY_TRACE_FRAMES = 5
+    
+    # Server processes
+    WORKERS = int(os.getenv("WORKERS", "1"))
+    # Set to 0 in worker processes once a parent process has created the SQLite tables
+    INIT_SCHEMA = os.getenv("INIT_SCHEMA", "1") == "1"
+    # Build the heavy services (Chroma, model client) in the background right after startup
+    WARM_SERVICES = os.getenv("WARM_SERVICES", "1") == "1"
+    IMPORT_BUDGET_MS = 500  # benchmarks/import_budget.py fails when `import main` takes longer
+    
+    @classmethod
+    def embedding_version(cls) -> str:
+        """Identifies which embedding space a vector lives in"""
+        return f"{cls.LLM_PROVIDER}:{cls.EMBEDDING_MODEL}:{cls.EMBEDDING_DIMENSION}"
+    
+    @classmethod
+    def pipeline_version(cls) -> str:
+        """Fingerprint of every setting that determines chunk text and vectors"""
+        return f"chunker-{cls.CHUNKER_VERSION}:{cls.CHUNK_SIZE}:{cls.CHUNK_OVERLAP}|{cls.embedding_version()}"
     
     @classmethod
     def initialize_gemini(cls):
         """Initialize Gemini API with API key"""
         if not cls.GOOGLE_API_KEY:
             raise ValueError("GOOGLE_API_KEY not found in environment variables")
+        # Imported here: the client library takes ~0.6s to import and the fake provider never needs it
+        import google.generativeai as genai
         genai.configure(api_key=cls.GOOGLE_API_KEY)
         return genai
\ No newline at end of file
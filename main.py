@@ -1,21 +1,45 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse, Response
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, FileResponse, Response, PlainTextResponse, StreamingResponse
 import os
 import uvicorn
 import uuid
 import logging
 import sqlite3
+import asyncio
+import hashlib
+import json
+import weakref
+import argparse
+from contextlib import asynccontextmanager
+from typing import Optional, List
 from dotenv import load_dotenv
 
 from services.pdf_service import PDFService
 from services.gemini_service import GeminiService
 from services.vector_service import VectorService
+from services.translation_service import TranslationService
+from services.context_packer import ContextPacker
+from services.conversation_summarizer import ConversationSummarizer
+from services.image_service import image_preprocessor, ImageTooLargeError
+from services.metrics import (metrics, instrument_service, instrument_image_cache, instrument_quota, MetricsMiddleware,
+                              ACTIVE_UPLOADS)
+from services.tracing import trace_store, trace_service, debug_token_valid, TracingMiddleware
+from services.container import ServiceContainer
+from services.reindex_service import ReindexService
+from services.ingestion_service import IngestionService, BulkIngestion, UploadTooLargeError
+from services.page_cache import PageCache, parse_page_range
+from services.area_pairing import AreaPairingService, area_vector_metadata
+from services.resilience import CircuitOpenError
+from services.admission import admission, AdmissionRejected, INTERACTIVE, BATCH
+from services.quota import quota_scheduler
+from services.static_assets import StaticAssets, FingerprintedStaticFiles, accepted_encodings
+from services.memory_profiler import IngestionMemoryProfiler
 from models.database import DatabaseManager
-from models.progress_tracker import progress_tracker, ProcessingStage
+from models.progress_tracker import progress_tracker, SQLiteProgressStore
 from models.text_storage import TextStorage
 from models.chat_session import ChatSessionManager
+from models.translation_cache import TranslationCache
 from config import Config
 
 # Load environment variables
@@ -25,7 +49,78 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="LLM Learning Assistant", version="1.0.0")
+# Services are built on first use, once per worker process. The module-level names below
+# are lazy stand-ins, so importing this module stays cheap and endpoints use them as before.
+services = ServiceContainer()
+services.register("pdf_service", lambda c: PDFService())
+services.register("gemini_service", lambda c: GeminiService())
+services.register("vector_service", lambda c: VectorService())
+services.register("db", lambda c: DatabaseManager())
+services.register("text_storage", lambda c: TextStorage())
+services.register("chat_manager", lambda c: ChatSessionManager())
+services.register("translation_cache", lambda c: TranslationCache())
+services.register("translation_service",
+                  lambda c: TranslationService(c.get("gemini_service"), c.get("translation_cache")))
+services.register("context_packer", lambda c: ContextPacker())
+services.register("reindex_service",
+                  lambda c: ReindexService(c.get("pdf_service"), c.get("gemini_service"), c.get("vector_service"),
+                                           c.get("text_storage"), c.get("db"), lock_for=content_lock,
+                                           area_pairing=c.get("area_pairing")))
+services.register("ingestion_service",
+                  lambda c: IngestionService(c.get("pdf_service"), c.get("gemini_service"), c.get("vector_service"),
+                                             c.get("text_storage"), c.get("db"), progress_tracker,
+                                             lock_for=content_lock, page_cache=c.get("page_cache")))
+services.register("page_cache", lambda c: PageCache())
+services.register("area_pairing", lambda c: AreaPairingService(c.get("db"), c.get("vector_service")))
+services.register("bulk_ingestion",
+                  lambda c: BulkIngestion(c.get("ingestion_service"), progress_tracker, admission=admission))
+services.register("conversation_summarizer",
+                  lambda c: ConversationSummarizer(c.get("gemini_service"), c.get("chat_manager")))
+
+# Per-stage latency, model call and SQLite metrics, then spans (both wrap methods in place)
+services.add_build_hook(lambda name, service: instrument_service(name, service, ContextPacker.estimate_tokens))
+services.add_build_hook(trace_service)
+instrument_image_cache(image_preprocessor)
+instrument_quota(quota_scheduler)
+
+pdf_service = services.lazy("pdf_service")
+gemini_service = services.lazy("gemini_service")
+vector_service = services.lazy("vector_service")
+db = services.lazy("db")
+text_storage = services.lazy("text_storage")
+chat_manager = services.lazy("chat_manager")
+translation_cache = services.lazy("translation_cache")
+translation_service = services.lazy("translation_service")
+context_packer = services.lazy("context_packer")
+conversation_summarizer = services.lazy("conversation_summarizer")
+reindex_service = services.lazy("reindex_service")
+ingestion_service = services.lazy("ingestion_service")
+bulk_ingestion = services.lazy("bulk_ingestion")
+page_cache = services.lazy("page_cache")
+area_pairing = services.lazy("area_pairing")
+
+# SQLite-backed services are cheap; the rest are warmed in the background after startup
+STARTUP_SERVICES = ["db", "text_storage", "chat_manager", "translation_cache"]
+WARM_SERVICES = ["pdf_service", "gemini_service", "vector_service"]
+
+# Fingerprinted, precompressed static files; hashing and compression happen on first use
+static_assets = StaticAssets("static")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for name in STARTUP_SERVICES:
+        services.get(name)
+    warm_task = None
+    if Config.WARM_SERVICES:
+        warm_task = asyncio.create_task(services.warm(WARM_SERVICES))
+    static_task = asyncio.create_task(asyncio.to_thread(static_assets.build))
+    yield
+    if warm_task and not warm_task.done():
+        warm_task.cancel()
+    await static_task
+    await services.shutdown()
+
+app = FastAPI(title="LLM Learning Assistant", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware for frontend integration
 app.add_middleware(
@@ -36,35 +131,156 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency and in-flight upload metrics
+app.add_middleware(MetricsMiddleware)
+
+# Per-request span trees, slow-request capture and on-demand profiling
+app.add_middleware(TracingMiddleware)
+
 # Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", FingerprintedStaticFiles(static_assets), name="static")
 
-# Initialize services
-pdf_service = PDFService()
-gemini_service = GeminiService()
-vector_service = VectorService()
-db = DatabaseManager()
-text_storage = TextStorage()
-chat_manager = ChatSessionManager()
+# Per-stage peak/retained memory on progress records and a report per upload
+memory_profiler = None
+if Config.MEMORY_PROFILING:
+    memory_profiler = IngestionMemoryProfiler()
+    progress_tracker.add_stage_listener(memory_profiler.on_stage)
 
 # Create uploads directory for storing PDFs
-UPLOADS_DIR = "uploads"
+UPLOADS_DIR = Config.UPLOAD_DIR
 os.makedirs(UPLOADS_DIR, exist_ok=True)
 
+# One ingestion or teardown per content hash at a time in this process, so a duplicate
+# upload waits for the first copy to finish and then reuses it
+_content_locks = weakref.WeakValueDictionary()
+
+def content_lock(blob_id: str) -> asyncio.Lock:
+    lock = _content_locks.get(blob_id)
+    if lock is None:
+        lock = _content_locks[blob_id] = asyncio.Lock()
+    return lock
+
+def pdf_path_for(file_info: dict) -> str:
+    """Stored PDF for a file; identical uploads share one copy"""
+    return os.path.join(UPLOADS_DIR, f"{db.content_key(file_info)}.pdf")
+
+def chunk_snippet(doc: str, metadata: dict, distance: float, source: str) -> dict:
+    """Prompt snippet for a vector hit; document chunks keep their position so neighbours can merge"""
+    snippet = {"text": doc, "source": source, "score": 1.0 / (1.0 + distance)}
+    if metadata and metadata.get("chunk_type") == "general_text":
+        snippet["content_key"] = metadata.get("blob_id") or metadata.get("file_id")
+        snippet["chunk_index"] = metadata.get("chunk_index")
+    return snippet
+
+async def refresh_area_pairs(file_id: str, added: Optional[dict] = None, removed: Optional[dict] = None):
+    """Re-pair a file's problems and solutions after its areas change; a single added or
+    removed area (id, area_type, page_number) only re-pairs what it affects"""
+    try:
+        if added:
+            await area_pairing.add_area(file_id, added)
+        elif removed:
+            await area_pairing.remove_area(file_id, removed["id"], removed["area_type"])
+        else:
+            await area_pairing.rebuild(file_id)
+    except Exception as e:
+        logger.warning(f"Could not update problem/solution pairs for {file_id}: {e}")
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+def immutable_file_response(request: Request, path: str, etag: str, filename: str = None,
+                            headers: dict = None) -> Response:
+    """Serve a file that never changes under its URL: conditional requests get a 304 and
+    Range/If-Range requests a partial response (FileResponse handles those)"""
+    headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={Config.PDF_CACHE_MAX_AGE}, immutable"
+    }
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="application/pdf", filename=filename,
+                        content_disposition_type="inline", headers=headers)
+
+def session_key(request: Request) -> str:
+    return f"session:{request.path_params['session_id']}"
+
+def admission_slot(lane: str, key_for=None):
+    """Route dependency holding an admission slot for the whole request. Answers 429 with
+    Retry-After when the lane's queue is full or key_for(request) has too many in flight.
+    Only real session IDs make good keys; clients behind one NAT share an address."""
+    async def hold_slot(request: Request):
+        try:
+            async with admission.admit(lane, key_for(request) if key_for else None):
+                yield
+        except AdmissionRejected as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return hold_slot
+
+def require_debug_token(request: Request):
+    """Route dependency for /debug: traces and profiles show paths, stacks and query text"""
+    if not Config.DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not debug_token_valid(request.headers.get("x-debug-token")):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
 @app.get("/")
-async def root():
-    """Serve the main UI"""
-    return FileResponse("static/index.html")
+async def root(request: Request):
+    """Serve the main UI, pointing at fingerprinted static assets"""
+    digest, bodies = await asyncio.to_thread(static_assets.render_index)
+    encoding = next((e for e in accepted_encodings(request.headers.get("accept-encoding", "")) if e in bodies), None)
+    # Revalidated on every visit; everything it references is cached for good
+    etag = f'"{digest}-{encoding or "identity"}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(bodies[encoding or "identity"], media_type="text/html", headers=headers)
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "llm_provider": gemini_service.provider.name,
+            "admission": admission.snapshot(), "quota": quota_scheduler.snapshot()}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of pipeline metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/traces", dependencies=[Depends(require_debug_token)])
+async def list_slow_traces():
+    """List the slowest recent requests (span trees omitted)"""
+    traces = trace_store.slowest()
+    return {
+        "traces": [{key: value for key, value in trace.items() if key != "root"} for trace in traces]
+    }
+
+@app.get("/debug/traces/{trace_id}", dependencies=[Depends(require_debug_token)])
+async def get_trace(trace_id: str):
+    """Get the full span tree of a captured slow request"""
+    trace = trace_store.get(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found (only the slowest requests are kept)")
+    return trace
+
+@app.get("/debug/profiles/{trace_id}", dependencies=[Depends(require_debug_token)])
+async def get_profile(trace_id: str):
+    """Get a request's CPU profile as folded stacks (flamegraph.pl / speedscope input)"""
+    profile = trace_store.get_profile(trace_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile)
 
 @app.get("/api")
 async def api_root():
     return {"message": "LLM Learning Assistant API", "status": "running"}
 
-@app.post("/upload-pdf-fast")
+@app.post("/upload-pdf-fast", dependencies=[Depends(admission_slot(BATCH))])
 async def upload_pdf_fast(file: UploadFile = File(...)):
     """Fast PDF upload - extract text only, enable chat immediately"""
     file_id = None
@@ -80,31 +296,56 @@ async def upload_pdf_fast(file: UploadFile = File(...)):
         if len(content) > Config.MAX_FILE_SIZE:
             raise HTTPException(status_code=400, detail="File too large")
         
-        # Generate file ID
+        # Generate file ID; identical content is processed once and shared
         file_id = str(uuid.uuid4())
+        blob_id = hashlib.sha256(content).hexdigest()
         
-        # Extract text from PDF (fast)
-        pdf_data = await pdf_service.extract_text_from_pdf(content)
-        
-        # Save file info to database
-        db.add_file(
-            file_id=file_id,
-            filename=file.filename,
-            file_size=len(content),
-            total_pages=pdf_data["total_pages"]
-        )
-        
-        # Store the original PDF file for viewing
-        pdf_path = os.path.join(UPLOADS_DIR, f"{file_id}.pdf")
-        with open(pdf_path, "wb") as f:
-            f.write(content)
-        
-        # Store text chunks for basic search (no embeddings yet)
-        chunks = pdf_service.chunk_text(pdf_data["total_text"])
-        text_storage.store_text_chunks(file_id, chunks)
-        
-        # Mark as text-extracted (ready for basic chat)
-        db.update_file_status(file_id, "text_extracted")
+        # Counted like ingestions through IngestionService.process
+        ACTIVE_UPLOADS.inc()
+        try:
+            async with content_lock(blob_id):
+                blob = db.get_blob(blob_id)
+                if blob and blob["status"] in ("text_extracted", "completed"):
+                    db.add_file(file_id, file.filename, len(content), blob["total_pages"],
+                                blob_id=blob_id, status=blob["status"])
+                    logger.info(f"Duplicate upload of {file.filename}, reusing content {blob_id[:12]}")
+                    return {
+                        "file_id": file_id,
+                        "filename": file.filename,
+                        "total_pages": blob["total_pages"],
+                        "total_chunks": blob["total_chunks"],
+                        "status": blob["status"],
+                        "deduplicated": True,
+                        "message": "This document was already processed - ready for chat!"
+                    }
+            
+                # Extract text from PDF (fast)
+                pdf_data = await pdf_service.extract_text_from_pdf(content)
+            
+                # Save file info to database
+                db.create_blob(blob_id, len(content), pdf_data["total_pages"])
+                db.add_file(
+                    file_id=file_id,
+                    filename=file.filename,
+                    file_size=len(content),
+                    total_pages=pdf_data["total_pages"],
+                    blob_id=blob_id
+                )
+            
+                # Store the original PDF file for viewing
+                ingestion_service.store_pdf(blob_id, content)
+            
+                # Store text chunks for basic search (no embeddings yet), and the full text for re-indexing
+                chunks = pdf_service.chunk_text(pdf_data["total_text"])
+                text_storage.store_source_text(blob_id, pdf_data["total_text"])
+                text_storage.store_text_chunks(blob_id, chunks)
+            
+                # Mark as text-extracted (ready for basic chat)
+                db.update_blob_status(blob_id, "text_extracted", len(chunks))
+                db.set_index_version(blob_id, Config.pipeline_version(), len(chunks))
+                db.update_file_status(file_id, "text_extracted")
+        finally:
+            ACTIVE_UPLOADS.dec()
         
         logger.info(f"Fast processing complete: {file.filename}")
         
@@ -121,9 +362,13 @@ async def upload_pdf_fast(file: UploadFile = File(...)):
         logger.error(f"Fast upload error: {e}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
-@app.post("/upload-pdf")
-async def upload_pdf(file: UploadFile = File(...)):
-    """Full PDF upload with embeddings - for users who want to wait for complete processing"""
+@app.post("/upload-pdf", dependencies=[Depends(admission_slot(BATCH))])
+async def upload_pdf(file: UploadFile = File(...), upload_id: Optional[str] = None):
+    """Full PDF upload with embeddings - for users who want to wait for complete processing.
+    
+    Pass a client-generated UUID as upload_id to watch /progress/{upload_id}/events while
+    the request is still running; it becomes the file ID.
+    """
     file_id = None
     try:
         logger.info(f"Starting PDF upload: {file.filename}")
@@ -138,112 +383,21 @@ async def upload_pdf(file: UploadFile = File(...)):
             raise HTTPException(status_code=400, detail="File too large")
         
         # Generate file ID and start progress tracking
-        file_id = str(uuid.uuid4())
+        if upload_id:
+            try:
+                upload_id = str(uuid.UUID(upload_id))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="upload_id must be a UUID")
+            if progress_tracker.get_progress(upload_id) or db.get_file(upload_id):
+                raise HTTPException(status_code=409, detail="upload_id is already in use")
+        file_id = upload_id or str(uuid.uuid4())
         logger.info(f"Generated file ID: {file_id}")
         
         # Initialize progress tracking
         progress_tracker.start_processing(file_id, file.filename, 0)  # We'll update pages count later
         
-        # Stage 1: Extract text from PDF
-        progress_tracker.update_stage(file_id, ProcessingStage.EXTRACTING_TEXT, 
-                                    "Extracting text from PDF...")
-        logger.info("Extracting text from PDF...")
-        pdf_data = await pdf_service.extract_text_from_pdf(content)
-        logger.info(f"Extracted {pdf_data['total_pages']} pages, {pdf_data['total_chars']} characters")
-        
-        # Update progress with page count
-        progress_tracker.update_stage(file_id, ProcessingStage.EXTRACTING_TEXT, 
-                                    f"Extracted {pdf_data['total_pages']} pages successfully", 
-                                    extra_data={"total_pages": pdf_data["total_pages"]})
-        
-        # Store the original PDF file for viewing
-        pdf_path = os.path.join(UPLOADS_DIR, f"{file_id}.pdf")
-        with open(pdf_path, "wb") as f:
-            f.write(content)
-        
-        # Save file info to database
-        db.add_file(
-            file_id=file_id,
-            filename=file.filename,
-            file_size=len(content),
-            total_pages=pdf_data["total_pages"]
-        )
-        logger.info("Saved file info to database")
-        
-        # Stage 2: Chunk text for embedding
-        progress_tracker.update_stage(file_id, ProcessingStage.CHUNKING_TEXT, 
-                                    "Breaking text into chunks...")
-        chunks = pdf_service.chunk_text(pdf_data["total_text"])
-        logger.info(f"Created {len(chunks)} text chunks")
-        progress_tracker.update_stage(file_id, ProcessingStage.CHUNKING_TEXT, 
-                                    f"Created {len(chunks)} text chunks", 
-                                    extra_data={"total_chunks": len(chunks)})
-        
-        # Stage 3: Generate embeddings (this is the slow part!)
-        try:
-            progress_tracker.update_stage(file_id, ProcessingStage.GENERATING_EMBEDDINGS, 
-                                        f"Generating embeddings for {len(chunks)} chunks...")
-            logger.info("Generating embeddings...")
-            
-            # Generate embeddings with batched progress tracking
-            embeddings = await gemini_service.generate_embeddings(chunks)
-            
-            # Update progress to show completion
-            progress_tracker.update_embedding_progress(file_id, len(chunks), len(chunks))
-            
-            logger.info(f"Generated {len(embeddings)} embeddings")
-            
-            # Stage 4: Store in vector database
-            progress_tracker.update_stage(file_id, ProcessingStage.STORING_VECTORS, 
-                                        "Storing embeddings in vector database...")
-            
-            # Prepare metadata
-            metadata = [
-                {
-                    "file_id": file_id,
-                    "filename": file.filename,
-                    "chunk_index": i,
-                    "chunk_type": "general_text"
-                }
-                for i in range(len(chunks))
-            ]
-            
-            # Store in vector database
-            logger.info("Storing in vector database...")
-            chunk_ids = await vector_service.add_documents(chunks, embeddings, metadata)
-            logger.info(f"Stored {len(chunk_ids)} chunks in vector database")
-            
-        except Exception as embed_error:
-            logger.error(f"Embedding error (API key issue?): {embed_error}")
-            progress_tracker.set_error(file_id, f"Embedding failed: {str(embed_error)}")
-            # Continue without embeddings for now - just store the file
-            db.update_file_status(file_id, "text_extracted")
-            return {
-                "file_id": file_id,
-                "filename": file.filename,
-                "total_pages": pdf_data["total_pages"],
-                "total_chunks": len(chunks),
-                "status": "text_extracted",
-                "warning": "Embeddings failed - check API key. You can still view the document but chat won't work."
-            }
-        
-        # Stage 5: Final completion
-        progress_tracker.update_stage(file_id, ProcessingStage.COMPLETED, 
-                                    f"Successfully processed {file.filename}!")
-        db.update_file_status(file_id, "completed")
-        
-        logger.info(f"Successfully processed PDF: {file.filename}")
-        
-        # Schedule cleanup of progress data
-        progress_tracker.cleanup_completed(file_id, delay_seconds=300)  # 5 minutes
-        
-        return {
-            "file_id": file_id,
-            "filename": file.filename,
-            "total_pages": pdf_data["total_pages"],
-            "total_chunks": len(chunks),
-            "status": "completed"
-        }
+        # Extraction, embedding and memory are bounded across all uploads in this process
+        return await ingestion_service.ingest(file_id, file.filename, content)
         
     except HTTPException as he:
         if file_id:
@@ -256,6 +410,68 @@ async def upload_pdf(file: UploadFile = File(...)):
         logger.error(f"Unexpected error processing PDF: {e}")
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
 
+@app.post("/upload-pdfs")
+async def upload_pdfs(files: List[UploadFile] = File(...)):
+    """Bulk PDF upload - files are processed in the background through the shared pipeline.
+    
+    Returns a job ID and the file ID assigned to each file; follow the job at
+    /bulk-ingest/{job_id} or a single file at /progress/{file_id}/events.
+    """
+    try:
+        if len(files) > Config.BULK_MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"At most {Config.BULK_MAX_FILES} files per request")
+        
+        for file in files:
+            if not file.filename.endswith('.pdf'):
+                raise HTTPException(status_code=400, detail=f"Only PDF files are allowed: {file.filename}")
+        
+        # Streamed to the staging directory one file at a time, off the event loop
+        job_id = str(uuid.uuid4())
+        entries = []
+        try:
+            for i, file in enumerate(files):
+                entries.append(await asyncio.to_thread(bulk_ingestion.stage_upload, job_id, i,
+                                                       file.filename, file.file))
+        except UploadTooLargeError as e:
+            bulk_ingestion.discard_staged(job_id)
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception:
+            bulk_ingestion.discard_staged(job_id)
+            raise
+        
+        manifest = bulk_ingestion.create_job(entries, job_id=job_id)
+        bulk_ingestion.start(job_id)
+        logger.info(f"Started bulk job {job_id} with {len(entries)} files")
+        
+        return {
+            "job_id": job_id,
+            "files": [{"name": entry["name"], "file_id": entry["file_id"]} for entry in manifest["files"]],
+            "status": "processing"
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Bulk upload error: {e}")
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+@app.get("/bulk-ingest/{job_id}")
+async def get_bulk_ingest_status(job_id: str):
+    """Aggregated progress of a bulk upload"""
+    status = bulk_ingestion.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Bulk job not found")
+    return status
+
+@app.post("/bulk-ingest/{job_id}/resume")
+async def resume_bulk_ingest(job_id: str):
+    """Continue an interrupted bulk upload, retrying files that failed"""
+    if bulk_ingestion.load(job_id) is None:
+        raise HTTPException(status_code=404, detail="Bulk job not found")
+    if not bulk_ingestion.start(job_id):
+        raise HTTPException(status_code=409, detail="Bulk job is already running")
+    return {"job_id": job_id, "status": "processing"}
+
 @app.get("/files")
 async def list_files():
     """List all uploaded files"""
@@ -321,10 +537,57 @@ async def get_upload_progress(file_id: str):
         if not progress:
             raise HTTPException(status_code=404, detail="Progress not found")
         return progress
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting progress: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/progress/{file_id}/events")
+async def stream_upload_progress(file_id: str):
+    """Server-sent events: one `progress` event per change, ending when processing finishes"""
+    async def events():
+        found = False
+        async for progress in progress_tracker.watch(file_id):
+            if progress is None:
+                yield ": keepalive\n\n"
+                continue
+            found = True
+            yield f"id: {progress['version']}\nevent: progress\ndata: {json.dumps(progress)}\n\n"
+        if not found:
+            yield f"event: not_found\ndata: {json.dumps({'file_id': file_id})}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/ws/progress/{file_id}")
+async def websocket_upload_progress(websocket: WebSocket, file_id: str):
+    """WebSocket variant of the progress stream; closes once processing finishes"""
+    await websocket.accept()
+    found = False
+    try:
+        async for progress in progress_tracker.watch(file_id):
+            if progress is None:
+                await websocket.send_json({"type": "keepalive"})
+                continue
+            found = True
+            await websocket.send_json({"type": "progress", "data": progress})
+        if not found:
+            await websocket.send_json({"type": "not_found", "file_id": file_id})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/progress/{file_id}/memory-report")
+async def get_memory_report(file_id: str):
+    """Get the top-allocations report written for an upload in memory profiling mode"""
+    if not memory_profiler:
+        raise HTTPException(status_code=404, detail="Memory profiling is disabled (set MEMORY_PROFILING=1)")
+    report_path = memory_profiler.report_path(file_id)
+    if not os.path.exists(report_path):
+        raise HTTPException(status_code=404, detail="Memory report not found")
+    return FileResponse(report_path, media_type="text/plain")
+
 @app.post("/sessions")
 async def create_chat_session(request: dict):
     """Create a new chat session for one or more documents"""
@@ -363,7 +626,179 @@ async def list_chat_sessions():
         logger.error(f"Error listing sessions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/sessions/{session_id}/chat")
+@app.get("/sessions/{session_id}/prompt-tokens")
+async def get_session_prompt_tokens(session_id: str):
+    """Get per-turn prompt token counts for a chat session"""
+    try:
+        session_info = chat_manager.get_session_info(session_id)
+        if not session_info:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        return {"session_id": session_id, **chat_manager.get_prompt_token_stats(session_id)}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting prompt token stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def retrieve_file_snippets(file_id: str, file_info: dict, user_question: str,
+                                 query_embedding_task: Optional[asyncio.Task]) -> list:
+    """Scored prompt snippets from one document: its problem/solution areas, then its text"""
+    # Only this document's text chunks; identical uploads share theirs under the blob ID
+    general_filter = {"$and": [{"blob_id" if file_info.get("blob_id") else "file_id": db.content_key(file_info)},
+                               {"chunk_type": "general_text"}]}
+    file_snippets = []
+
+    # First, check for problem/solution areas
+    try:
+        problem_areas = db.get_document_areas(file_id, "problem")
+        solution_areas = db.get_document_areas(file_id, "solution")
+
+        # Search problem-solution areas with embeddings for better matches
+        if file_info["status"] == "completed":
+            query_embedding = await asyncio.shield(query_embedding_task)
+
+            # This file's areas ranked by distance to the question; they still rank
+            # above general text, so their scores start at 1.0
+            area_search_results = await vector_service.search_similar(
+                query_embedding, n_results=Config.AREA_SEARCH_RESULTS,
+                where={"$and": [{"file_id": file_id},
+                                {"chunk_type": {"$in": ["problem_area", "solution_area"]}}]}
+            )
+
+            seen_areas = set()
+            problem_hits = {}
+            for doc, metadata, distance in zip(area_search_results["documents"],
+                                               area_search_results["metadatas"],
+                                               area_search_results["distances"]):
+                area_type = metadata.get("area_type", "unknown")
+                similarity = 1.0 / (1.0 + distance)
+                seen_areas.add(metadata.get("area_id"))
+                if area_type == "problem":
+                    problem_hits[metadata.get("area_id")] = similarity
+                file_snippets.append({
+                    "text": doc,
+                    "source": file_info['filename'],
+                    "label": f"{area_type.upper()} AREA",
+                    "score": 1.0 + similarity
+                })
+
+            # A problem hit brings its paired solutions along without another search
+            for problem_id, solutions in area_pairing.solutions_for(list(problem_hits)).items():
+                for solution in solutions:
+                    if solution["area_id"] in seen_areas or not solution["content"]:
+                        continue
+                    seen_areas.add(solution["area_id"])
+                    file_snippets.append({
+                        "text": solution["content"],
+                        "source": file_info['filename'],
+                        "label": "SOLUTION AREA",
+                        "score": 1.0 + problem_hits[problem_id] * solution["score"]
+                    })
+
+            # Regular RAG search as fallback
+            search_results = await vector_service.search_similar(query_embedding, n_results=2,
+                                                                 where=general_filter)
+            for doc, metadata, distance in zip(search_results["documents"], search_results["metadatas"],
+                                               search_results["distances"]):
+                file_snippets.append(chunk_snippet(doc, metadata, distance, file_info['filename']))
+
+        else:
+            # Fallback: search problem/solution content directly
+            for area in problem_areas + solution_areas:
+                if area["content"] and user_question.lower() in area["content"].lower():
+                    file_snippets.append({
+                        "text": area["content"],
+                        "source": file_info['filename'],
+                        "label": f"{area['area_type'].upper()} AREA",
+                        "score": 1.0
+                    })
+
+    except Exception as e:
+        logger.warning(f"Problem-solution search failed for {file_id}: {e}")
+
+    # Fallback to general text search if needed
+    if not file_snippets:
+        try:
+            query_embedding = None
+            if file_info["status"] == "completed":
+                try:
+                    query_embedding = await asyncio.shield(query_embedding_task)
+                except Exception as e:
+                    # Model provider degraded (circuit open or retries used up): keyword search instead
+                    logger.warning(f"No query embedding for {file_id}, using lexical search: {e}")
+            if query_embedding is not None:
+                search_results = await vector_service.search_similar(query_embedding, n_results=2,
+                                                                     where=general_filter)
+                for doc, metadata, distance in zip(search_results["documents"], search_results["metadatas"],
+                                                   search_results["distances"]):
+                    file_snippets.append(chunk_snippet(doc, metadata, distance, file_info['filename']))
+            else:
+                relevant_chunks = text_storage.search_text(db.content_key(file_info), user_question, limit=2)
+                for rank, chunk in enumerate(relevant_chunks):
+                    # Keyword hits have no distance; rank them below vector hits
+                    file_snippets.append({
+                        "text": chunk,
+                        "source": file_info['filename'],
+                        "score": 0.5 / (rank + 1)
+                    })
+        except Exception as e:
+            logger.warning(f"Fallback search failed for {file_id}: {e}")
+
+    return file_snippets
+
+async def gather_file_snippets(file_infos: dict, user_question: str) -> tuple:
+    """Retrieve from every document at once under one deadline.
+
+    Returns (snippets, sources); documents that fail or miss the deadline contribute no
+    snippets and are reported with status "error" or "timeout".
+    """
+    query_embedding_task = None
+    if any(info["status"] == "completed" for info in file_infos.values()):
+        # Shared by all documents; shielded so one document timing out doesn't cancel it
+        query_embedding_task = asyncio.create_task(gemini_service.generate_query_embedding(user_question))
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + Config.RETRIEVAL_DEADLINE_SECONDS
+    
+    async def timed(file_id: str, file_info: dict):
+        start = loop.time()
+        try:
+            result = await asyncio.wait_for(
+                retrieve_file_snippets(file_id, file_info, user_question, query_embedding_task),
+                timeout=max(0.0, deadline - loop.time())
+            )
+            return result, None, loop.time() - start
+        except Exception as e:
+            return [], e, loop.time() - start
+    
+    results = await asyncio.gather(*(timed(file_id, info) for file_id, info in file_infos.items()))
+    if query_embedding_task and not query_embedding_task.done():
+        query_embedding_task.cancel()
+    
+    snippets = []
+    sources = []
+    for (file_id, file_info), (file_snippets, error, elapsed) in zip(file_infos.items(), results):
+        if isinstance(error, asyncio.TimeoutError):
+            status = "timeout"
+            logger.warning(f"Retrieval for {file_id} missed the {Config.RETRIEVAL_DEADLINE_SECONDS}s deadline")
+        elif error:
+            status = "error"
+            logger.warning(f"Retrieval for {file_id} failed: {error}")
+        else:
+            status = "ok"
+        snippets.extend(file_snippets)
+        sources.append({
+            "file_id": file_id,
+            "filename": file_info["filename"],
+            "status": status,
+            "snippets": len(file_snippets),
+            "elapsed_ms": round(elapsed * 1000, 1)
+        })
+    return snippets, sources
+
+@app.post("/sessions/{session_id}/chat", dependencies=[Depends(admission_slot(INTERACTIVE, session_key))])
 async def chat_with_session(session_id: str, query: dict):
     """Chat with documents in a session (supports multi-document context)"""
     try:
@@ -372,9 +807,16 @@ async def chat_with_session(session_id: str, query: dict):
         if not user_question:
             raise HTTPException(status_code=400, detail="Message is required")
         
-        # Debug logging
+        # Validate and preprocess the image up front; the result is cached for the model call.
+        # Decoding and re-encoding a photo takes hundreds of ms, so it runs off the event loop
         if user_image:
             logger.info(f"Received image data: {len(user_image)} characters")
+            try:
+                await asyncio.to_thread(image_preprocessor.preprocess, user_image)
+            except ImageTooLargeError as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
         else:
             logger.info("No image data received")
         
@@ -387,121 +829,84 @@ async def chat_with_session(session_id: str, query: dict):
         if not file_ids:
             raise HTTPException(status_code=400, detail="No documents in session")
         
-        # Get conversation history for context
-        conversation_history = chat_manager.get_conversation_history(session_id, limit=6)
-        
-        # Build conversation context
-        conversation_context = ""
-        if conversation_history:
-            conversation_context = "Previous conversation:\n"
-            for msg in conversation_history[-4:]:  # Last 4 messages for context
-                conversation_context += f"{msg['role'].capitalize()}: {msg['content']}\n"
-            conversation_context += "\n"
-        
-        # Collect document context from all files with problem-solution priority
-        all_relevant_chunks = []
-        document_info = []
-        problem_solution_chunks = []
+        # Running summary of older turns plus the recent raw messages (trimmed to budget by the packer)
+        conversation = conversation_summarizer.get_context(session_id)
+        conversation_history = conversation["messages"]
+        conversation_summary = ""
+        if conversation["summary"]:
+            summary_text = context_packer.truncate_to_tokens(conversation["summary"], Config.PROMPT_HISTORY_TOKENS // 2)
+            conversation_summary = f"Summary of earlier conversation:\n{summary_text}\n\n"
         
+        # Collect scored document snippets from all files at once; problem/solution areas rank first
+        file_infos = {}
         for file_id in file_ids:
             file_info = db.get_file(file_id)
             if file_info:
-                document_info.append(f"Document: {file_info['filename']}")
-                
-                # First, check for problem/solution areas
-                try:
-                    problem_areas = db.get_document_areas(file_id, "problem")
-                    solution_areas = db.get_document_areas(file_id, "solution")
-                    
-                    # Search problem-solution areas with embeddings for better matches
-                    if file_info["status"] == "completed":
-                        query_embedding = await gemini_service.generate_query_embedding(user_question)
-                        
-                        # Search specifically in problem/solution areas
-                        area_search_results = await vector_service.search_by_metadata(
-                            {"file_id": file_id, "chunk_type": {"$in": ["problem_area", "solution_area"]}}, 
-                            n_results=3
-                        )
-                        
-                        if area_search_results["documents"]:
-                            for doc, metadata in zip(area_search_results["documents"], area_search_results["metadatas"]):
-                                area_type = metadata.get("area_type", "unknown")
-                                problem_solution_chunks.append(
-                                    f"From {file_info['filename']} [{area_type.upper()} AREA]: {doc}"
-                                )
-                        
-                        # Regular RAG search as fallback
-                        search_results = await vector_service.search_similar(query_embedding, n_results=2)
-                        if search_results["documents"]:
-                            all_relevant_chunks.extend([
-                                f"From {file_info['filename']}: {doc}" 
-                                for doc in search_results["documents"]
-                            ])
-                            
-                    else:
-                        # Fallback: search problem/solution content directly
-                        for area in problem_areas + solution_areas:
-                            if area["content"] and user_question.lower() in area["content"].lower():
-                                problem_solution_chunks.append(
-                                    f"From {file_info['filename']} [{area['area_type'].upper()} AREA]: {area['content'][:500]}..."
-                                )
-                                
-                except Exception as e:
-                    logger.warning(f"Problem-solution search failed for {file_id}: {e}")
-                
-                # Fallback to general text search if needed
-                if not problem_solution_chunks and not all_relevant_chunks:
-                    try:
-                        if file_info["status"] == "completed":
-                            query_embedding = await gemini_service.generate_query_embedding(user_question)
-                            search_results = await vector_service.search_similar(query_embedding, n_results=2)
-                            if search_results["documents"]:
-                                all_relevant_chunks.extend([
-                                    f"From {file_info['filename']}: {doc}" 
-                                    for doc in search_results["documents"]
-                                ])
-                        else:
-                            relevant_chunks = text_storage.search_text(file_id, user_question, limit=2)
-                            if relevant_chunks:
-                                all_relevant_chunks.extend([
-                                    f"From {file_info['filename']}: {chunk}" 
-                                    for chunk in relevant_chunks
-                                ])
-                    except Exception as e:
-                        logger.warning(f"Fallback search failed for {file_id}: {e}")
-        
-        # Prioritize problem-solution chunks
-        all_chunks = problem_solution_chunks[:3] + all_relevant_chunks[:3]
-        
-        # Build comprehensive context with educational focus
-        if all_chunks:
-            # Determine if this is a problem-solving query
-            is_problem_solving = any(word in user_question.lower() for word in 
-                                   ["how", "solve", "solution", "answer", "explain", "why", "what"])
-            
+                file_infos[file_id] = file_info
+        document_names = [info['filename'] for info in file_infos.values()]
+        snippets, retrieval_sources = await gather_file_snippets(file_infos, user_question)
+        has_problem_solution = any(s.get("label") for s in snippets)
+        
+        # Neighbouring chunks of one document overlap; send them as one span without the repeat
+        retrieved_count = len(snippets)
+        snippets = context_packer.merge_adjacent(snippets)
+        
+        # Build the fixed part of the prompt with educational focus
+        documents_line = ', '.join(document_names)
+        if snippets:
             educational_instruction = ""
-            if problem_solution_chunks:
+            if has_problem_solution:
                 educational_instruction = """
 EDUCATIONAL CONTEXT: This document contains tagged problem and solution areas. Use this structured information to provide educational guidance.
 - PROBLEM AREAS contain questions, exercises, or challenges
 - SOLUTION AREAS contain answers, explanations, or methods
 - When answering, reference both problems and solutions to provide comprehensive learning support"""
-
-            document_context = f"""You are an educational AI assistant helping with {len(file_ids)} document(s): {', '.join([info.split(': ')[1] for info in document_info])}
+            
+            prompt_header = f"""You are an educational AI assistant helping with {len(file_ids)} document(s): {documents_line}
 {educational_instruction}
 
 Relevant content from the documents:
-{chr(10).join(all_chunks[:6])}  
+"""
+            prompt_footer = "Please provide a helpful educational answer. If the question relates to a problem, try to guide the student through the solution process rather than just giving the answer."
+        else:
+            prompt_header = f"""You are an educational AI assistant working with {len(file_ids)} document(s): {documents_line}
 
-{conversation_context}Current question: {user_question}
+"""
+            prompt_footer = "Please provide a helpful educational answer. No specific relevant content was found in the documents for this question, but try to provide general guidance based on the document context."
+        
+        # Pack the highest-scoring snippets and recent history into the token budget
+        question_line = f"Current question: {user_question}"
+        packed = context_packer.pack(
+            prompt_header + conversation_summary + question_line + prompt_footer + f"\n\nUser Question: {user_question}",
+            snippets,
+            conversation_history
+        )
+        all_chunks = [snippet["formatted"] for snippet in packed["snippets"]]
+        problem_solution_used = sum(1 for snippet in packed["snippets"] if snippet.get("label"))
+        
+        conversation_context = conversation_summary
+        if packed["history"]:
+            conversation_context += "Previous conversation:\n"
+            for msg in packed["history"]:
+                conversation_context += f"{msg['role'].capitalize()}: {msg['content']}\n"
+            conversation_context += "\n"
+        
+        if all_chunks:
+            document_context = f"""{prompt_header}{chr(10).join(all_chunks)}
 
-Please provide a helpful educational answer. If the question relates to a problem, try to guide the student through the solution process rather than just giving the answer."""
-        else:
-            document_context = f"""You are an educational AI assistant working with {len(file_ids)} document(s): {', '.join([info.split(': ')[1] for info in document_info])}
+{conversation_context}{question_line}
 
-{conversation_context}Current question: {user_question}
+{prompt_footer}"""
+        else:
+            document_context = f"""{prompt_header}{conversation_context}{question_line}
 
-Please provide a helpful educational answer. No specific relevant content was found in the documents for this question, but try to provide general guidance based on the document context."""
+{prompt_footer}"""
+        
+        prompt_tokens = context_packer.estimate_tokens(f"{document_context}\n\nUser Question: {user_question}")
+        logger.info(f"Prompt tokens: {prompt_tokens} (context {packed['tokens']['context']}, "
+                    f"history {packed['tokens']['history']}, budget {packed['tokens']['budget']}, "
+                    f"dropped {packed['dropped_snippets']}, truncated {packed['truncated_snippets']}, "
+                    f"merged {retrieved_count} hits into {len(snippets)} snippets)")
 
         # Generate response with full context - use vision model if image is provided
         if user_image:
@@ -514,11 +919,13 @@ Please provide a helpful educational answer. No specific relevant content was fo
         chat_manager.add_message(session_id, "user", user_question)
         chat_manager.add_message(session_id, "assistant", response, 
                                context_sources=all_chunks[:3],
-                               document_mode="multi-doc" if len(file_ids) > 1 else "single-doc")
+                               document_mode="multi-doc" if len(file_ids) > 1 else "single-doc",
+                               prompt_tokens=prompt_tokens)
+        conversation_summarizer.schedule(session_id)
         
         # Enhanced response metadata
         response_mode = "educational"
-        if problem_solution_chunks:
+        if problem_solution_used:
             response_mode = "problem-solution-guided"
         
         return {
@@ -528,15 +935,28 @@ Please provide a helpful educational answer. No specific relevant content was fo
             "documents_used": len(file_ids),
             "mode": "multi-doc" if len(file_ids) > 1 else "single-doc",
             "response_mode": response_mode,
-            "problem_solution_areas_used": len(problem_solution_chunks),
-            "sources": all_chunks[:3]
+            "problem_solution_areas_used": problem_solution_used,
+            "retrieval_sources": retrieval_sources,
+            "sources": all_chunks[:3],
+            "prompt_tokens": {
+                "total": prompt_tokens,
+                "context": packed["tokens"]["context"],
+                "history": packed["tokens"]["history"],
+                "budget": packed["tokens"]["budget"]
+            }
         }
         
+    except HTTPException:
+        raise
+    except CircuitOpenError as e:
+        # The model provider is down; tell clients when to come back instead of a 500
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(max(1, int(e.retry_after + 0.5)))})
     except Exception as e:
         logger.error(f"Error in session chat: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/chat/{file_id}")
+@app.post("/chat/{file_id}", dependencies=[Depends(admission_slot(INTERACTIVE))])
 async def chat_with_document(file_id: str, query: dict):
     """Legacy single-document chat - redirects to session-based chat"""
     try:
@@ -552,13 +972,15 @@ async def chat_with_document(file_id: str, query: dict):
         session_query = {"message": query.get("message", "")}
         return await chat_with_session(session_id, session_query)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in legacy chat: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/files/{file_id}/pdf")
-async def get_pdf_file(file_id: str):
-    """Serve the original PDF file for viewing"""
+async def get_pdf_file(file_id: str, request: Request):
+    """Serve the original PDF file for viewing, with byte-range support for incremental loading"""
     try:
         # Check if file exists in database
         file_info = db.get_file(file_id)
@@ -566,21 +988,53 @@ async def get_pdf_file(file_id: str):
             raise HTTPException(status_code=404, detail="File not found")
         
         # Check if PDF file exists on disk
-        pdf_path = os.path.join(UPLOADS_DIR, f"{file_id}.pdf")
+        pdf_path = pdf_path_for(file_info)
         if not os.path.exists(pdf_path):
             raise HTTPException(status_code=404, detail="PDF file not found on disk")
         
-        # Return the PDF file
-        return FileResponse(
-            pdf_path,
-            media_type="application/pdf",
-            filename=file_info["filename"]
-        )
+        # Content under a file ID never changes, so its content key is a strong validator
+        return immutable_file_response(request, pdf_path, f'"{db.content_key(file_info)}"',
+                                       filename=file_info["filename"])
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error serving PDF: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/files/{file_id}/pages/{pages}")
+async def get_pdf_pages(file_id: str, pages: str, request: Request):
+    """Serve one page ("3") or a page range ("3-5") as a small standalone PDF"""
+    try:
+        file_info = db.get_file(file_id)
+        if not file_info:
+            raise HTTPException(status_code=404, detail="File not found")
+        
+        try:
+            start, end = parse_page_range(pages, file_info["total_pages"] or 0)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        content_key = db.content_key(file_info)
+        etag = f'"{content_key}-{start}-{end}"'
+        headers = {"X-Total-Pages": str(file_info["total_pages"])}
+        # Revalidations don't need the split file
+        if etag_matches(request, etag):
+            return immutable_file_response(request, "", etag, headers=headers)
+        
+        pdf_path = pdf_path_for(file_info)
+        if not os.path.exists(pdf_path):
+            raise HTTPException(status_code=404, detail="PDF file not found on disk")
+        
+        pages_path = await page_cache.get_pages(content_key, pdf_path, start, end)
+        return immutable_file_response(request, pages_path, etag, headers=headers)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error serving PDF pages: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.delete("/sessions/{session_id}")
 async def delete_chat_session(session_id: str):
     """Delete a chat session and its messages"""
@@ -610,22 +1064,8 @@ async def delete_pdf_file(file_id: str):
         if not file_info:
             raise HTTPException(status_code=404, detail="File not found")
         
-        # Delete from database
-        db.delete_file(file_id)
-        
-        # Delete text chunks
-        text_storage.delete_file_chunks(file_id)
-        
-        # Delete from vector database
-        try:
-            await vector_service.delete_document_chunks(file_id)
-        except Exception as e:
-            logger.warning(f"Could not delete from vector DB: {e}")
-        
-        # Delete PDF file from disk
-        pdf_path = os.path.join(UPLOADS_DIR, f"{file_id}.pdf")
-        if os.path.exists(pdf_path):
-            os.remove(pdf_path)
+        # Text, vectors and the stored PDF go with the last reference to the content
+        await ingestion_service.remove_file(file_id, file_info)
         
         return {"message": "File deleted successfully"}
         
@@ -633,9 +1073,30 @@ async def delete_pdf_file(file_id: str):
         logger.error(f"Error deleting file: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/translate")
+@app.get("/admin/reindex")
+async def get_reindex_status():
+    """Current pipeline version, documents built with an older one, and progress of the last run"""
+    return {
+        "pipeline_version": Config.pipeline_version(),
+        "stale_documents": len(reindex_service.stale_content()),
+        "stale_area_files": len(await reindex_service.stale_area_files()),
+        "run": reindex_service.status
+    }
+
+@app.post("/admin/reindex")
+async def start_reindex(force: bool = False):
+    """Re-index stale documents in the background; the old index serves until each swap"""
+    try:
+        await reindex_service.check_dimension()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not reindex_service.start(force):
+        raise HTTPException(status_code=409, detail="A re-index is already running")
+    return {"started": True, "pipeline_version": Config.pipeline_version()}
+
+@app.post("/api/translate", dependencies=[Depends(admission_slot(INTERACTIVE))])
 async def translate_text(request: dict):
-    """Translate text using Gemini model"""
+    """Translate text using Gemini model, reusing cached segment translations"""
     try:
         text_to_translate = request.get("text", "")
         target_language = request.get("target_language", "Korean") # Default to Korean
@@ -643,16 +1104,52 @@ async def translate_text(request: dict):
         if not text_to_translate:
             raise HTTPException(status_code=400, detail="Text to translate is required")
 
-        prompt = f"Translate the following text into {target_language}:\n\n{text_to_translate}"
-        translated_text = await gemini_service.generate_text(prompt)
+        result = await translation_service.translate(text_to_translate, target_language)
 
-        return {"original_text": text_to_translate, "translated_text": translated_text, "target_language": target_language}
+        return {
+            "original_text": text_to_translate,
+            "translated_text": result["translated_text"],
+            "target_language": target_language,
+            "total_segments": result["total_segments"],
+            "cache_hits": result["cache_hits"]
+        }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error translating text: {e}")
         raise HTTPException(status_code=500, detail=f"Translation failed: {str(e)}")
 
-@app.post("/files/{file_id}/areas")
+@app.post("/api/translate/batch", dependencies=[Depends(admission_slot(INTERACTIVE))])
+async def translate_texts(request: dict):
+    """Translate many texts at once, sharing cached segments and batched prompts"""
+    try:
+        texts = request.get("texts", [])
+        target_language = request.get("target_language", "Korean")
+
+        if not texts or not all(isinstance(text, str) and text for text in texts):
+            raise HTTPException(status_code=400, detail="texts must be a non-empty list of strings")
+
+        result = await translation_service.translate_many(texts, target_language)
+
+        return {
+            "translations": [
+                {"original_text": original, "translated_text": translated}
+                for original, translated in zip(texts, result["translated_texts"])
+            ],
+            "target_language": target_language,
+            "total_segments": result["total_segments"],
+            "cache_hits": result["cache_hits"],
+            "segments_translated": result["segments_translated"]
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error translating texts: {e}")
+        raise HTTPException(status_code=500, detail=f"Translation failed: {str(e)}")
+
+@app.post("/files/{file_id}/areas", dependencies=[Depends(admission_slot(BATCH))])
 async def add_document_area(file_id: str, request: dict):
     """Add a problem/solution area to a document"""
     try:
@@ -682,7 +1179,7 @@ async def add_document_area(file_id: str, request: dict):
         if not content:
             try:
                 # Get PDF path
-                pdf_path = os.path.join(UPLOADS_DIR, f"{file_id}.pdf")
+                pdf_path = pdf_path_for(file_info)
                 if os.path.exists(pdf_path):
                     with open(pdf_path, "rb") as f:
                         pdf_content = f.read()
@@ -713,20 +1210,15 @@ async def add_document_area(file_id: str, request: dict):
                 embedding = await gemini_service.generate_embeddings([content])
                 
                 # Store in vector database with specialized metadata
-                metadata = [{
-                    "file_id": file_id,
-                    "area_id": area_id,
-                    "area_type": area_type,
-                    "page_number": page_number,
-                    "chunk_type": f"{area_type}_area",
-                    "coordinates": coordinates
-                }]
+                metadata = [area_vector_metadata(file_id, area_id, area_type, page_number, coordinates)]
                 
-                await vector_service.add_documents([content], embedding, metadata)
+                await vector_service.upsert_documents([area_id], [content], embedding, metadata)
                 
             except Exception as e:
                 logger.warning(f"Could not create embedding for area: {e}")
 
+        await refresh_area_pairs(file_id, added={"id": area_id, "area_type": area_type, "page_number": page_number})
+
         return {
             "area_id": area_id,
             "file_id": file_id,
@@ -741,6 +1233,95 @@ async def add_document_area(file_id: str, request: dict):
         logger.error(f"Error adding document area: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/files/{file_id}/areas/bulk", dependencies=[Depends(admission_slot(BATCH))])
+async def add_document_areas(file_id: str, request: dict):
+    """Add many problem/solution areas at once.
+    
+    Areas without content are extracted from one parse of the PDF, all rows are written
+    in one transaction and the contents are embedded in batched calls.
+    """
+    try:
+        areas = request.get("areas")
+        if not isinstance(areas, list) or not areas:
+            raise HTTPException(status_code=400, detail="areas must be a non-empty list")
+        if len(areas) > Config.BULK_MAX_AREAS:
+            raise HTTPException(status_code=400, detail=f"At most {Config.BULK_MAX_AREAS} areas per request")
+        
+        for i, area in enumerate(areas):
+            if not isinstance(area, dict):
+                raise HTTPException(status_code=400, detail=f"areas[{i}]: must be an object")
+            if area.get("area_type") not in ['problem', 'solution']:
+                raise HTTPException(status_code=400, detail=f"areas[{i}]: area_type must be 'problem' or 'solution'")
+            page_number = area.get("page_number")
+            if not isinstance(page_number, int) or isinstance(page_number, bool) or page_number < 1:
+                raise HTTPException(status_code=400, detail=f"areas[{i}]: page_number must be an integer of at least 1")
+            if not area.get("coordinates"):
+                raise HTTPException(status_code=400, detail=f"areas[{i}]: coordinates are required")
+        
+        # Verify file exists
+        file_info = db.get_file(file_id)
+        if not file_info:
+            raise HTTPException(status_code=404, detail="File not found")
+        
+        records = [
+            {
+                "area_id": str(uuid.uuid4()),
+                "file_id": file_id,
+                "area_type": area["area_type"],
+                "page_number": area["page_number"],
+                "coordinates": area["coordinates"],
+                "content": area.get("content") or ""
+            }
+            for area in areas
+        ]
+        
+        # Extract content for areas that came without it, parsing the PDF once
+        to_extract = [record for record in records if not record["content"]]
+        if to_extract:
+            pdf_path = pdf_path_for(file_info)
+            if os.path.exists(pdf_path):
+                with open(pdf_path, "rb") as f:
+                    pdf_content = f.read()
+                texts = await pdf_service.extract_text_from_areas(pdf_content, to_extract)
+                for record, text in zip(to_extract, texts):
+                    record["content"] = text if text.strip() else ""
+            else:
+                logger.warning(f"Could not extract area content: {pdf_path} not found")
+        
+        db.add_document_areas(records)
+        
+        # Store area-specific embeddings for enhanced RAG
+        embedded = 0
+        with_content = [record for record in records if record["content"].strip()]
+        if with_content:
+            try:
+                embeddings = await gemini_service.generate_embeddings([record["content"] for record in with_content])
+                await vector_service.upsert_documents(
+                    [record["area_id"] for record in with_content],
+                    [record["content"] for record in with_content],
+                    embeddings,
+                    [area_vector_metadata(file_id, record["area_id"], record["area_type"],
+                                          record["page_number"], record["coordinates"]) for record in with_content]
+                )
+                embedded = len(with_content)
+            except Exception as e:
+                logger.warning(f"Could not create embeddings for areas: {e}")
+        
+        await refresh_area_pairs(file_id)
+        
+        return {
+            "file_id": file_id,
+            "areas": records,
+            "embedded": embedded,
+            "message": f"Successfully added {len(records)} areas"
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error adding document areas: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/files/{file_id}/areas")
 async def get_document_areas(file_id: str, area_type: str = None):
     """Get problem/solution areas for a document"""
@@ -775,13 +1356,18 @@ async def delete_document_area(file_id: str, area_id: str):
         with sqlite3.connect(db.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "DELETE FROM document_areas WHERE id = ? AND file_id = ?",
+                "SELECT area_type FROM document_areas WHERE id = ? AND file_id = ?",
                 (area_id, file_id)
             )
-            deleted = cursor.rowcount > 0
+            row = cursor.fetchone()
+            if row:
+                cursor.execute(
+                    "DELETE FROM document_areas WHERE id = ? AND file_id = ?",
+                    (area_id, file_id)
+                )
             conn.commit()
 
-        if not deleted:
+        if not row:
             raise HTTPException(status_code=404, detail="Area not found")
 
         # Delete from vector database
@@ -790,6 +1376,8 @@ async def delete_document_area(file_id: str, area_id: str):
         except Exception as e:
             logger.warning(f"Could not delete area from vector DB: {e}")
 
+        await refresh_area_pairs(file_id, removed={"id": area_id, "area_type": row[0]})
+
         return {"message": "Area deleted successfully"}
 
     except Exception as e:
@@ -830,5 +1418,35 @@ async def extract_area_text(file_id: str, request: dict):
         logger.error(f"Error extracting area text: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def initialize_schema():
+    """Create all SQLite tables once, before worker processes start"""
+    DatabaseManager()
+    TextStorage()
+    ChatSessionManager()
+    TranslationCache()
+    if Config.PROGRESS_STORE == "sqlite":
+        SQLiteProgressStore()
+
+def run_server():
+    parser = argparse.ArgumentParser(description="LLM Learning Assistant server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=Config.WORKERS,
+                        help="Worker processes; use PROGRESS_STORE=sqlite when running more than one")
+    parser.add_argument("--reload", action="store_true", help="Development mode: restart on code changes")
+    args = parser.parse_args()
+
+    if args.reload:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
+        return
+
+    if args.workers > 1 and Config.PROGRESS_STORE != "sqlite":
+        logger.warning("Upload progress is per-process; set PROGRESS_STORE=sqlite so every worker can see it")
+
+    # Run the DDL and migrations here so workers don't race each other on them
+    initialize_schema()
+    os.environ["INIT_SCHEMA"] = "0"
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    run_server()
\ No newline at end of file
@@ -9,7 +9,8 @@ class ChatSessionManager:
     
     def __init__(self):
         self.db_path = Config.SQLITE_DB_PATH
-        self._initialize_chat_tables()
+        if Config.INIT_SCHEMA:
+            self._initialize_chat_tables()
     
     def _initialize_chat_tables(self):
         """Initialize chat-related tables"""
@@ -41,6 +42,23 @@ class ChatSessionManager:
                 )
             ''')
             
+            # Running summary of older messages, folded in every few turns
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS chat_summaries (
+                    session_id TEXT PRIMARY KEY,
+                    summary TEXT,
+                    summarized_rowid INTEGER DEFAULT 0,  -- last message rowid folded into the summary
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (session_id) REFERENCES chat_sessions_v2 (id)
+                )
+            ''')
+            
+            # Older databases predate per-turn prompt token tracking
+            cursor.execute("PRAGMA table_info(chat_messages_v2)")
+            columns = [row[1] for row in cursor.fetchall()]
+            if "prompt_tokens" not in columns:
+                cursor.execute("ALTER TABLE chat_messages_v2 ADD COLUMN prompt_tokens INTEGER")
+            
             conn.commit()
     
     def create_session(self, file_ids: List[str], session_name: Optional[str] = None) -> str:
@@ -65,7 +83,8 @@ class ChatSessionManager:
         return session_id
     
     def add_message(self, session_id: str, role: str, content: str, 
-                   context_sources: List[Dict] = None, document_mode: str = "basic") -> str:
+                   context_sources: List[Dict] = None, document_mode: str = "basic",
+                   prompt_tokens: Optional[int] = None) -> str:
         """Add a message to the chat session"""
         message_id = str(uuid.uuid4())
         
@@ -82,9 +101,9 @@ class ChatSessionManager:
             sources_json = str(context_sources) if context_sources else None
             cursor.execute(
                 """INSERT INTO chat_messages_v2 
-                   (id, session_id, role, content, context_sources, document_mode) 
-                   VALUES (?, ?, ?, ?, ?, ?)""",
-                (message_id, session_id, role, content, sources_json, document_mode)
+                   (id, session_id, role, content, context_sources, document_mode, prompt_tokens) 
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (message_id, session_id, role, content, sources_json, document_mode, prompt_tokens)
             )
             
             conn.commit()
@@ -98,7 +117,7 @@ class ChatSessionManager:
             cursor.execute(
                 """SELECT role, content, timestamp FROM chat_messages_v2 
                    WHERE session_id = ? 
-                   ORDER BY timestamp DESC 
+                   ORDER BY timestamp DESC, rowid DESC 
                    LIMIT ?""",
                 (session_id, limit)
             )
@@ -114,6 +133,56 @@ class ChatSessionManager:
                 for row in reversed(rows)
             ]
     
+    def get_messages_after(self, session_id: str, after_rowid: int = 0,
+                           limit: Optional[int] = None) -> List[Dict]:
+        """Get messages newer than after_rowid in chronological order (the latest `limit` if given)"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT rowid, role, content, timestamp FROM chat_messages_v2 
+                   WHERE session_id = ? AND rowid > ? 
+                   ORDER BY rowid DESC 
+                   LIMIT ?""",
+                (session_id, after_rowid, limit if limit is not None else -1)
+            )
+            
+            rows = cursor.fetchall()
+            return [
+                {
+                    "rowid": row[0],
+                    "role": row[1],
+                    "content": row[2],
+                    "timestamp": row[3]
+                }
+                for row in reversed(rows)
+            ]
+    
+    def get_summary(self, session_id: str) -> Dict[str, Any]:
+        """Get the running conversation summary for a session"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT summary, summarized_rowid FROM chat_summaries WHERE session_id = ?",
+                (session_id,)
+            )
+            
+            row = cursor.fetchone()
+            if row:
+                return {"summary": row[0], "summarized_rowid": row[1]}
+            return {"summary": "", "summarized_rowid": 0}
+    
+    def save_summary(self, session_id: str, summary: str, summarized_rowid: int):
+        """Store the running conversation summary for a session"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """INSERT OR REPLACE INTO chat_summaries 
+                   (session_id, summary, summarized_rowid, updated_at) 
+                   VALUES (?, ?, ?, CURRENT_TIMESTAMP)""",
+                (session_id, summary, summarized_rowid)
+            )
+            conn.commit()
+    
     def get_session_file_ids(self, session_id: str) -> List[str]:
         """Get file IDs associated with a session"""
         with sqlite3.connect(self.db_path) as conn:
@@ -182,11 +251,15 @@ class ChatSessionManager:
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             
-            # Delete messages first (foreign key constraint)
+            # Delete messages and summary first (foreign key constraint)
             cursor.execute(
                 "DELETE FROM chat_messages_v2 WHERE session_id = ?",
                 (session_id,)
             )
+            cursor.execute(
+                "DELETE FROM chat_summaries WHERE session_id = ?",
+                (session_id,)
+            )
             
             # Delete session
             cursor.execute(
@@ -195,4 +268,24 @@ class ChatSessionManager:
             )
             
             conn.commit()
-            return cursor.rowcount > 0
\ No newline at end of file
+            return cursor.rowcount > 0
+    
+    def get_prompt_token_stats(self, session_id: str) -> Dict[str, Any]:
+        """Get per-turn prompt token counts for a session"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT prompt_tokens FROM chat_messages_v2 
+                   WHERE session_id = ? AND prompt_tokens IS NOT NULL 
+                   ORDER BY timestamp""",
+                (session_id,)
+            )
+            
+            per_turn = [row[0] for row in cursor.fetchall()]
+            return {
+                "turns": len(per_turn),
+                "per_turn": per_turn,
+                "total": sum(per_turn),
+                "average": sum(per_turn) / len(per_turn) if per_turn else 0,
+                "max": max(per_turn) if per_turn else 0
+            }
\ No newline at end of file
@@ -9,7 +9,8 @@ class DatabaseManager:
     def __init__(self):
         self.db_path = Config.SQLITE_DB_PATH
         self._ensure_db_directory()
-        self._initialize_database()
+        if Config.INIT_SCHEMA:
+            self._initialize_database()
     
     def _ensure_db_directory(self):
         """Ensure database directory exists"""
@@ -32,6 +33,35 @@ class DatabaseManager:
                 )
             ''')
             
+            # Deduplicated document content. Extracted text, chunk vectors and the stored PDF are
+            # keyed by blob_id (SHA-256 of the PDF bytes) and shared by every files row pointing here
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS document_blobs (
+                    blob_id TEXT PRIMARY KEY,
+                    ref_count INTEGER DEFAULT 0,
+                    file_size INTEGER,
+                    total_pages INTEGER,
+                    total_chunks INTEGER,
+                    status TEXT DEFAULT 'processing',  -- 'processing', 'text_extracted' or 'completed'
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Which pipeline version (Config.pipeline_version) built each content's chunks and vectors
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS content_index (
+                    content_key TEXT PRIMARY KEY,
+                    pipeline_version TEXT,
+                    chunk_count INTEGER,
+                    indexed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Files uploaded before deduplication have no blob and own their content directly
+            cursor.execute("PRAGMA table_info(files)")
+            if "blob_id" not in [column[1] for column in cursor.fetchall()]:
+                cursor.execute("ALTER TABLE files ADD COLUMN blob_id TEXT")
+            
             # Problem/Solution areas table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS document_areas (
@@ -46,6 +76,18 @@ class DatabaseManager:
                 )
             ''')
             
+            # Problem area -> its solution area(s), scored by page proximity and embedding similarity
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS area_pairs (
+                    problem_id TEXT,
+                    solution_id TEXT,
+                    file_id TEXT,
+                    score REAL,
+                    PRIMARY KEY (problem_id, solution_id)
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_area_pairs_file ON area_pairs (file_id)")
+            
             # Chat sessions table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS chat_sessions (
@@ -71,17 +113,116 @@ class DatabaseManager:
             
             conn.commit()
     
-    def add_file(self, file_id: str, filename: str, file_size: int, total_pages: int) -> str:
-        """Add file record"""
+    def add_file(self, file_id: str, filename: str, file_size: int, total_pages: int,
+                 blob_id: Optional[str] = None, status: str = "processing") -> str:
+        """Add file record, taking a reference on its content blob"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
+            if blob_id:
+                cursor.execute("UPDATE document_blobs SET ref_count = ref_count + 1 WHERE blob_id = ?", (blob_id,))
+                if cursor.rowcount == 0:
+                    raise ValueError(f"Content blob {blob_id} does not exist")
             cursor.execute(
-                "INSERT INTO files (id, filename, file_size, total_pages) VALUES (?, ?, ?, ?)",
-                (file_id, filename, file_size, total_pages)
+                "INSERT INTO files (id, filename, file_size, total_pages, blob_id, status) VALUES (?, ?, ?, ?, ?, ?)",
+                (file_id, filename, file_size, total_pages, blob_id, status)
             )
             conn.commit()
             return file_id
     
+    @staticmethod
+    def content_key(file_info: Dict) -> str:
+        """Key the file's text, chunk vectors and stored PDF live under"""
+        return file_info.get("blob_id") or file_info["id"]
+    
+    def get_blob(self, blob_id: str) -> Optional[Dict]:
+        """Get content blob information"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM document_blobs WHERE blob_id = ?", (blob_id,))
+            row = cursor.fetchone()
+            
+            if row:
+                columns = [desc[0] for desc in cursor.description]
+                return dict(zip(columns, row))
+            return None
+    
+    def create_blob(self, blob_id: str, file_size: int, total_pages: int):
+        """Register content before processing it; no-op if it already exists"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT OR IGNORE INTO document_blobs (blob_id, file_size, total_pages) VALUES (?, ?, ?)",
+                (blob_id, file_size, total_pages)
+            )
+            conn.commit()
+    
+    def update_blob_status(self, blob_id: str, status: str, total_chunks: Optional[int] = None):
+        """Record how far the shared content has been processed, for every file sharing it"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE document_blobs SET status = ?, total_chunks = COALESCE(?, total_chunks) WHERE blob_id = ?",
+                (status, total_chunks, blob_id)
+            )
+            # Earlier uploads deduplicated onto this content move with it (e.g. text_extracted -> completed)
+            cursor.execute("UPDATE files SET status = ? WHERE blob_id = ?", (status, blob_id))
+            conn.commit()
+    
+    def set_index_version(self, content_key: str, pipeline_version: str, chunk_count: int):
+        """Record the pipeline version the content's chunks (and vectors) were built with"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """INSERT OR REPLACE INTO content_index (content_key, pipeline_version, chunk_count, indexed_at)
+                   VALUES (?, ?, ?, CURRENT_TIMESTAMP)""",
+                (content_key, pipeline_version, chunk_count)
+            )
+            cursor.execute("UPDATE document_blobs SET total_chunks = ? WHERE blob_id = ?", (chunk_count, content_key))
+            conn.commit()
+    
+    def clear_index_version(self, content_key: str):
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM content_index WHERE content_key = ?", (content_key,))
+            conn.commit()
+    
+    def list_indexed_content(self) -> List[Dict]:
+        """One row per distinct stored content with its index version (None if never recorded)"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT COALESCE(f.blob_id, f.id) AS content_key,
+                       MAX(f.blob_id IS NOT NULL) AS shared,
+                       MAX(f.status = 'completed') AS embedded,
+                       MIN(f.filename) AS filename,
+                       ci.pipeline_version
+                FROM files f
+                LEFT JOIN content_index ci ON ci.content_key = COALESCE(f.blob_id, f.id)
+                WHERE f.status IN ('completed', 'text_extracted')
+                GROUP BY COALESCE(f.blob_id, f.id)
+            """)
+            columns = [desc[0] for desc in cursor.description]
+            return [
+                {**dict(zip(columns, row)), "shared": bool(row[1]), "embedded": bool(row[2])}
+                for row in cursor.fetchall()
+            ]
+    
+    def content_in_use(self, content_key: str) -> bool:
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM files WHERE blob_id = ? OR id = ? LIMIT 1", (content_key, content_key))
+            return cursor.fetchone() is not None
+    
+    def release_blob(self, blob_id: str) -> bool:
+        """Drop one reference; returns True when that was the last one and the blob row is gone"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE document_blobs SET ref_count = ref_count - 1 WHERE blob_id = ?", (blob_id,))
+            cursor.execute("DELETE FROM document_blobs WHERE blob_id = ? AND ref_count <= 0", (blob_id,))
+            orphaned = cursor.rowcount > 0
+            conn.commit()
+            return orphaned
+    
     def update_file_status(self, file_id: str, status: str):
         """Update file processing status"""
         with sqlite3.connect(self.db_path) as conn:
@@ -106,6 +247,19 @@ class DatabaseManager:
             conn.commit()
             return area_id
     
+    def add_document_areas(self, areas: List[Dict]) -> int:
+        """Add many problem/solution areas in one transaction"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                """INSERT INTO document_areas 
+                   (id, file_id, page_number, area_type, coordinates, content) 
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [(area["area_id"], area["file_id"], area["page_number"], area["area_type"],
+                  json.dumps(area["coordinates"]), area["content"]) for area in areas]
+            )
+            conn.commit()
+            return len(areas)
+    
     def get_file(self, file_id: str) -> Optional[Dict]:
         """Get file information"""
         with sqlite3.connect(self.db_path) as conn:
@@ -145,12 +299,73 @@ class DatabaseManager:
             
             return areas
     
+    def list_embeddable_areas(self) -> List[Dict]:
+        """ID and file of every area with content, i.e. every area that should have a vector"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, file_id FROM document_areas WHERE TRIM(COALESCE(content, '')) != ''")
+            return [{"id": area_id, "file_id": file_id} for area_id, file_id in cursor.fetchall()]
+    
+    def replace_area_pairs(self, file_id: str, pairs: List[tuple]):
+        """Swap in a file's problem -> solution pairing, as (problem_id, solution_id, score)"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM area_pairs WHERE file_id = ?", (file_id,))
+            cursor.executemany(
+                "INSERT INTO area_pairs (problem_id, solution_id, file_id, score) VALUES (?, ?, ?, ?)",
+                [(problem_id, solution_id, file_id, score) for problem_id, solution_id, score in pairs]
+            )
+            conn.commit()
+    
+    def replace_problem_pairs(self, file_id: str, problem_ids: List[str], pairs: List[tuple]):
+        """Swap in the pairs of some of a file's problems, leaving the others alone"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.executemany("DELETE FROM area_pairs WHERE problem_id = ?", [(problem_id,) for problem_id in problem_ids])
+            cursor.executemany(
+                "INSERT INTO area_pairs (problem_id, solution_id, file_id, score) VALUES (?, ?, ?, ?)",
+                [(problem_id, solution_id, file_id, score) for problem_id, solution_id, score in pairs]
+            )
+            conn.commit()
+    
+    def get_area_pairs(self, file_id: str) -> List[tuple]:
+        """A file's pairing as (problem_id, solution_id, score)"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT problem_id, solution_id, score FROM area_pairs WHERE file_id = ?", (file_id,))
+            return cursor.fetchall()
+    
+    def get_paired_solutions(self, problem_ids: List[str]) -> Dict[str, List[Dict]]:
+        """Solution areas paired with each problem area, best first"""
+        if not problem_ids:
+            return {}
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            placeholders = ",".join("?" for _ in problem_ids)
+            cursor.execute(
+                f"""SELECT p.problem_id, p.score, a.id, a.page_number, a.content
+                    FROM area_pairs p JOIN document_areas a ON a.id = p.solution_id
+                    WHERE p.problem_id IN ({placeholders})
+                    ORDER BY p.problem_id, p.score DESC""",
+                problem_ids
+            )
+            paired: Dict[str, List[Dict]] = {}
+            for problem_id, score, area_id, page_number, content in cursor.fetchall():
+                paired.setdefault(problem_id, []).append(
+                    {"area_id": area_id, "page_number": page_number, "content": content, "score": score}
+                )
+            return paired
+    
     def delete_file(self, file_id: str) -> bool:
-        """Delete a file record and all associated data"""
+        """Delete a file record and all associated data.
+        
+        Shared content is not touched here: call release_blob for files with a blob_id.
+        """
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             
             # Delete associated document areas first
+            cursor.execute("DELETE FROM area_pairs WHERE file_id = ?", (file_id,))
             cursor.execute("DELETE FROM document_areas WHERE file_id = ?", (file_id,))
             
             # Delete chat sessions that reference only this file
@@ -186,6 +401,7 @@ class DatabaseManager:
             # Delete sessions and their messages
             for session_id in sessions_to_delete:
                 cursor.execute("DELETE FROM chat_messages_v2 WHERE session_id = ?", (session_id,))
+                cursor.execute("DELETE FROM chat_summaries WHERE session_id = ?", (session_id,))
                 cursor.execute("DELETE FROM chat_sessions_v2 WHERE id = ?", (session_id,))
             
             # Finally, delete the file record
@@ -1,7 +1,14 @@
+import asyncio
+import heapq
+import json
+import os
+import sqlite3
 import time
-from typing import Dict, Optional
+import logging
+from typing import Dict, Optional, Callable, List, Tuple, AsyncIterator
 from enum import Enum
 import threading
+from config import Config
 
 class ProcessingStage(Enum):
     UPLOADING = "uploading"
@@ -12,10 +19,102 @@ class ProcessingStage(Enum):
     COMPLETED = "completed"
     FAILED = "failed"
 
+TERMINAL_STAGES = (ProcessingStage.COMPLETED.value, ProcessingStage.FAILED.value)
+
+class SQLiteProgressStore:
+    """Shared progress records so any worker process can answer for any upload"""
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or Config.PROGRESS_DB_PATH or Config.SQLITE_DB_PATH
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        if Config.INIT_SCHEMA:
+            self._initialize_progress_table()
+
+    def _initialize_progress_table(self):
+        """Initialize upload progress table"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS upload_progress (
+                    file_id TEXT PRIMARY KEY,
+                    data TEXT,
+                    version INTEGER,
+                    expires_at REAL
+                )
+            ''')
+            conn.commit()
+
+    def put(self, file_id: str, data: Dict, expires_at: float):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO upload_progress (file_id, data, version, expires_at) VALUES (?, ?, ?, ?)",
+                (file_id, json.dumps(data), data["version"], expires_at)
+            )
+            conn.commit()
+
+    def get(self, file_id: str) -> Optional[Dict]:
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT data FROM upload_progress WHERE file_id = ? AND expires_at > ?",
+                (file_id, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_expiry(self, file_id: str, expires_at: float):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE upload_progress SET expires_at = ? WHERE file_id = ?", (expires_at, file_id))
+            conn.commit()
+
+    def delete_expired(self, now: float) -> int:
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.execute("DELETE FROM upload_progress WHERE expires_at <= ?", (now,))
+            conn.commit()
+            return cursor.rowcount
+
 class ProgressTracker:
-    def __init__(self):
+    """Upload progress records, pushed to watchers as they change.
+
+    Records live in this process; with a store they are also written through so that
+    /progress and the event streams work from any worker. Finished records are expired
+    by a single reaper thread working off a timer heap.
+    """
+
+    def __init__(self, store: Optional[SQLiteProgressStore] = None):
         self._progress_data: Dict[str, Dict] = {}
         self._lock = threading.Lock()
+        self._stage_listeners: List[Callable[[str, str, Dict], None]] = []
+        self._store = store
+        # file_id -> [(loop, event)] woken on every change to that record
+        self._watchers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._reaper_wakeup = threading.Condition(self._lock)
+        self._reaper: Optional[threading.Thread] = None
+    
+    def add_stage_listener(self, listener: Callable[[str, str, Dict], None]):
+        """Register listener(file_id, stage, progress_data), called on every stage transition.
+        
+        Listeners run under the tracker lock and may add fields to progress_data.
+        """
+        self._stage_listeners.append(listener)
+    
+    def _notify_stage(self, file_id: str, stage: str, data: Dict):
+        for listener in self._stage_listeners:
+            try:
+                listener(file_id, stage, data)
+            except Exception as e:
+                logging.warning(f"Progress stage listener failed for {file_id}: {e}")
+    
+    def _changed(self, file_id: str, expires_in: float = None):
+        """Bump the record's version, write it through and wake its watchers (called under the lock)"""
+        data = self._progress_data[file_id]
+        data["version"] = data.get("version", 0) + 1
+        if self._store:
+            try:
+                self._store.put(file_id, data, time.time() + (expires_in or Config.PROGRESS_STALE_SECONDS))
+            except sqlite3.Error as e:
+                logging.warning(f"Could not write progress for {file_id} to the shared store: {e}")
+        for loop, event in self._watchers.get(file_id, []):
+            loop.call_soon_threadsafe(event.set)
     
     def start_processing(self, file_id: str, filename: str, total_pages: int):
         """Initialize progress tracking for a file"""
@@ -33,6 +132,8 @@ class ProgressTracker:
                 "stages_completed": 0,
                 "total_stages": 6
             }
+            self._notify_stage(file_id, ProcessingStage.UPLOADING.value, self._progress_data[file_id])
+            self._changed(file_id)
     
     def update_stage(self, file_id: str, stage: ProcessingStage, message: str, 
                     progress_percent: Optional[int] = None, extra_data: Dict = None):
@@ -42,6 +143,8 @@ class ProgressTracker:
                 return False
             
             data = self._progress_data[file_id]
+            if data["stage"] != stage.value:
+                self._notify_stage(file_id, stage.value, data)
             data["stage"] = stage.value
             data["message"] = message
             data["current_stage_start"] = time.time()
@@ -79,6 +182,7 @@ class ProgressTracker:
                 except ValueError:
                     pass
             
+            self._changed(file_id)
             return True
     
     def update_embedding_progress(self, file_id: str, current_chunk: int, total_chunks: int):
@@ -97,6 +201,7 @@ class ProgressTracker:
                 data["message"] = f"Generating embeddings... ({current_chunk}/{total_chunks} chunks)"
                 data["embedding_current"] = current_chunk
                 data["embedding_total"] = total_chunks
+                self._changed(file_id)
             
             return True
     
@@ -104,42 +209,129 @@ class ProgressTracker:
         """Mark processing as failed"""
         with self._lock:
             if file_id in self._progress_data:
+                if self._progress_data[file_id]["stage"] != ProcessingStage.FAILED.value:
+                    self._notify_stage(file_id, ProcessingStage.FAILED.value, self._progress_data[file_id])
                 self._progress_data[file_id]["stage"] = ProcessingStage.FAILED.value
                 self._progress_data[file_id]["error"] = error_message
                 self._progress_data[file_id]["message"] = f"Error: {error_message}"
+                self._changed(file_id)
+        # Failed uploads are never passed to cleanup_completed by the upload handlers
+        self.cleanup_completed(file_id, Config.PROGRESS_RETENTION_SECONDS)
+    
+    @staticmethod
+    def _with_estimates(data: Dict) -> Dict:
+        """Calculate elapsed time and estimated remaining"""
+        elapsed = time.time() - data["start_time"]
+        if data["progress_percent"] > 0:
+            estimated_total = (elapsed / data["progress_percent"]) * 100
+            estimated_remaining = max(0, estimated_total - elapsed)
+        else:
+            estimated_remaining = data["estimated_total_time"]
+        
+        return {
+            **data,
+            "elapsed_time": elapsed,
+            "estimated_remaining": estimated_remaining
+        }
     
     def get_progress(self, file_id: str) -> Optional[Dict]:
-        """Get current progress for a file"""
+        """Get current progress for a file, from the shared store if another worker owns it"""
         with self._lock:
             data = self._progress_data.get(file_id)
             if data:
-                # Calculate elapsed time and estimated remaining
-                elapsed = time.time() - data["start_time"]
-                if data["progress_percent"] > 0:
-                    estimated_total = (elapsed / data["progress_percent"]) * 100
-                    estimated_remaining = max(0, estimated_total - elapsed)
-                else:
-                    estimated_remaining = data["estimated_total_time"]
-                
-                return {
-                    **data,
-                    "elapsed_time": elapsed,
-                    "estimated_remaining": estimated_remaining
-                }
-            return None
+                return self._with_estimates(data)
+        if self._store:
+            data = self._store.get(file_id)
+            if data:
+                return self._with_estimates(data)
+        return None
     
     def cleanup_completed(self, file_id: str, delay_seconds: int = 300):
         """Remove progress data for completed files after delay"""
-        def cleanup():
-            time.sleep(delay_seconds)
-            with self._lock:
-                if file_id in self._progress_data:
-                    data = self._progress_data[file_id]
-                    if data["stage"] in [ProcessingStage.COMPLETED.value, ProcessingStage.FAILED.value]:
+        expires_at = time.time() + delay_seconds
+        with self._lock:
+            if file_id not in self._progress_data:
+                return
+            heapq.heappush(self._expiry_heap, (expires_at, file_id))
+            if self._store:
+                try:
+                    self._store.set_expiry(file_id, expires_at)
+                except sqlite3.Error as e:
+                    logging.warning(f"Could not set progress expiry for {file_id}: {e}")
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name="progress-reaper", daemon=True)
+                self._reaper.start()
+            self._reaper_wakeup.notify()
+    
+    def _reap(self):
+        """Single reaper: sleep until the earliest expiry, drop finished records that are due"""
+        with self._lock:
+            while True:
+                now = time.time()
+                while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                    _, file_id = heapq.heappop(self._expiry_heap)
+                    data = self._progress_data.get(file_id)
+                    if data and data["stage"] in TERMINAL_STAGES:
                         del self._progress_data[file_id]
+                if self._store:
+                    # Also sweeps rows left behind by workers that exited
+                    try:
+                        self._store.delete_expired(now)
+                    except sqlite3.Error as e:
+                        logging.warning(f"Could not expire shared progress records: {e}")
+                timeout = self._expiry_heap[0][0] - now if self._expiry_heap else None
+                if self._store:
+                    timeout = min(timeout or Config.PROGRESS_RETENTION_SECONDS, Config.PROGRESS_RETENTION_SECONDS)
+                self._reaper_wakeup.wait(timeout)
+    
+    async def watch(self, file_id: str) -> AsyncIterator[Optional[Dict]]:
+        """Yield the progress record each time it changes, until the upload completes or fails.
         
-        thread = threading.Thread(target=cleanup, daemon=True)
-        thread.start()
+        Yields None after PROGRESS_HEARTBEAT_SECONDS without changes so streams can send a
+        keepalive. Watching may start before the upload does; if no record appears within
+        PROGRESS_WAIT_SECONDS the iterator ends without yielding a record.
+        """
+        event = asyncio.Event()
+        watcher = (asyncio.get_running_loop(), event)
+        with self._lock:
+            self._watchers.setdefault(file_id, []).append(watcher)
+        try:
+            last_version = None
+            waiting_since = idle_since = time.monotonic()
+            while True:
+                event.clear()
+                progress = self.get_progress(file_id)
+                now = time.monotonic()
+                if progress is None:
+                    if now - waiting_since > Config.PROGRESS_WAIT_SECONDS:
+                        return
+                elif progress["version"] != last_version:
+                    last_version = progress["version"]
+                    idle_since = now
+                    yield progress
+                    if progress["stage"] in TERMINAL_STAGES:
+                        return
+                elif now - idle_since >= Config.PROGRESS_HEARTBEAT_SECONDS:
+                    idle_since = now
+                    yield None
+                
+                with self._lock:
+                    local = file_id in self._progress_data
+                # Changes made by other workers only show up in the store, so poll it
+                timeout = Config.PROGRESS_HEARTBEAT_SECONDS if local or not self._store else Config.PROGRESS_POLL_INTERVAL
+                if progress is None:
+                    timeout = min(timeout, Config.PROGRESS_POLL_INTERVAL)
+                try:
+                    await asyncio.wait_for(event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                watchers = self._watchers.get(file_id, [])
+                if watcher in watchers:
+                    watchers.remove(watcher)
+                if not watchers:
+                    self._watchers.pop(file_id, None)
 
 # Global progress tracker instance
-progress_tracker = ProgressTracker()
\ No newline at end of file
+progress_tracker = ProgressTracker(SQLiteProgressStore() if Config.PROGRESS_STORE == "sqlite" else None)
\ No newline at end of file
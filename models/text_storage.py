@@ -8,7 +8,8 @@ class TextStorage:
     
     def __init__(self):
         self.db_path = Config.SQLITE_DB_PATH
-        self._initialize_text_storage()
+        if Config.INIT_SCHEMA:
+            self._initialize_text_storage()
     
     def _initialize_text_storage(self):
         """Initialize text storage table"""
@@ -24,8 +25,33 @@ class TextStorage:
                     FOREIGN KEY (file_id) REFERENCES files (id)
                 )
             ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS document_source_text (
+                    file_id TEXT PRIMARY KEY,
+                    content TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
             conn.commit()
     
+    def store_source_text(self, file_id: str, text: str):
+        """Keep the full extracted text so chunks can be rebuilt without re-reading the PDF"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT OR REPLACE INTO document_source_text (file_id, content) VALUES (?, ?)",
+                (file_id, text)
+            )
+            conn.commit()
+    
+    def get_source_text(self, file_id: str) -> Optional[str]:
+        """Get the full extracted text, or None for files stored before it was kept"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT content FROM document_source_text WHERE file_id = ?", (file_id,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+    
     def store_text_chunks(self, file_id: str, chunks: List[str]):
         """Store text chunks for basic search"""
         with sqlite3.connect(self.db_path) as conn:
@@ -90,5 +116,7 @@ class TextStorage:
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM document_text WHERE file_id = ?", (file_id,))
+            deleted = cursor.rowcount > 0
+            cursor.execute("DELETE FROM document_source_text WHERE file_id = ?", (file_id,))
             conn.commit()
-            return cursor.rowcount > 0
\ No newline at end of file
+            return deleted
\ No newline at end of file
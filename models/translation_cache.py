@@ -0,0 +1,74 @@
+import sqlite3
+from typing import Dict, List, Tuple
+from config import Config
+
+class TranslationCache:
+    """Persistent cache of translated text segments keyed by (segment hash, target language)"""
+
+    def __init__(self):
+        self.db_path = Config.SQLITE_DB_PATH
+        if Config.INIT_SCHEMA:
+            self._initialize_cache_table()
+
+    def _initialize_cache_table(self):
+        """Initialize translation cache table"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS translation_cache (
+                    segment_hash TEXT,
+                    target_language TEXT,
+                    source_text TEXT,
+                    translated_text TEXT,
+                    hit_count INTEGER DEFAULT 0,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (segment_hash, target_language)
+                )
+            ''')
+            conn.commit()
+
+    def get_many(self, segment_hashes: List[str], target_language: str) -> Dict[str, str]:
+        """Look up cached translations, returning {segment_hash: translated_text} for hits"""
+        if not segment_hashes:
+            return {}
+
+        found = {}
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(segment_hashes), 500):
+                batch = segment_hashes[i:i + 500]
+                placeholders = ",".join("?" for _ in batch)
+                cursor.execute(
+                    f"""SELECT segment_hash, translated_text FROM translation_cache
+                        WHERE target_language = ? AND segment_hash IN ({placeholders})""",
+                    [target_language] + batch
+                )
+                found.update(dict(cursor.fetchall()))
+
+            if found:
+                cursor.executemany(
+                    """UPDATE translation_cache SET hit_count = hit_count + 1
+                       WHERE segment_hash = ? AND target_language = ?""",
+                    [(segment_hash, target_language) for segment_hash in found]
+                )
+            conn.commit()
+
+        return found
+
+    def put_many(self, entries: List[Tuple[str, str, str]], target_language: str):
+        """Store translations given as (segment_hash, source_text, translated_text) tuples"""
+        if not entries:
+            return
+
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                """INSERT OR REPLACE INTO translation_cache
+                   (segment_hash, target_language, source_text, translated_text)
+                   VALUES (?, ?, ?, ?)""",
+                [(segment_hash, target_language, source, translated)
+                 for segment_hash, source, translated in entries]
+            )
+            conn.commit()
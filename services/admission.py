@@ -0,0 +1,169 @@
+import asyncio
+import collections
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+from config import Config
+from services.metrics import ADMISSION_DECISIONS, ADMISSION_QUEUE_DEPTH, ADMISSION_WAIT_SECONDS
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+class AdmissionRejected(Exception):
+    """The request can't be queued now; retry_after is a hint in whole seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+class _Lane:
+    def __init__(self, name: str, max_active: int, max_queue: int):
+        self.name = name
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = collections.deque()
+        # Background work (wait=True) queues separately: unbounded, served after requests
+        self.background: Deque[asyncio.Future] = collections.deque()
+        # Moving average of how long a request holds its slot, for Retry-After
+        self.avg_hold = 1.0
+
+class AdmissionController:
+    """Bounded, prioritised admission for work that competes for the event loop, SQLite and
+    model quota.
+
+    Interactive work (chat, translation) and batch work (ingestion, area embedding) share
+    ADMISSION_MAX_CONCURRENT slots. Batch work may hold at most ADMISSION_BATCH_MAX_CONCURRENT
+    of them and only starts when no interactive request is waiting, so an upload burst can't
+    starve chat. Each lane has a bounded queue; a full queue, a queue wait over
+    ADMISSION_QUEUE_TIMEOUT_SECONDS or too many requests for one chat session is rejected with
+    AdmissionRejected instead of letting latency grow.
+    """
+
+    def __init__(self, max_concurrent: int = None, batch_max_concurrent: int = None):
+        self.max_concurrent = max_concurrent or Config.ADMISSION_MAX_CONCURRENT
+        self.lanes = {
+            INTERACTIVE: _Lane(INTERACTIVE, self.max_concurrent, Config.ADMISSION_INTERACTIVE_QUEUE),
+            BATCH: _Lane(BATCH, min(self.max_concurrent, batch_max_concurrent or Config.ADMISSION_BATCH_MAX_CONCURRENT),
+                         Config.ADMISSION_BATCH_QUEUE)
+        }
+        self.active = 0
+        # Requests admitted or queued per chat session key
+        self._per_key: Dict[str, int] = collections.defaultdict(int)
+
+    def _can_start(self, lane: _Lane) -> bool:
+        if self.active >= self.max_concurrent or lane.active >= lane.max_active:
+            return False
+        # Interactive requests waiting always go first
+        interactive = self.lanes[INTERACTIVE]
+        return lane.name == INTERACTIVE or not (interactive.waiters or interactive.background)
+
+    def _start(self, lane: _Lane):
+        self.active += 1
+        lane.active += 1
+
+    def _dispatch(self):
+        """Hand freed slots to waiters, interactive lane first"""
+        for lane in (self.lanes[INTERACTIVE], self.lanes[BATCH]):
+            for queue in (lane.waiters, lane.background):
+                while queue and self._can_start(lane):
+                    waiter = queue.popleft()
+                    if waiter.done():
+                        continue
+                    self._start(lane)
+                    waiter.set_result(None)
+            ADMISSION_QUEUE_DEPTH.set(len(lane.waiters) + len(lane.background), lane=lane.name)
+
+    def retry_after(self, lane: _Lane) -> int:
+        """Rough time until a newly queued request would start (background work queues behind it)"""
+        estimate = lane.avg_hold * (len(lane.waiters) + 1) / max(1, lane.max_active)
+        return min(60, max(1, math.ceil(estimate)))
+
+    def _reject(self, lane: _Lane, reason: str, result: str):
+        ADMISSION_DECISIONS.inc(lane=lane.name, result=result)
+        logging.warning(f"Admission rejected ({lane.name}): {reason}")
+        raise AdmissionRejected(reason, self.retry_after(lane))
+
+    async def _acquire(self, lane: _Lane, wait: bool):
+        queue = lane.background if wait else lane.waiters
+        if not lane.waiters and not (wait and lane.background) and self._can_start(lane):
+            self._start(lane)
+            ADMISSION_DECISIONS.inc(lane=lane.name, result="admitted")
+            return
+        if not wait and len(lane.waiters) >= lane.max_queue:
+            self._reject(lane, f"The {lane.name} queue is full", "queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        ADMISSION_QUEUE_DEPTH.set(len(lane.waiters) + len(lane.background), lane=lane.name)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter),
+                                   timeout=None if wait else Config.ADMISSION_QUEUE_TIMEOUT_SECONDS)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as we gave up: hand the slot back
+                self._release(lane, 0.0)
+            else:
+                waiter.cancel()
+                if waiter in queue:
+                    queue.remove(waiter)
+                # A batch request may have been held back only by this one
+                self._dispatch()
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject(lane, f"Waited over {Config.ADMISSION_QUEUE_TIMEOUT_SECONDS:g}s "
+                                   f"in the {lane.name} queue", "timeout")
+            raise
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, lane=lane.name)
+        ADMISSION_DECISIONS.inc(lane=lane.name, result="queued")
+
+    def _release(self, lane: _Lane, held: float):
+        self.active -= 1
+        lane.active -= 1
+        if held:
+            lane.avg_hold = 0.8 * lane.avg_hold + 0.2 * held
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, lane_name: str, key: Optional[str] = None, wait: bool = False):
+        """Hold a slot in a lane for the duration of the block.
+
+        key limits concurrent requests per session. wait=True is for background work with
+        nobody to retry it: it waits in a separate queue, behind requests, with no bound or
+        timeout.
+        """
+        lane = self.lanes[lane_name]
+        if key is not None and self._per_key[key] >= Config.ADMISSION_SESSION_MAX_CONCURRENT:
+            self._reject(lane, f"Too many concurrent requests for {key}", "session_limit")
+
+        if key is not None:
+            self._per_key[key] += 1
+        try:
+            await self._acquire(lane, wait)
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self._release(lane, time.perf_counter() - start)
+        finally:
+            if key is not None:
+                self._per_key[key] -= 1
+                if not self._per_key[key]:
+                    del self._per_key[key]
+
+    def snapshot(self) -> Dict:
+        return {
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "lanes": {
+                name: {"active": lane.active, "max_active": lane.max_active, "queued": len(lane.waiters),
+                       "max_queue": lane.max_queue, "background_queued": len(lane.background),
+                       "avg_hold_seconds": round(lane.avg_hold, 3)}
+                for name, lane in self.lanes.items()
+            }
+        }
+
+# Global admission controller instance
+admission = AdmissionController()
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+from config import Config
+
+def area_vector_metadata(file_id: str, area_id: str, area_type: str, page_number: int,
+                         coordinates: dict) -> dict:
+    """Vector metadata for an area; Chroma only takes scalar values, so coordinates go in as JSON"""
+    return {
+        "file_id": file_id,
+        "area_id": area_id,
+        "area_type": area_type,
+        "page_number": page_number,
+        "chunk_type": f"{area_type}_area",
+        "coordinates": json.dumps(coordinates),
+        "embedding_version": Config.embedding_version()
+    }
+
+def _unit_rows(vectors: List[List[float]]):
+    import numpy as np
+    matrix = np.asarray(vectors, dtype=float)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+def score_matrix(problems: List[Dict], solutions: List[Dict], embeddings: Dict[str, List[float]]):
+    """Pairing score of every (problem, solution), as a problems x solutions array.
+
+    The score blends page proximity (1.0 on the same page, falling off with distance;
+    solutions before their problem count double) with embedding similarity; areas without
+    an embedding are scored on page proximity alone.
+    """
+    # Imported here: numpy isn't otherwise loaded at startup
+    import numpy as np
+    weight = Config.AREA_PAIR_SIMILARITY_WEIGHT
+    problem_pages = np.array([problem["page_number"] for problem in problems], dtype=float)
+    solution_pages = np.array([solution["page_number"] for solution in solutions], dtype=float)
+    distance = solution_pages[None, :] - problem_pages[:, None]
+    distance = np.where(distance < 0, -2 * distance, distance)
+    scores = 1.0 / (1.0 + distance)
+
+    with_problem = [i for i, problem in enumerate(problems) if embeddings.get(problem["id"])]
+    with_solution = [j for j, solution in enumerate(solutions) if embeddings.get(solution["id"])]
+    if with_problem and with_solution:
+        # Norms are computed once per area, not once per pair
+        similarity = (_unit_rows([embeddings[problems[i]["id"]] for i in with_problem])
+                      @ _unit_rows([embeddings[solutions[j]["id"]] for j in with_solution]).T)
+        block = np.ix_(with_problem, with_solution)
+        scores[block] = (1 - weight) * scores[block] + weight * np.maximum(similarity, 0.0)
+    return scores
+
+def select_solutions(problem_id: str, scored: List[Tuple[float, str]]) -> List[Tuple[str, str, float]]:
+    """The best (score, solution_id) for a problem, plus up to AREA_PAIR_MAX_SOLUTIONS - 1 more
+    scoring at least AREA_PAIR_MIN_SCORE"""
+    pairs = []
+    for rank, (score, solution_id) in enumerate(sorted(scored, reverse=True)[:Config.AREA_PAIR_MAX_SOLUTIONS]):
+        if rank == 0 or score >= Config.AREA_PAIR_MIN_SCORE:
+            pairs.append((problem_id, solution_id, round(score, 4)))
+    return pairs
+
+def pair_areas(problems: List[Dict], solutions: List[Dict],
+               embeddings: Dict[str, List[float]]) -> List[Tuple[str, str, float]]:
+    """(problem_id, solution_id, score) for each problem's best-matching solutions"""
+    if not problems or not solutions:
+        return []
+    scores = score_matrix(problems, solutions, embeddings)
+    pairs = []
+    for i, problem in enumerate(problems):
+        pairs.extend(select_solutions(problem["id"], [(float(scores[i, j]), solution["id"])
+                                                      for j, solution in enumerate(solutions)]))
+    return pairs
+
+class AreaPairingService:
+    """Links each problem area to its solution area(s) so retrieval can follow the link
+    instead of searching again. Rebuilt for a file when many of its areas change; a single
+    added or removed area only re-pairs the problems it can affect. Scoring runs off the
+    event loop."""
+
+    def __init__(self, db, vector_service):
+        self.db = db
+        self.vector_service = vector_service
+
+    async def _embeddings(self, file_id: str) -> Dict[str, List[float]]:
+        try:
+            stored = await self.vector_service.get_chunks(
+                {"$and": [{"file_id": file_id}, {"chunk_type": {"$in": ["problem_area", "solution_area"]}}]}
+            )
+        except Exception as e:
+            # Page proximity alone still gives a usable pairing
+            logging.warning(f"Could not load area embeddings for {file_id}: {e}")
+            return {}
+        return {metadata["area_id"]: embedding
+                for metadata, embedding in zip(stored["metadatas"], stored["embeddings"])}
+
+    async def rebuild(self, file_id: str) -> int:
+        problems = self.db.get_document_areas(file_id, "problem")
+        solutions = self.db.get_document_areas(file_id, "solution")
+        embeddings = await self._embeddings(file_id) if problems and solutions else {}
+        pairs = await asyncio.to_thread(pair_areas, problems, solutions, embeddings)
+        self.db.replace_area_pairs(file_id, pairs)
+        return len(pairs)
+
+    async def add_area(self, file_id: str, area: Dict) -> int:
+        """Pair one new area (id, area_type, page_number) without re-scoring the rest of the file"""
+        if area["area_type"] == "problem":
+            solutions = self.db.get_document_areas(file_id, "solution")
+            embeddings = await self._embeddings(file_id) if solutions else {}
+            pairs = await asyncio.to_thread(pair_areas, [area], solutions, embeddings)
+            self.db.replace_problem_pairs(file_id, [area["id"]], pairs)
+            return len(pairs)
+
+        problems = self.db.get_document_areas(file_id, "problem")
+        if not problems:
+            return 0
+        embeddings = await self._embeddings(file_id)
+        scores = await asyncio.to_thread(score_matrix, problems, [area], embeddings)
+        # A new solution only adds a candidate, so each problem picks again among the pairs
+        # it kept and the new solution; solutions it didn't keep can't make it back in
+        kept: Dict[str, List[Tuple[float, str]]] = {}
+        for problem_id, solution_id, score in self.db.get_area_pairs(file_id):
+            kept.setdefault(problem_id, []).append((score, solution_id))
+        pairs = []
+        for i, problem in enumerate(problems):
+            pairs.extend(select_solutions(problem["id"],
+                                          kept.get(problem["id"], []) + [(float(scores[i, 0]), area["id"])]))
+        self.db.replace_problem_pairs(file_id, [problem["id"] for problem in problems], pairs)
+        return len(pairs)
+
+    async def remove_area(self, file_id: str, area_id: str, area_type: str) -> int:
+        """Drop a deleted area's pairs and re-pair the problems that were linked to it"""
+        if area_type == "problem":
+            self.db.replace_problem_pairs(file_id, [area_id], [])
+            return 0
+
+        affected = {problem_id for problem_id, solution_id, _ in self.db.get_area_pairs(file_id)
+                    if solution_id == area_id}
+        if not affected:
+            return 0
+        problems = [problem for problem in self.db.get_document_areas(file_id, "problem") if problem["id"] in affected]
+        solutions = self.db.get_document_areas(file_id, "solution")
+        embeddings = await self._embeddings(file_id) if solutions else {}
+        pairs = await asyncio.to_thread(pair_areas, problems, solutions, embeddings)
+        self.db.replace_problem_pairs(file_id, list(affected), pairs)
+        return len(pairs)
+
+    def solutions_for(self, problem_ids: List[str]) -> Dict[str, List[Dict]]:
+        return self.db.get_paired_solutions(problem_ids)
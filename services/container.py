@@ -0,0 +1,89 @@
+import asyncio
+import inspect
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+class LazyService:
+    """Stand-in for a container service; the real object is built on first attribute access"""
+
+    def __init__(self, container: "ServiceContainer", name: str):
+        self._container = container
+        self._name = name
+
+    def __getattr__(self, attr: str):
+        return getattr(self._container.get(self._name), attr)
+
+    def __repr__(self):
+        return f"<LazyService {self._name}>"
+
+class ServiceContainer:
+    """App services for one worker process, each built once on first use.
+
+    Factories receive the container so they can pull in their dependencies. Build hooks
+    run on every new instance (metrics and tracing wrap methods there).
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[["ServiceContainer"], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._build_hooks: List[Callable[[str, Any], None]] = []
+        self._build_seconds: Dict[str, float] = {}
+        # Re-entrant: factories call get() for their dependencies
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[["ServiceContainer"], Any]):
+        self._factories[name] = factory
+
+    def add_build_hook(self, hook: Callable[[str, Any], None]):
+        self._build_hooks.append(hook)
+
+    def lazy(self, name: str) -> LazyService:
+        if name not in self._factories:
+            raise KeyError(f"Unknown service: {name}")
+        return LazyService(self, name)
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                start = time.perf_counter()
+                instance = self._factories[name](self)
+                for hook in self._build_hooks:
+                    hook(name, instance)
+                self._instances[name] = instance
+                self._build_seconds[name] = time.perf_counter() - start
+                logging.info(f"Built {name} in {self._build_seconds[name] * 1000:.0f}ms")
+            return self._instances[name]
+
+    def is_built(self, name: str) -> bool:
+        return name in self._instances
+
+    def build_times(self) -> Dict[str, float]:
+        return dict(self._build_seconds)
+
+    async def warm(self, names: List[str]):
+        """Build services off the event loop so the first request doesn't pay for them"""
+        for name in names:
+            try:
+                await asyncio.to_thread(self.get, name)
+            except Exception as e:
+                # Leave it to the first request to retry and surface the error
+                logging.warning(f"Could not warm {name}: {e}")
+
+    async def shutdown(self):
+        """Call close() on built services that have one, in reverse build order"""
+        for name, instance in reversed(list(self._instances.items())):
+            close = getattr(instance, "close", None)
+            if close is None:
+                continue
+            try:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logging.warning(f"Error closing {name}: {e}")
+        self._instances.clear()
@@ -0,0 +1,206 @@
+import math
+import re
+from typing import List, Dict, Any, Optional
+from config import Config
+
+# Hangul, CJK ideographs and kana tokenize at roughly one token per character
+_CJK_CHARS = re.compile(r"[ᄀ-ᇿ぀-ヿ㄰-㆏㐀-䶿一-鿿가-힯]")
+# Sentence ends, including the trailing whitespace
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s+|\n+")
+
+class ContextPacker:
+    """Pack retrieved snippets and conversation history into a prompt token budget"""
+
+    def __init__(self, token_budget: Optional[int] = None, history_tokens: Optional[int] = None,
+                 min_snippet_tokens: Optional[int] = None):
+        self.token_budget = token_budget or Config.PROMPT_TOKEN_BUDGET
+        self.history_tokens = history_tokens or Config.PROMPT_HISTORY_TOKENS
+        self.min_snippet_tokens = min_snippet_tokens or Config.PROMPT_MIN_SNIPPET_TOKENS
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Cheap token estimate: ~4 characters per token, one per CJK character"""
+        if not text:
+            return 0
+        cjk = len(_CJK_CHARS.findall(text))
+        return math.ceil((len(text) - cjk) / 4 + cjk)
+
+    def truncate_to_tokens(self, text: str, max_tokens: int) -> str:
+        """Cut text to fit max_tokens, at a sentence boundary where possible"""
+        if self.estimate_tokens(text) <= max_tokens:
+            return text
+        # Leave room for the " ..." marking the cut; estimates of joined text never exceed the sum
+        max_tokens -= self.estimate_tokens(" ...")
+
+        # Longest prefix that ends on a sentence boundary and still fits
+        best = ""
+        for match in _SENTENCE_END.finditer(text):
+            prefix = text[:match.start()]
+            if self.estimate_tokens(prefix) > max_tokens:
+                break
+            best = prefix
+        if best:
+            return best + " ..."
+
+        # No sentence fits: fall back to a word boundary
+        words = []
+        used = 0
+        for word in text.split():
+            cost = self.estimate_tokens(word + " ")
+            if used + cost > max_tokens:
+                break
+            words.append(word)
+            used += cost
+        return " ".join(words) + " ..." if words else ""
+
+    @staticmethod
+    def format_snippet(snippet: Dict[str, Any], text: Optional[str] = None) -> str:
+        """Render a snippet the way the prompt presents document content"""
+        text = snippet["text"] if text is None else text
+        if snippet.get("label"):
+            return f"From {snippet['source']} [{snippet['label']}]: {text}"
+        return f"From {snippet['source']}: {text}"
+
+    @staticmethod
+    def _join_overlapping(first: str, second: str) -> str:
+        """Concatenate consecutive chunks, dropping the words the second repeats from the first"""
+        first_words, second_words = first.split(), second.split()
+        for size in range(min(len(first_words), len(second_words)), 0, -1):
+            if first_words[-size:] == second_words[:size]:
+                return " ".join(first_words + second_words[size:])
+        return " ".join(first_words + second_words)
+
+    def merge_adjacent(self, snippets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Merge hits on neighbouring chunks of one document into contiguous spans.
+
+        Snippets with "content_key" and "chunk_index" are grouped per document; runs of
+        consecutive indexes become one snippet with the overlap between chunks removed. A span
+        scores as its best hit plus a share of the others. Other snippets pass through
+        unchanged.
+        """
+        merged = []
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for snippet in snippets:
+            if snippet.get("content_key") is None or snippet.get("chunk_index") is None:
+                merged.append(snippet)
+            else:
+                groups.setdefault(snippet["content_key"], []).append(snippet)
+
+        for group in groups.values():
+            # The same chunk can come back twice (e.g. via two files sharing content); keep its best hit
+            best: Dict[int, Dict[str, Any]] = {}
+            for snippet in group:
+                index = snippet["chunk_index"]
+                if index not in best or snippet["score"] > best[index]["score"]:
+                    best[index] = snippet
+            ordered = [best[index] for index in sorted(best)]
+
+            run = [ordered[0]]
+            for snippet in ordered[1:] + [None]:
+                if snippet is not None and snippet["chunk_index"] == run[-1]["chunk_index"] + 1:
+                    run.append(snippet)
+                    continue
+
+                span = run[0]
+                if len(run) > 1:
+                    text = run[0]["text"]
+                    for part in run[1:]:
+                        text = self._join_overlapping(text, part["text"])
+                    scores = sorted((part["score"] for part in run), reverse=True)
+                    span = {
+                        **run[0],
+                        "text": text,
+                        "score": scores[0] + Config.PROMPT_MERGE_NEIGHBOR_WEIGHT * sum(scores[1:]),
+                        "last_chunk_index": run[-1]["chunk_index"],
+                        "merged_chunks": len(run)
+                    }
+                merged.append(span)
+                run = [snippet]
+
+        return merged
+
+    def _pack_history(self, history: List[Dict], budget: int) -> Dict[str, Any]:
+        """Keep the most recent messages that fit, truncating the oldest one kept"""
+        packed = []
+        used = 0
+        for msg in reversed(history):
+            prefix = f"{msg['role'].capitalize()}: "
+            cost = self.estimate_tokens(prefix + msg["content"])
+            if used + cost <= budget:
+                packed.append(msg)
+                used += cost
+                continue
+
+            remaining = budget - used - self.estimate_tokens(prefix)
+            if remaining >= self.min_snippet_tokens:
+                content = self.truncate_to_tokens(msg["content"], remaining)
+                if content:
+                    packed.append({**msg, "content": content})
+                    used += self.estimate_tokens(prefix + content)
+            break
+
+        packed.reverse()
+        return {"messages": packed, "tokens": used}
+
+    def pack(self, fixed_text: str, snippets: List[Dict[str, Any]],
+             history: Optional[List[Dict]] = None) -> Dict[str, Any]:
+        """Select history and the highest-scoring snippets that fit alongside fixed_text.
+
+        Each snippet is a dict with "text", "source", "score" and an optional "label".
+        """
+        fixed_tokens = self.estimate_tokens(fixed_text)
+        available = max(0, self.token_budget - fixed_tokens)
+
+        history_result = self._pack_history(history or [], min(self.history_tokens, available))
+        available -= history_result["tokens"]
+
+        packed = []
+        context_tokens = 0
+        truncated = 0
+        ranked = sorted(snippets, key=lambda s: s["score"], reverse=True)
+        too_big = []
+        for snippet in ranked:
+            formatted = self.format_snippet(snippet)
+            cost = self.estimate_tokens(formatted) + 1  # +1 for the joining newline
+            if context_tokens + cost <= available:
+                packed.append({**snippet, "formatted": formatted})
+                context_tokens += cost
+            else:
+                too_big.append(snippet)
+
+        # Whole snippets go first, even lower-ranked ones; then what is left holds the start
+        # of the best snippets that didn't fit. A snippet may push out whole ones ranked below
+        # it to get at least min_snippet_tokens, so small snippets can't crowd out a top hit
+        partial = []
+        for snippet in too_big:
+            remaining = available - context_tokens - self.estimate_tokens(self.format_snippet(snippet, "")) - 1
+            costs = [self.estimate_tokens(s["formatted"]) + 1 for s in packed if s["score"] < snippet["score"]]
+            if remaining + sum(costs) < self.min_snippet_tokens:
+                continue
+            # packed is in rank order, so the whole snippets ranked below this one are at its end
+            while remaining < self.min_snippet_tokens:
+                packed.pop()
+                freed = costs.pop()
+                remaining += freed
+                context_tokens -= freed
+            text = self.truncate_to_tokens(snippet["text"], remaining)
+            if text:
+                formatted = self.format_snippet(snippet, text)
+                partial.append({**snippet, "text": text, "formatted": formatted})
+                context_tokens += self.estimate_tokens(formatted) + 1
+                truncated += 1
+        # Keep the prompt in rank order (the sort is stable, so ties keep theirs)
+        packed = sorted(packed + partial, key=lambda s: s["score"], reverse=True)
+
+        return {
+            "snippets": packed,
+            "history": history_result["messages"],
+            "dropped_snippets": len(ranked) - len(packed),
+            "truncated_snippets": truncated,
+            "tokens": {
+                "fixed": fixed_tokens,
+                "history": history_result["tokens"],
+                "context": context_tokens,
+                "budget": self.token_budget
+            }
+        }
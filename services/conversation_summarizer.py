@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from typing import Dict, Any, List, Set
+from config import Config
+from services.admission import BATCH
+
+class ConversationSummarizer:
+    """Fold older chat messages into a stored running summary, off the request path"""
+
+    def __init__(self, gemini_service, chat_manager):
+        self.gemini_service = gemini_service
+        self.chat_manager = chat_manager
+        self.every_messages = Config.SUMMARY_EVERY_TURNS * 2  # a turn is a user + assistant message
+        self.keep_messages = Config.SUMMARY_KEEP_MESSAGES
+        self.max_words = Config.SUMMARY_MAX_WORDS
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def get_context(self, session_id: str) -> Dict[str, Any]:
+        """Summary plus the messages not yet folded into it (at most one fold window's worth)"""
+        summary = self.chat_manager.get_summary(session_id)
+        recent = self.chat_manager.get_messages_after(
+            session_id, summary["summarized_rowid"],
+            limit=self.keep_messages + self.every_messages
+        )
+        return {"summary": summary["summary"], "messages": recent}
+
+    def schedule(self, session_id: str):
+        """Start a background fold if enough unsummarized turns have piled up"""
+        if session_id in self._running:
+            return
+
+        summary = self.chat_manager.get_summary(session_id)
+        pending = self.chat_manager.get_messages_after(session_id, summary["summarized_rowid"])
+        if len(pending) < self.keep_messages + self.every_messages:
+            return
+
+        self._running.add(session_id)
+        task = asyncio.create_task(self._fold(session_id, summary["summary"], pending))
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self, timeout: float = 5.0):
+        """Give in-flight folds a chance to save before shutdown"""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+
+    def _build_prompt(self, previous_summary: str, messages: List[Dict]) -> str:
+        transcript = "\n".join(f"{msg['role'].capitalize()}: {msg['content']}" for msg in messages)
+        previous = previous_summary or "(none yet)"
+        return f"""You maintain a running summary of a tutoring conversation between a student and an educational AI assistant.
+
+Current summary:
+{previous}
+
+New messages to fold in:
+{transcript}
+
+Write the updated summary in at most {self.max_words} words. Keep the topics covered, problems worked on, what the student understood or struggled with, and any preferences they stated. Output only the summary."""
+
+    async def _fold(self, session_id: str, previous_summary: str, pending: List[Dict]):
+        try:
+            to_fold = pending[:-self.keep_messages] if self.keep_messages else pending
+            # Nobody is waiting on the summary, so it uses the batch share of the quota
+            summary = await self.gemini_service.generate_text(self._build_prompt(previous_summary, to_fold),
+                                                              lane=BATCH)
+            self.chat_manager.save_summary(session_id, summary.strip(), to_fold[-1]["rowid"])
+            logging.info(f"Folded {len(to_fold)} messages into summary for session {session_id}")
+        except Exception as e:
+            # The raw messages stay unsummarized, so the next turn simply retries
+            logging.warning(f"Could not update conversation summary for {session_id}: {e}")
+        finally:
+            self._running.discard(session_id)
@@ -1,23 +1,66 @@
-import google.generativeai as genai
 from config import Config
 from typing import List, Dict, Any
+import asyncio
+import hashlib
 import logging
-import base64
-from PIL import Image
-import io
+from services.image_service import image_preprocessor
+from services.llm_providers import LLMProvider, create_provider
+from services.context_packer import ContextPacker
+from services.resilience import ResilientCaller, SingleFlight, call_key
+from services.quota import quota_scheduler
+from services.admission import INTERACTIVE, BATCH
 
 class GeminiService:
-    def __init__(self):
-        self.genai = Config.initialize_gemini()
-        self.model = genai.GenerativeModel(Config.GEMINI_MODEL)
+    def __init__(self, provider: LLMProvider = None):
+        # Config.LLM_PROVIDER=fake swaps in the offline stand-in
+        self.provider = provider or create_provider()
         self.embedding_model = Config.EMBEDDING_MODEL
+        # Retries, hedging and the circuit breaker shared by every call below
+        self.caller = ResilientCaller(Config.LLM_PROVIDER)
+        # Identical calls already in flight are joined rather than repeated
+        self.flights = SingleFlight()
+        # Per-model RPM/TPM budgets, shared by every GeminiService in the process
+        self.quota = quota_scheduler
         
-    async def generate_text(self, prompt: str, context: str = "") -> str:
-        """Generate text response using Gemini"""
+    async def _call(self, operation: str, model: str, inputs: Any, call, tokens: int, requests: int = 1,
+                    lane: str = None):
+        """Resilient provider call, shared with identical calls already in flight.
+
+        Every attempt first waits for `requests` and an estimated `tokens` from the model's
+        quota in `lane`; by default document embedding is batch work, everything else is
+        interactive.
+        """
+        key = call_key(operation, f"{Config.LLM_PROVIDER}:{model}", inputs)
+        embedding = operation in ("embed", "query_embed")
+        quota = self.quota.quota(model, "embed" if embedding else "generate")
+        lane = lane or (BATCH if operation == "embed" else INTERACTIVE)
+        expected_output = 0 if embedding else Config.QUOTA_EXPECTED_OUTPUT_TOKENS
+
+        async def admit():
+            await quota.acquire(requests, tokens + expected_output, lane)
+            return lambda: quota.refund(requests, tokens + expected_output)
+
+        async def metered():
+            try:
+                result = await call()
+            except BaseException:
+                # No answer came back: return the tokens reserved for it
+                if expected_output:
+                    quota.settle(-expected_output)
+                raise
+            if expected_output:
+                quota.settle(ContextPacker.estimate_tokens(result) - expected_output)
+            return result
+
+        return await self.flights.do(operation, key, lambda: self.caller.call(operation, metered, admit))
+
+    async def generate_text(self, prompt: str, context: str = "", lane: str = INTERACTIVE) -> str:
+        """Generate text response using Gemini; background generations pass lane=BATCH"""
         try:
             full_prompt = f"{context}\n\nUser Question: {prompt}" if context else prompt
-            response = self.model.generate_content(full_prompt)
-            return response.text
+            return await self._call("generate", Config.GEMINI_MODEL, full_prompt,
+                                    lambda: self.provider.generate(full_prompt),
+                                    tokens=ContextPacker.estimate_tokens(full_prompt), lane=lane)
         except Exception as e:
             logging.error(f"Error generating text: {e}")
             raise
@@ -26,25 +69,19 @@ class GeminiService:
         """Generate embeddings for text chunks with batching"""
         try:
             embeddings = []
-            batch_size = 5  # Process 5 chunks at once to reduce API calls
+            batch_size = Config.EMBEDDING_BATCH_SIZE  # One API call per batch
             
             for i in range(0, len(texts), batch_size):
                 batch = texts[i:i + batch_size]
-                batch_embeddings = []
-                
-                for text in batch:
-                    result = genai.embed_content(
-                        model=self.embedding_model,
-                        content=text,
-                        task_type="retrieval_document"
-                    )
-                    batch_embeddings.append(result['embedding'])
-                
-                embeddings.extend(batch_embeddings)
+                # Each batch is retried on its own, so a transient error doesn't redo finished ones
+                embeddings.extend(await self._call(
+                    "embed", self.embedding_model, batch,
+                    lambda: self.provider.embed_batch(batch, "retrieval_document"),
+                    tokens=sum(ContextPacker.estimate_tokens(text) for text in batch), requests=len(batch)
+                ))
                 
                 # Small delay between batches to prevent rate limiting
                 if i + batch_size < len(texts):
-                    import asyncio
                     await asyncio.sleep(0.1)
                     
             return embeddings
@@ -55,12 +92,9 @@ class GeminiService:
     async def generate_query_embedding(self, query: str) -> List[float]:
         """Generate embedding for search query"""
         try:
-            result = genai.embed_content(
-                model=self.embedding_model,
-                content=query,
-                task_type="retrieval_query"
-            )
-            return result['embedding']
+            return await self._call("query_embed", self.embedding_model, query,
+                                    lambda: self.provider.embed(query, "retrieval_query"),
+                                    tokens=ContextPacker.estimate_tokens(query))
         except Exception as e:
             logging.error(f"Error generating query embedding: {e}")
             raise
@@ -68,20 +102,19 @@ class GeminiService:
     async def generate_text_with_image(self, prompt: str, image_data: str, context: str = "") -> str:
         """Generate text response using Gemini with image input"""
         try:
-            # Remove data URL prefix if present
-            if image_data.startswith('data:image/'):
-                image_data = image_data.split(',')[1]
-            
-            # Decode base64 image
-            image_bytes = base64.b64decode(image_data)
-            image = Image.open(io.BytesIO(image_bytes))
+            # Downscale and re-encode (cached by content hash) before upload, off the event loop;
+            # hashing a large payload for the cache lookup isn't free either
+            image = await asyncio.to_thread(image_preprocessor.preprocess, image_data)
             
             # Create full prompt
             full_prompt = f"{context}\n\nUser Question: {prompt}" if context else prompt
             
             # Generate content with image
-            response = self.model.generate_content([full_prompt, image])
-            return response.text
+            contents = [full_prompt, {"mime_type": image["mime_type"], "data": image["data"]}]
+            image_digest = hashlib.sha256(image["data"]).hexdigest()
+            return await self._call("generate_image", Config.GEMINI_MODEL, [full_prompt, image_digest],
+                                    lambda: self.provider.generate(contents),
+                                    tokens=ContextPacker.estimate_tokens(full_prompt) + Config.QUOTA_IMAGE_TOKENS)
             
         except Exception as e:
             logging.error(f"Error generating text with image: {e}")
@@ -0,0 +1,120 @@
+import hashlib
+import io
+import logging
+import threading
+from typing import Dict, Any, Tuple
+import pybase64
+from cachetools import LRUCache
+from PIL import Image, ImageOps, ImageStat
+from config import Config
+
+class ImageTooLargeError(ValueError):
+    """Raised when an image payload exceeds the configured limits"""
+
+class ImagePreprocessor:
+    """Decode, downscale and re-encode vision images before they are sent to the model"""
+
+    def __init__(self):
+        self.max_payload = Config.MAX_IMAGE_PAYLOAD
+        self.max_pixels = Config.MAX_IMAGE_PIXELS
+        self.max_side = Config.IMAGE_MAX_SIDE
+        self.max_bytes = Config.IMAGE_MAX_BYTES
+        self.output_format = Config.IMAGE_FORMAT.upper()
+        self._cache = LRUCache(maxsize=Config.IMAGE_CACHE_SIZE)
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @staticmethod
+    def _strip_data_url(image_data: str) -> str:
+        """Remove a data URL prefix if present"""
+        if image_data.startswith('data:'):
+            return image_data.split(',', 1)[1]
+        return image_data
+
+    def _is_grayscale(self, image: Image.Image) -> bool:
+        """Treat near-colourless images (scanned worksheets, photos of paper) as grayscale"""
+        if image.mode in ("L", "LA", "1"):
+            return True
+        sample = image.convert("RGB")
+        sample.thumbnail((64, 64))
+        saturation = ImageStat.Stat(sample.convert("HSV")).mean[1]
+        return saturation < Config.IMAGE_GRAYSCALE_SATURATION
+
+    def _encode(self, image: Image.Image) -> Tuple[bytes, Tuple[int, int]]:
+        """Re-encode, stepping quality (then size) down until under the byte limit.
+        Returns the data and the (width, height) it was encoded at."""
+        quality = 85
+        while True:
+            buffer = io.BytesIO()
+            image.save(buffer, format=self.output_format, quality=quality, optimize=True)
+            data = buffer.getvalue()
+            if len(data) <= self.max_bytes:
+                return data, image.size
+            if quality > 45:
+                quality -= 10
+            elif max(image.size) > 512:
+                image = image.resize((image.width * 3 // 4, image.height * 3 // 4), Image.LANCZOS)
+            else:
+                return data, image.size
+
+    def _process(self, encoded: str) -> Dict[str, Any]:
+        image_bytes = pybase64.b64decode(encoded)
+        image = Image.open(io.BytesIO(image_bytes))
+
+        # Image.open only reads the header, so check dimensions before decoding pixels
+        if image.width * image.height > self.max_pixels:
+            raise ImageTooLargeError(f"Image is {image.width}x{image.height}, over the pixel limit")
+
+        # Let the JPEG decoder downscale by a power of two while decoding
+        image.draft("RGB", (self.max_side, self.max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+
+        if self._is_grayscale(image):
+            image = image.convert("L")
+        else:
+            image = image.convert("RGB")
+
+        data, (width, height) = self._encode(image)
+        return {
+            "mime_type": f"image/{self.output_format.lower()}",
+            "data": data,
+            "width": width,
+            "height": height,
+            "original_bytes": len(image_bytes)
+        }
+
+    def preprocess(self, image_data: str) -> Dict[str, Any]:
+        """Turn a base64 image (or data URL) into a size-bounded blob ready for the model"""
+        encoded = self._strip_data_url(image_data)
+
+        # Base64 inflates by 4/3, so the decoded size is known without decoding
+        if len(encoded) * 3 // 4 > self.max_payload:
+            raise ImageTooLargeError(
+                f"Image payload exceeds {self.max_payload // (1024 * 1024)}MB limit"
+            )
+
+        key = hashlib.sha256(encoded.encode("ascii", "ignore")).hexdigest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached:
+                self.cache_hits += 1
+                return cached
+            self.cache_misses += 1
+
+        try:
+            result = self._process(encoded)
+        except ImageTooLargeError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Invalid image data: {e}")
+
+        logging.info(f"Preprocessed image {result['original_bytes']} -> {len(result['data'])} bytes "
+                     f"({result['width']}x{result['height']} {result['mime_type']})")
+        with self._lock:
+            self._cache[key] = result
+        return result
+
+# Global image preprocessor instance
+image_preprocessor = ImagePreprocessor()
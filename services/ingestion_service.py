@@ -0,0 +1,603 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+import zipfile
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Callable, Optional, BinaryIO
+from config import Config
+from models.progress_tracker import ProcessingStage
+from services.reindex_service import chunk_hash
+from services.metrics import ACTIVE_UPLOADS
+
+class ByteBudget:
+    """Async limit on the estimated bytes held by in-flight ingestions.
+
+    A single item larger than the whole budget is still admitted once nothing else is
+    in flight, so an oversized PDF is processed alone rather than never.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, amount: int):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_use == 0 or self.in_use + amount <= self.limit)
+            self.in_use += amount
+
+    async def release(self, amount: int):
+        async with self._condition:
+            self.in_use -= amount
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def reserve(self, amount: int):
+        await self.acquire(amount)
+        try:
+            yield
+        finally:
+            await self.release(amount)
+
+class IngestionService:
+    """Full PDF ingestion pipeline shared by single and bulk uploads.
+
+    Extraction and embedding each run under their own concurrency limit, and every
+    ingestion reserves an estimate of its memory from one global byte budget first.
+    """
+
+    def __init__(self, pdf_service, gemini_service, vector_service, text_storage, db, progress_tracker,
+                 lock_for: Callable[[str], asyncio.Lock], page_cache=None):
+        self.pdf_service = pdf_service
+        self.gemini_service = gemini_service
+        self.vector_service = vector_service
+        self.text_storage = text_storage
+        self.db = db
+        self.progress_tracker = progress_tracker
+        self.lock_for = lock_for
+        self.page_cache = page_cache
+        self.extract_slots = asyncio.Semaphore(Config.INGEST_EXTRACT_CONCURRENCY)
+        self.embed_slots = asyncio.Semaphore(Config.INGEST_EMBED_CONCURRENCY)
+        self.memory = ByteBudget(Config.INGEST_MEMORY_BUDGET_MB * 1024 * 1024)
+
+    def store_pdf(self, blob_id: str, content: bytes):
+        pdf_path = os.path.join(Config.UPLOAD_DIR, f"{blob_id}.pdf")
+        if not os.path.exists(pdf_path):
+            with open(pdf_path, "wb") as f:
+                f.write(content)
+
+    async def remove_file(self, file_id: str, file_info: Dict):
+        """Delete a file record; its text, vectors and PDF go with the last reference to the content"""
+        self.db.delete_file(file_id)
+
+        # Delete area vectors (and the content of files uploaded before deduplication)
+        try:
+            await self.vector_service.delete_document_chunks(file_id)
+        except Exception as e:
+            logging.warning(f"Could not delete from vector DB: {e}")
+
+        # Shared content goes with its last reference
+        blob_id = file_info.get("blob_id")
+        content_key = None
+        if blob_id:
+            async with self.lock_for(blob_id):
+                if self.db.release_blob(blob_id):
+                    content_key = blob_id
+                    try:
+                        await self.vector_service.delete_by_metadata({"blob_id": blob_id})
+                    except Exception as e:
+                        logging.warning(f"Could not delete from vector DB: {e}")
+        else:
+            content_key = file_id
+
+        if content_key:
+            self.text_storage.delete_file_chunks(content_key)
+            self.db.clear_index_version(content_key)
+            pdf_path = os.path.join(Config.UPLOAD_DIR, f"{content_key}.pdf")
+            if os.path.exists(pdf_path):
+                os.remove(pdf_path)
+            if self.page_cache:
+                self.page_cache.evict(content_key)
+
+    def reserve(self, file_size: int):
+        """Hold memory for one ingestion; PDF bytes, text, chunks and embeddings are alive at once"""
+        return self.memory.reserve(file_size * Config.INGEST_MEMORY_FACTOR)
+
+    async def ingest(self, file_id: str, filename: str, content: bytes) -> Dict[str, Any]:
+        """Extract, chunk, embed and store one PDF, reporting stages to the progress tracker.
+
+        The caller must have called progress_tracker.start_processing(file_id, ...) already.
+        """
+        async with self.reserve(len(content)):
+            return await self.process(file_id, filename, content)
+
+    async def process(self, file_id: str, filename: str, content: bytes) -> Dict[str, Any]:
+        """ingest() for callers that reserved memory before reading the file"""
+        # Counted here rather than per HTTP request, so bulk jobs and the CLI show up too
+        ACTIVE_UPLOADS.inc()
+        try:
+            return await self._process(file_id, filename, content)
+        finally:
+            ACTIVE_UPLOADS.dec()
+
+    async def _process(self, file_id: str, filename: str, content: bytes) -> Dict[str, Any]:
+        # Identical content is processed once; later copies reuse its text and vectors
+        blob_id = hashlib.sha256(content).hexdigest()
+        async with self.lock_for(blob_id):
+            blob = self.db.get_blob(blob_id)
+            if blob and blob["status"] == "completed":
+                self.db.add_file(file_id, filename, len(content), blob["total_pages"],
+                                 blob_id=blob_id, status="completed")
+                self.progress_tracker.update_stage(file_id, ProcessingStage.COMPLETED,
+                                                   f"{filename} was already processed, reusing it",
+                                                   extra_data={"total_pages": blob["total_pages"],
+                                                               "total_chunks": blob["total_chunks"]})
+                self.progress_tracker.cleanup_completed(file_id, delay_seconds=300)
+                logging.info(f"Duplicate upload of {filename}, reusing content {blob_id[:12]}")
+                return {
+                    "file_id": file_id,
+                    "filename": filename,
+                    "total_pages": blob["total_pages"],
+                    "total_chunks": blob["total_chunks"],
+                    "status": "completed",
+                    "deduplicated": True
+                }
+
+            async with self.extract_slots:
+                # Stage 1: Extract text from PDF
+                self.progress_tracker.update_stage(file_id, ProcessingStage.EXTRACTING_TEXT,
+                                                   "Extracting text from PDF...")
+                pdf_data = await self.pdf_service.extract_text_from_pdf(content)
+                logging.info(f"Extracted {pdf_data['total_pages']} pages, {pdf_data['total_chars']} characters")
+
+                # Update progress with page count
+                self.progress_tracker.update_stage(file_id, ProcessingStage.EXTRACTING_TEXT,
+                                                   f"Extracted {pdf_data['total_pages']} pages successfully",
+                                                   extra_data={"total_pages": pdf_data["total_pages"]})
+
+                # Store the original PDF file for viewing
+                self.db.create_blob(blob_id, len(content), pdf_data["total_pages"])
+                self.store_pdf(blob_id, content)
+
+                # Save file info to database
+                self.db.add_file(
+                    file_id=file_id,
+                    filename=filename,
+                    file_size=len(content),
+                    total_pages=pdf_data["total_pages"],
+                    blob_id=blob_id
+                )
+
+                # Stage 2: Chunk text for embedding
+                self.progress_tracker.update_stage(file_id, ProcessingStage.CHUNKING_TEXT,
+                                                   "Breaking text into chunks...")
+                chunks = self.pdf_service.chunk_text(pdf_data["total_text"])
+                self.text_storage.store_source_text(blob_id, pdf_data["total_text"])
+                # Keyword search needs these when embeddings fail or the model circuit is open
+                self.text_storage.store_text_chunks(blob_id, chunks)
+                self.progress_tracker.update_stage(file_id, ProcessingStage.CHUNKING_TEXT,
+                                                   f"Created {len(chunks)} text chunks",
+                                                   extra_data={"total_chunks": len(chunks)})
+
+            return await self._embed_and_store(file_id, filename, blob_id, chunks, pdf_data["total_pages"],
+                                               replace=blob is not None)
+
+    async def retry_embeddings(self, file_id: str, file_info: Dict) -> Dict[str, Any]:
+        """Embed a file whose earlier embedding failed, from the stored source text.
+
+        The caller must have called progress_tracker.start_processing(file_id, ...) already.
+        """
+        ACTIVE_UPLOADS.inc()
+        try:
+            return await self._retry_embeddings(file_id, file_info)
+        finally:
+            ACTIVE_UPLOADS.dec()
+
+    async def _retry_embeddings(self, file_id: str, file_info: Dict) -> Dict[str, Any]:
+        blob_id = file_info["blob_id"]
+        async with self.lock_for(blob_id):
+            blob = self.db.get_blob(blob_id)
+            if blob and blob["status"] == "completed":
+                # Another upload of the same content finished it in the meantime
+                self.db.update_file_status(file_id, "completed")
+                self.progress_tracker.update_stage(file_id, ProcessingStage.COMPLETED,
+                                                   f"{file_info['filename']} was already processed, reusing it")
+                self.progress_tracker.cleanup_completed(file_id, delay_seconds=300)
+                return {
+                    "file_id": file_id,
+                    "filename": file_info["filename"],
+                    "total_pages": blob["total_pages"],
+                    "total_chunks": blob["total_chunks"],
+                    "status": "completed"
+                }
+
+            text = self.text_storage.get_source_text(blob_id)
+            if text is None:
+                raise ValueError(f"No stored text for {file_info['filename']}")
+            chunks = self.pdf_service.chunk_text(text)
+            self.text_storage.store_text_chunks(blob_id, chunks)
+            self.progress_tracker.update_stage(file_id, ProcessingStage.CHUNKING_TEXT,
+                                               f"Created {len(chunks)} text chunks from the stored text",
+                                               extra_data={"total_pages": file_info["total_pages"],
+                                                           "total_chunks": len(chunks)})
+            return await self._embed_and_store(file_id, file_info["filename"], blob_id, chunks,
+                                               file_info["total_pages"], replace=True)
+
+    async def _embed_and_store(self, file_id: str, filename: str, blob_id: str, chunks: List[str],
+                               total_pages: int, replace: bool) -> Dict[str, Any]:
+        """Embed the chunks of a blob and store the vectors; the caller holds the blob's lock"""
+        # Stage 3: Generate embeddings (this is the slow part!)
+        try:
+            async with self.embed_slots:
+                self.progress_tracker.update_stage(file_id, ProcessingStage.GENERATING_EMBEDDINGS,
+                                                   f"Generating embeddings for {len(chunks)} chunks...")
+                embeddings = await self.gemini_service.generate_embeddings(chunks)
+                self.progress_tracker.update_embedding_progress(file_id, len(chunks), len(chunks))
+
+            # Stage 4: Store in vector database
+            self.progress_tracker.update_stage(file_id, ProcessingStage.STORING_VECTORS,
+                                               "Storing embeddings in vector database...")
+
+            # Prepare metadata; chunks belong to the shared content, not to this upload
+            metadata = [
+                {
+                    "blob_id": blob_id,
+                    "filename": filename,
+                    "chunk_index": i,
+                    "chunk_type": "general_text",
+                    "chunk_hash": chunk_hash(chunk),
+                    "pipeline_version": Config.pipeline_version(),
+                    "embedding_version": Config.embedding_version()
+                }
+                for i, chunk in enumerate(chunks)
+            ]
+
+            # Store in vector database, replacing anything left by an interrupted attempt
+            if replace:
+                await self.vector_service.delete_by_metadata({"blob_id": blob_id})
+            chunk_ids = await self.vector_service.add_documents(chunks, embeddings, metadata)
+            logging.info(f"Stored {len(chunk_ids)} chunks in vector database")
+
+        except Exception as embed_error:
+            logging.error(f"Embedding error (API key issue?): {embed_error}")
+            self.progress_tracker.set_error(file_id, f"Embedding failed: {str(embed_error)}")
+            # Continue without embeddings for now - just store the file. The blob (and every
+            # file sharing it) stays text-only until a retry embeds it
+            self.db.update_blob_status(blob_id, "text_extracted", len(chunks))
+            self.db.set_index_version(blob_id, Config.pipeline_version(), len(chunks))
+            return {
+                "file_id": file_id,
+                "filename": filename,
+                "total_pages": total_pages,
+                "total_chunks": len(chunks),
+                "status": "text_extracted",
+                "warning": "Embeddings failed - check API key. You can still view the document but chat won't work."
+            }
+
+        # Stage 5: Final completion
+        self.progress_tracker.update_stage(file_id, ProcessingStage.COMPLETED,
+                                           f"Successfully processed {filename}!")
+        self.db.update_blob_status(blob_id, "completed", len(chunks))
+        self.db.set_index_version(blob_id, Config.pipeline_version(), len(chunks))
+        self.db.update_file_status(file_id, "completed")
+
+        logging.info(f"Successfully processed PDF: {filename}")
+
+        # Schedule cleanup of progress data
+        self.progress_tracker.cleanup_completed(file_id, delay_seconds=300)  # 5 minutes
+
+        return {
+            "file_id": file_id,
+            "filename": filename,
+            "total_pages": total_pages,
+            "total_chunks": len(chunks),
+            "status": "completed"
+        }
+
+# Manifest entries in these states are not processed again on resume; a text_extracted
+# file (embedding failed) is retried from its stored text
+FINISHED_STATUSES = ("completed",)
+# States a file can end a run in; anything else is still queued or was interrupted
+ENDED_STATUSES = ("completed", "text_extracted", "failed")
+
+class UploadTooLargeError(ValueError):
+    """A streamed upload went over MAX_FILE_SIZE"""
+
+class _LimitedReader:
+    """Read-only view of a stream that raises once more than `limit` bytes have been read"""
+
+    def __init__(self, stream: BinaryIO, limit: int, name: str):
+        self.stream = stream
+        self.limit = limit
+        self.name = name
+        self.total = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.total += len(data)
+        if self.total > self.limit:
+            raise UploadTooLargeError(f"File too large: {self.name}")
+        return data
+
+class BulkIngestion:
+    """Batches of PDFs ingested through the shared pipeline.
+
+    Each job has a JSON manifest listing its files with a pre-assigned file ID and status,
+    rewritten after every change, so an interrupted job can be resumed and only the files
+    that didn't finish are processed again.
+    """
+
+    def __init__(self, ingestion_service, progress_tracker, bulk_dir: Optional[str] = None, admission=None):
+        self.ingestion = ingestion_service
+        self.progress_tracker = progress_tracker
+        # Files take batch admission slots, so a big job yields to chat
+        self.admission = admission
+        self.bulk_dir = bulk_dir or Config.BULK_DIR
+        self._tasks: Dict[str, asyncio.Task] = {}
+        os.makedirs(self.bulk_dir, exist_ok=True)
+
+    def manifest_path(self, job_id: str) -> str:
+        return os.path.join(self.bulk_dir, f"{job_id}.json")
+
+    def load(self, job_id: str) -> Optional[Dict]:
+        try:
+            with open(self.manifest_path(job_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, manifest: Dict):
+        """Write the manifest atomically so a crash never leaves it half-written"""
+        manifest["updated_at"] = time.time()
+        path = self.manifest_path(manifest["job_id"])
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+    def create_job(self, entries: List[Dict], job_id: Optional[str] = None) -> Dict:
+        """Record a new job; entries need name, path and size (member for files inside a zip)"""
+        manifest = {
+            "job_id": job_id or str(uuid.uuid4()),
+            "state": "pending",
+            "created_at": time.time(),
+            "files": [
+                {**entry, "file_id": str(uuid.uuid4()), "status": "pending", "error": None}
+                for entry in entries
+            ]
+        }
+        self.save(manifest)
+        return manifest
+
+    def stage_upload(self, job_id: str, index: int, name: str, stream: BinaryIO) -> Dict:
+        """Copy one uploaded file to disk, where it stays until the job finishes so the job can
+        resume after a restart. Blocking; raises UploadTooLargeError past MAX_FILE_SIZE."""
+        job_dir = os.path.join(self.bulk_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        path = os.path.join(job_dir, f"{index:04d}.pdf")
+        with open(path, "wb") as f:
+            shutil.copyfileobj(_LimitedReader(stream, Config.MAX_FILE_SIZE, name), f, 1024 * 1024)
+            size = f.tell()
+        return {"name": name, "path": path, "size": size}
+
+    def discard_staged(self, job_id: str):
+        """Drop the staged files of a job that was never created"""
+        shutil.rmtree(os.path.join(self.bulk_dir, job_id), ignore_errors=True)
+
+    @staticmethod
+    def scan(source: str) -> List[Dict]:
+        """PDFs in a directory (recursively) or a zip archive"""
+        entries = []
+        if zipfile.is_zipfile(source):
+            with zipfile.ZipFile(source) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and info.filename.lower().endswith(".pdf"):
+                        entries.append({"name": os.path.basename(info.filename), "path": source,
+                                        "member": info.filename, "size": info.file_size})
+        elif os.path.isdir(source):
+            for root, _, names in os.walk(source):
+                for name in names:
+                    if name.lower().endswith(".pdf"):
+                        path = os.path.join(root, name)
+                        entries.append({"name": name, "path": path, "size": os.path.getsize(path)})
+        else:
+            raise ValueError(f"{source} is not a directory or zip file")
+        return sorted(entries, key=lambda entry: (entry["path"], entry.get("member", "")))
+
+    @staticmethod
+    def read(entry: Dict) -> bytes:
+        if entry.get("member"):
+            with zipfile.ZipFile(entry["path"]) as archive:
+                return archive.read(entry["member"])
+        with open(entry["path"], "rb") as f:
+            return f.read()
+
+    async def _ingest_entry(self, manifest: Dict, entry: Dict):
+        if self.admission is None:
+            return await self._ingest_admitted(manifest, entry)
+        # Background work has nobody to retry a 429, so it waits for its slot instead
+        async with self.admission.admit("batch", wait=True):
+            return await self._ingest_admitted(manifest, entry)
+
+    async def _ingest_admitted(self, manifest: Dict, entry: Dict):
+        file_id = entry["file_id"]
+        async with self.ingestion.reserve(entry["size"]):
+            try:
+                # A file row left by an interrupted run is finished, retried from its stored text
+                # if only the embedding failed, or removed and redone
+                existing = self.ingestion.db.get_file(file_id)
+                if existing and existing["status"] in FINISHED_STATUSES:
+                    entry.update(status=existing["status"], error=None)
+                    self.save(manifest)
+                    return
+                retry = bool(existing and existing["status"] == "text_extracted" and existing.get("blob_id"))
+                if existing and not retry:
+                    await self.ingestion.remove_file(file_id, existing)
+
+                entry.update(status="processing", error=None)
+                self.save(manifest)
+                self.progress_tracker.start_processing(file_id, entry["name"], 0)
+                if retry:
+                    result = await self.ingestion.retry_embeddings(file_id, existing)
+                else:
+                    if entry["size"] > Config.MAX_FILE_SIZE:
+                        raise ValueError("File too large")
+                    content = await asyncio.to_thread(self.read, entry)
+                    result = await self.ingestion.process(file_id, entry["name"], content)
+                entry.update(status=result["status"], total_pages=result["total_pages"],
+                             total_chunks=result["total_chunks"],
+                             deduplicated=result.get("deduplicated", False))
+            except Exception as e:
+                logging.error(f"Bulk ingestion of {entry['name']} failed: {e}")
+                self.progress_tracker.set_error(file_id, str(e))
+                entry.update(status="failed", error=str(e))
+            self.save(manifest)
+
+    async def run(self, job_id: str) -> Dict:
+        """Process every unfinished file of a job; concurrency is bounded by the ingestion service"""
+        manifest = self.load(job_id)
+        if manifest is None:
+            raise KeyError(f"Unknown bulk job: {job_id}")
+        manifest["state"] = "running"
+        self.save(manifest)
+
+        pending = [entry for entry in manifest["files"] if entry["status"] not in FINISHED_STATUSES]
+        logging.info(f"Bulk job {job_id}: {len(pending)} of {len(manifest['files'])} files to ingest")
+        await asyncio.gather(*(self._ingest_entry(manifest, entry) for entry in pending))
+
+        manifest["state"] = "completed"
+        manifest["finished_at"] = time.time()
+        self.save(manifest)
+
+        # Staged uploads are only needed until every file is completed
+        if all(entry["status"] in FINISHED_STATUSES for entry in manifest["files"]):
+            for entry in manifest["files"]:
+                if os.path.dirname(entry["path"]) == os.path.join(self.bulk_dir, job_id) and os.path.exists(entry["path"]):
+                    os.remove(entry["path"])
+        return manifest
+
+    def is_running(self, job_id: str) -> bool:
+        task = self._tasks.get(job_id)
+        return task is not None and not task.done()
+
+    def start(self, job_id: str) -> bool:
+        """Run a job in the background; returns False if it is already running here"""
+        if self.is_running(job_id):
+            return False
+        self._tasks[job_id] = asyncio.create_task(self.run(job_id))
+        return True
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Aggregated view of a job: counts per status, overall percent and per-file progress"""
+        manifest = self.load(job_id)
+        if manifest is None:
+            return None
+
+        counts: Dict[str, int] = {}
+        files = []
+        percent_total = 0
+        for entry in manifest["files"]:
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+            progress = self.progress_tracker.get_progress(entry["file_id"])
+            if entry["status"] in ENDED_STATUSES:
+                percent = 100
+            elif entry["status"] == "processing" and progress:
+                percent = progress["progress_percent"]
+            else:
+                percent = 0
+            percent_total += percent
+            files.append({
+                "name": entry["name"],
+                "file_id": entry["file_id"],
+                "status": entry["status"],
+                "error": entry["error"],
+                "stage": progress["stage"] if progress else None,
+                "progress_percent": percent
+            })
+
+        state = manifest["state"]
+        # Saved as running but no longer being processed: the server stopped mid-job
+        if state == "running" and not self.is_running(job_id):
+            state = "interrupted"
+        return {
+            "job_id": job_id,
+            "state": state,
+            "total_files": len(files),
+            "counts": counts,
+            "progress_percent": round(percent_total / len(files)) if files else 100,
+            "created_at": manifest["created_at"],
+            "updated_at": manifest["updated_at"],
+            "files": files
+        }
+
+    async def close(self):
+        # The manifests stay "running", so these jobs show up as interrupted and can be resumed
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+
+async def _main(args) -> int:
+    from services.pdf_service import PDFService
+    from services.gemini_service import GeminiService
+    from services.vector_service import VectorService
+    from models.text_storage import TextStorage
+    from models.database import DatabaseManager
+    from models.progress_tracker import progress_tracker
+
+    if args.extract_concurrency:
+        Config.INGEST_EXTRACT_CONCURRENCY = args.extract_concurrency
+    if args.embed_concurrency:
+        Config.INGEST_EMBED_CONCURRENCY = args.embed_concurrency
+    if args.memory_mb:
+        Config.INGEST_MEMORY_BUDGET_MB = args.memory_mb
+    os.makedirs(Config.UPLOAD_DIR, exist_ok=True)
+
+    locks: Dict[str, asyncio.Lock] = {}
+    ingestion = IngestionService(PDFService(), GeminiService(), VectorService(), TextStorage(), DatabaseManager(),
+                                 progress_tracker, lock_for=lambda key: locks.setdefault(key, asyncio.Lock()))
+    bulk = BulkIngestion(ingestion, progress_tracker)
+
+    if args.resume:
+        job_id = args.resume
+        if bulk.load(job_id) is None:
+            print(f"No manifest for job {job_id} in {bulk.bulk_dir}")
+            return 2
+    else:
+        entries = BulkIngestion.scan(args.source)
+        if not entries:
+            print(f"No PDF files found in {args.source}")
+            return 2
+        job_id = bulk.create_job(entries)["job_id"]
+        print(f"Job {job_id}: {len(entries)} files, manifest {bulk.manifest_path(job_id)}")
+
+    start = time.time()
+    manifest = await bulk.run(job_id)
+    counts: Dict[str, int] = {}
+    for entry in manifest["files"]:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        if entry["status"] == "failed":
+            print(f"  failed: {entry['name']}: {entry['error']}")
+    print(f"Ingested {len(manifest['files'])} files in {time.time() - start:.1f}s: "
+          + ", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+    if counts.get("failed") or counts.get("text_extracted"):
+        print(f"Retry the failed files with: python -m services.ingestion_service --resume {job_id}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a directory or zip of PDFs")
+    parser.add_argument("source", nargs="?", help="Directory (searched recursively) or zip file")
+    parser.add_argument("--resume", metavar="JOB_ID", help="Continue an interrupted or partly failed job")
+    parser.add_argument("--extract-concurrency", type=int, help="PDFs extracted at once")
+    parser.add_argument("--embed-concurrency", type=int, help="PDFs embedded at once")
+    parser.add_argument("--memory-mb", type=int, help="Memory budget for files in flight")
+    args = parser.parse_args()
+    if not args.source and not args.resume:
+        parser.error("give a source directory or zip, or --resume JOB_ID")
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(asyncio.run(_main(args)))
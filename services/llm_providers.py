@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import math
+import random
+import re
+import struct
+from abc import ABC, abstractmethod
+from typing import List, Any, Union
+from config import Config
+
+class LLMProvider(ABC):
+    """Backend that GeminiService delegates generation and embedding calls to"""
+
+    name = "base"
+
+    @abstractmethod
+    async def generate(self, contents: Union[str, List[Any]]) -> str:
+        """Generate text for a prompt, or a [prompt, image blob] list"""
+
+    @abstractmethod
+    async def embed(self, text: str, task_type: str) -> List[float]:
+        """Embed one text for the given task type"""
+
+    async def embed_batch(self, texts: List[str], task_type: str) -> List[List[float]]:
+        """Embed several texts; backends with a batch API do it in one call"""
+        return [await self.embed(text, task_type) for text in texts]
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini API backend"""
+
+    name = "gemini"
+
+    def __init__(self):
+        self.genai = Config.initialize_gemini()
+        self.model = self.genai.GenerativeModel(Config.GEMINI_MODEL)
+        self.embedding_model = Config.EMBEDDING_MODEL
+
+    async def generate(self, contents: Union[str, List[Any]]) -> str:
+        response = await self.model.generate_content_async(contents)
+        return response.text
+
+    async def embed(self, text: str, task_type: str) -> List[float]:
+        result = await self.genai.embed_content_async(
+            model=self.embedding_model,
+            content=text,
+            task_type=task_type
+        )
+        return result['embedding']
+
+    async def embed_batch(self, texts: List[str], task_type: str) -> List[List[float]]:
+        # A list of contents is embedded in one request and returns one embedding per text
+        result = await self.genai.embed_content_async(
+            model=self.embedding_model,
+            content=texts,
+            task_type=task_type
+        )
+        return result['embedding']
+
+class FakeProviderError(RuntimeError):
+    """Injected failure from the fake provider"""
+
+class FakeProvider(LLMProvider):
+    """Offline, deterministic stand-in for load and regression testing.
+
+    Embeddings are unit vectors derived from a SHA-256 stream of the text, so equal
+    texts always embed identically. Answers are templated from the prompt. Latency and
+    error injection are drawn from a seeded RNG so runs are reproducible.
+    """
+
+    name = "fake"
+
+    def __init__(self, generate_latency_ms: float = None, embed_latency_ms: float = None,
+                 error_rate: float = None, seed: int = None, dimension: int = None):
+        self.generate_latency_ms = Config.FAKE_GENERATE_LATENCY_MS if generate_latency_ms is None else generate_latency_ms
+        self.embed_latency_ms = Config.FAKE_EMBED_LATENCY_MS if embed_latency_ms is None else embed_latency_ms
+        self.error_rate = Config.FAKE_ERROR_RATE if error_rate is None else error_rate
+        self.dimension = dimension or Config.EMBEDDING_DIMENSION
+        self._rng = random.Random(Config.FAKE_SEED if seed is None else seed)
+
+    async def _simulate(self, latency_ms: float, operation: str):
+        """Sleep for the configured latency (+/-50% jitter) and maybe raise an injected error"""
+        if latency_ms > 0:
+            await asyncio.sleep(latency_ms * self._rng.uniform(0.5, 1.5) / 1000)
+        if self.error_rate > 0 and self._rng.random() < self.error_rate:
+            raise FakeProviderError(f"Injected {operation} failure")
+
+    async def generate(self, contents: Union[str, List[Any]]) -> str:
+        await self._simulate(self.generate_latency_ms, "generate")
+
+        prompt = contents if isinstance(contents, str) else str(contents[0])
+        has_image = not isinstance(contents, str)
+
+        # Batched translation prompts expect every numbered marker echoed back
+        markers = re.split(r"\[\[(\d+)\]\]\n", prompt)
+        if len(markers) > 2:
+            return "\n".join(
+                f"[[{markers[i]}]]\n[translated] {markers[i + 1].strip()}"
+                for i in range(1, len(markers) - 1, 2)
+            )
+
+        question = prompt.rsplit("User Question:", 1)[-1].strip()
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        image_note = " I looked at the attached image." if has_image else ""
+        return (f"[fake-{digest}] This is a placeholder answer to: {question[:200]}."
+                f"{image_note} Prompt length was {len(prompt)} characters.")
+
+    def embedding_for(self, text: str) -> List[float]:
+        """Deterministic unit-length embedding of the configured dimension"""
+        values = []
+        counter = 0
+        seed = text.encode("utf-8")
+        while len(values) < self.dimension:
+            block = hashlib.sha256(seed + counter.to_bytes(4, "big")).digest()
+            # 8 unsigned 32-bit ints per block, mapped to [-1, 1)
+            values.extend(v / 2**31 - 1.0 for v in struct.unpack(">8I", block))
+            counter += 1
+        values = values[:self.dimension]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    async def embed(self, text: str, task_type: str) -> List[float]:
+        await self._simulate(self.embed_latency_ms, "embed")
+        return self.embedding_for(text)
+
+    async def embed_batch(self, texts: List[str], task_type: str) -> List[List[float]]:
+        await self._simulate(self.embed_latency_ms, "embed")
+        return [self.embedding_for(text) for text in texts]
+
+def create_provider(name: str = None) -> LLMProvider:
+    """Build the provider named by Config.LLM_PROVIDER"""
+    name = (name or Config.LLM_PROVIDER).lower()
+    if name == "gemini":
+        return GeminiProvider()
+    if name == "fake":
+        return FakeProvider()
+    raise ValueError(f"Unknown LLM provider: {name}")
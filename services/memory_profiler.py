@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from typing import Dict, Any, List, Optional
+from config import Config
+from models.progress_tracker import ProcessingStage
+
+_MB = 1024 * 1024
+
+class IngestionMemoryProfiler:
+    """Opt-in tracemalloc profiling of uploads, snapshotting at each processing stage transition.
+
+    Registered as a ProgressTracker stage listener. tracemalloc is process-wide, so numbers for
+    uploads that overlap in time include each other's allocations; profile one upload at a time
+    when setting worker memory limits.
+    """
+
+    def __init__(self, report_dir: str = None, top_n: int = None, frames: int = None):
+        self.report_dir = report_dir or Config.MEMORY_REPORT_DIR
+        self.top_n = top_n or Config.MEMORY_REPORT_TOP_N
+        self.frames = frames or Config.MEMORY_TRACE_FRAMES
+        self._uploads: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.report_dir, exist_ok=True)
+
+    def _top_allocations(self, snapshot: tracemalloc.Snapshot) -> List[str]:
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        lines = []
+        for stat in snapshot.statistics("traceback")[:self.top_n]:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size / _MB:9.2f} MB in {stat.count:7d} blocks  {frame.filename}:{frame.lineno}")
+            for extra in list(stat.traceback)[1:4]:
+                lines.append(f"{'':34}from {extra.filename}:{extra.lineno}")
+        return lines
+
+    def on_stage(self, file_id: str, stage: str, progress: Dict[str, Any]):
+        """Stage listener: close out the previous stage's numbers and start measuring the next one"""
+        with self._lock:
+            upload = self._uploads.get(file_id)
+            if upload is None:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(self.frames)
+                current, _ = tracemalloc.get_traced_memory()
+                upload = self._uploads[file_id] = {
+                    "baseline": current,
+                    "peak": 0,
+                    "stage": stage,
+                    "stage_start": time.time(),
+                    "stages": [],
+                    "report": []
+                }
+                tracemalloc.reset_peak()
+                progress["memory"] = {"baseline_mb": round(current / _MB, 2), "stages": {}}
+                return
+
+            current, peak = tracemalloc.get_traced_memory()
+            peak_delta = max(0, peak - upload["baseline"])
+            retained_delta = current - upload["baseline"]
+            upload["peak"] = max(upload["peak"], peak_delta)
+            finished = upload["stage"]
+            stage_numbers = {
+                "peak_mb": round(peak_delta / _MB, 2),
+                "retained_mb": round(retained_delta / _MB, 2),
+                "seconds": round(time.time() - upload["stage_start"], 2)
+            }
+            upload["stages"].append((finished, stage_numbers))
+            upload["report"].append(
+                f"== {finished}: peak +{stage_numbers['peak_mb']} MB, retained +{stage_numbers['retained_mb']} MB, "
+                f"{stage_numbers['seconds']}s =="
+            )
+            upload["report"].extend(self._top_allocations(tracemalloc.take_snapshot()))
+            upload["report"].append("")
+
+            progress["memory"] = {
+                "baseline_mb": round(upload["baseline"] / _MB, 2),
+                "peak_mb": round(upload["peak"] / _MB, 2),
+                "retained_mb": round(retained_delta / _MB, 2),
+                "stages": {name: numbers for name, numbers in upload["stages"]}
+            }
+
+            upload["stage"] = stage
+            upload["stage_start"] = time.time()
+            tracemalloc.reset_peak()
+
+            if stage in (ProcessingStage.COMPLETED.value, ProcessingStage.FAILED.value):
+                report_path = self._write_report(file_id, progress.get("filename", ""), upload)
+                progress["memory"]["report_path"] = report_path
+                del self._uploads[file_id]
+                if not self._uploads:
+                    tracemalloc.stop()
+
+    def _write_report(self, file_id: str, filename: str, upload: Dict[str, Any]) -> Optional[str]:
+        path = os.path.join(self.report_dir, f"{file_id}.txt")
+        try:
+            with open(path, "w") as f:
+                f.write(f"Memory report for {filename} ({file_id})\n")
+                f.write(f"Baseline {upload['baseline'] / _MB:.2f} MB, peak +{upload['peak'] / _MB:.2f} MB over baseline\n\n")
+                f.write("\n".join(upload["report"]))
+            return path
+        except OSError as e:
+            logging.warning(f"Could not write memory report for {file_id}: {e}")
+            return None
+
+    def report_path(self, file_id: str) -> str:
+        return os.path.join(self.report_dir, f"{file_id}.txt")
@@ -0,0 +1,375 @@
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from typing import Dict, List, Tuple, Callable, Optional, Any
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, value: float, **labels):
+        """Overwrite the value, e.g. from a collector mirroring a count kept elsewhere"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, entry):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {entry[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {entry[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {entry[-1]}")
+        return lines
+
+class MetricsRegistry:
+    """Process-local metric registry rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        metric = Gauge(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Register a callback run at scrape time, e.g. to copy stats into gauges"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Global metrics registry instance
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "llm_note_stage_duration_seconds",
+    "Duration of ingestion and chat pipeline stages",
+    ("stage",)
+)
+STAGE_ERRORS = metrics.counter(
+    "llm_note_stage_errors_total",
+    "Pipeline stage calls that raised",
+    ("stage",)
+)
+MODEL_CALLS = metrics.counter(
+    "llm_note_model_calls_total",
+    "Calls made to the model provider",
+    ("kind",)
+)
+MODEL_TOKENS = metrics.counter(
+    "llm_note_model_tokens_total",
+    "Estimated tokens sent to and received from the model provider",
+    ("kind", "direction")
+)
+MODEL_CALL_OUTCOMES = metrics.counter(
+    "llm_note_model_call_outcomes_total",
+    "Resilient model calls by final outcome (success, retried_success, failure, short_circuit)",
+    ("operation", "outcome")
+)
+MODEL_CALL_ATTEMPTS = metrics.counter(
+    "llm_note_model_call_attempts_total",
+    "Individual model call attempts, including retries",
+    ("operation", "result")
+)
+MODEL_HEDGES = metrics.counter(
+    "llm_note_model_hedged_calls_total",
+    "Hedged model calls by which request answered first",
+    ("operation", "winner")
+)
+MODEL_COALESCED = metrics.counter(
+    "llm_note_model_coalesced_calls_total",
+    "Model calls that joined an identical call already in flight instead of making their own",
+    ("operation",)
+)
+MODEL_CIRCUIT_STATE = metrics.gauge(
+    "llm_note_model_circuit_state",
+    "Model provider circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ("upstream",)
+)
+CACHE_LOOKUPS = metrics.counter(
+    "llm_note_cache_lookups_total",
+    "Cache lookups by cache and result",
+    ("cache", "result")
+)
+SQLITE_SECONDS = metrics.histogram(
+    "llm_note_sqlite_query_duration_seconds",
+    "Time spent in SQLite-backed model methods",
+    ("method",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+HTTP_SECONDS = metrics.histogram(
+    "llm_note_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status")
+)
+ADMISSION_DECISIONS = metrics.counter(
+    "llm_note_admission_decisions_total",
+    "Admission decisions by lane (admitted, queued, queue_full, session_limit, timeout)",
+    ("lane", "result")
+)
+ADMISSION_QUEUE_DEPTH = metrics.gauge(
+    "llm_note_admission_queue_depth",
+    "Requests waiting for an admission slot",
+    ("lane",)
+)
+ADMISSION_WAIT_SECONDS = metrics.histogram(
+    "llm_note_admission_wait_seconds",
+    "Time queued requests waited for an admission slot",
+    ("lane",)
+)
+QUOTA_WAIT_SECONDS = metrics.histogram(
+    "llm_note_quota_wait_seconds",
+    "Time model calls waited for requests/tokens-per-minute budget",
+    ("model", "lane")
+)
+QUOTA_AVAILABLE = metrics.gauge(
+    "llm_note_quota_available",
+    "Requests or tokens left in a model's per-minute budget",
+    ("model", "budget")
+)
+ACTIVE_UPLOADS = metrics.gauge(
+    "llm_note_active_uploads",
+    "PDF ingestions currently running (single uploads, bulk jobs and the CLI)"
+)
+
+def wrap_method(obj: Any, name: str, on_done: Callable[[float, tuple, dict, Any, Optional[BaseException]], None]):
+    """Replace obj.name in place with a timing wrapper calling on_done(elapsed, args, kwargs, result, error)"""
+    original = getattr(obj, name)
+
+    if asyncio.iscoroutinefunction(original):
+        @functools.wraps(original)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = error = None
+            try:
+                result = await original(*args, **kwargs)
+                return result
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                on_done(time.perf_counter() - start, args, kwargs, result, error)
+    else:
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = error = None
+            try:
+                result = original(*args, **kwargs)
+                return result
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                on_done(time.perf_counter() - start, args, kwargs, result, error)
+
+    setattr(obj, name, wrapper)
+
+def instrument_stage(obj: Any, name: str, stage: str):
+    """Record obj.name calls in the stage latency histogram"""
+    def on_done(elapsed, args, kwargs, result, error):
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if error is not None:
+            STAGE_ERRORS.inc(stage=stage)
+    wrap_method(obj, name, on_done)
+
+def instrument_sqlite(obj: Any, prefix: str):
+    """Time every public method of a SQLite-backed model object"""
+    for name in dir(obj):
+        if name.startswith("_") or not callable(getattr(obj, name)):
+            continue
+        method = f"{prefix}.{name}"
+        wrap_method(obj, name, lambda elapsed, *rest, method=method: SQLITE_SECONDS.observe(elapsed, method=method))
+
+def instrument_provider(provider: Any, estimate_tokens: Callable[[str], int]):
+    """Count model calls and estimated tokens at the provider boundary"""
+    def on_generate(elapsed, args, kwargs, result, error):
+        contents = args[0] if args else kwargs.get("contents")
+        kind = "generate" if isinstance(contents, str) else "generate_image"
+        prompt = contents if isinstance(contents, str) else str(contents[0])
+        MODEL_CALLS.inc(kind=kind)
+        MODEL_TOKENS.inc(estimate_tokens(prompt), kind=kind, direction="input")
+        if result:
+            MODEL_TOKENS.inc(estimate_tokens(result), kind=kind, direction="output")
+
+    def on_embed(elapsed, args, kwargs, result, error):
+        text = args[0] if args else kwargs.get("text", "")
+        MODEL_CALLS.inc(kind="embed")
+        MODEL_TOKENS.inc(estimate_tokens(text), kind="embed", direction="input")
+
+    def on_embed_batch(elapsed, args, kwargs, result, error):
+        texts = args[0] if args else kwargs.get("texts", [])
+        MODEL_CALLS.inc(kind="embed")
+        MODEL_TOKENS.inc(sum(estimate_tokens(text) for text in texts), kind="embed", direction="input")
+
+    wrap_method(provider, "generate", on_generate)
+    wrap_method(provider, "embed", on_embed)
+    wrap_method(provider, "embed_batch", on_embed_batch)
+
+# Pipeline stages recorded per service, as (method, stage)
+SERVICE_STAGES = {
+    "pdf_service": (("extract_text_from_pdf", "extract"), ("chunk_text", "chunk")),
+    "gemini_service": (("generate_embeddings", "embed"), ("generate_query_embedding", "query_embed"),
+                       ("generate_text", "generation"), ("generate_text_with_image", "generation")),
+    "vector_service": (("add_documents", "vector_store"), ("upsert_documents", "vector_store"), ("search_similar", "retrieval"),
+                       ("search_by_metadata", "retrieval")),
+    "text_storage": (("search_text", "retrieval"),),
+}
+# SQLite-backed services and their method label prefix
+SQLITE_SERVICES = {"db": "db", "text_storage": "text_storage", "chat_manager": "chat",
+                   "translation_cache": "translation_cache"}
+
+def instrument_service(name: str, service: Any, estimate_tokens: Callable[[str], int]):
+    """Wrap one of the app's service objects in place as it is built; call sites stay unchanged"""
+    for method, stage in SERVICE_STAGES.get(name, ()):
+        instrument_stage(service, method, stage)
+
+    if name == "gemini_service":
+        instrument_provider(service.provider, estimate_tokens)
+
+    if name in SQLITE_SERVICES:
+        instrument_sqlite(service, SQLITE_SERVICES[name])
+
+    if name == "translation_cache":
+        def on_translation_lookup(elapsed, args, kwargs, result, error):
+            if result is not None:
+                requested = len(args[0]) if args else len(kwargs.get("segment_hashes", []))
+                CACHE_LOOKUPS.inc(len(result), cache="translation", result="hit")
+                CACHE_LOOKUPS.inc(requested - len(result), cache="translation", result="miss")
+        wrap_method(service, "get_many", on_translation_lookup)
+
+def instrument_image_cache(image_preprocessor):
+    """The image cache keeps its own counts; copy them in at scrape time"""
+    def collect_image_cache():
+        CACHE_LOOKUPS.set(image_preprocessor.cache_hits, cache="image", result="hit")
+        CACHE_LOOKUPS.set(image_preprocessor.cache_misses, cache="image", result="miss")
+    metrics.add_collector(collect_image_cache)
+
+def instrument_quota(quota_scheduler):
+    """Copy each model's remaining per-minute budget into gauges at scrape time"""
+    def collect_quota():
+        for model, quota in quota_scheduler.quotas.items():
+            for budget, bucket in (("requests", quota.requests), ("tokens", quota.tokens)):
+                if not bucket.unlimited:
+                    QUOTA_AVAILABLE.set(bucket.available(), model=model, budget=budget)
+    metrics.add_collector(collect_quota)
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route on the scope; use its template to bound cardinality
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_SECONDS.observe(time.perf_counter() - start, method=scope["method"],
+                                 route=route, status=str(status[0]))
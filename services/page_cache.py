@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import os
+import shutil
+import weakref
+from typing import Tuple
+import PyPDF2
+from config import Config
+
+def parse_page_range(pages: str, total_pages: int) -> Tuple[int, int]:
+    """"3" or "3-5" (1-based, inclusive) -> (start, end); raises ValueError when out of range"""
+    start, _, end = pages.partition("-")
+    start = int(start)
+    end = int(end) if end else start
+    if start < 1 or end < start or end > total_pages:
+        raise ValueError(f"Pages must be within 1-{total_pages}")
+    if end - start + 1 > Config.PAGE_RANGE_MAX_PAGES:
+        raise ValueError(f"At most {Config.PAGE_RANGE_MAX_PAGES} pages per request")
+    return start, end
+
+class PageCache:
+    """Page ranges of stored PDFs as small standalone PDFs, split once and kept on disk.
+
+    Files are keyed by content key and page range, so they never change once written and
+    identical uploads share them.
+    """
+
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir or Config.PAGE_CACHE_DIR
+        # Concurrent requests for the same range wait for one split instead of each doing it
+        self._locks = weakref.WeakValueDictionary()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, content_key: str, start: int, end: int) -> str:
+        return os.path.join(self.cache_dir, content_key, f"{start}-{end}.pdf")
+
+    def _split(self, pdf_path: str, out_path: str, start: int, end: int):
+        reader = PyPDF2.PdfReader(pdf_path)
+        writer = PyPDF2.PdfWriter()
+        for index in range(start - 1, end):
+            writer.add_page(reader.pages[index])
+
+        # Written under a temporary name so readers never see a partial file
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        tmp_path = f"{out_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            writer.write(f)
+        os.replace(tmp_path, out_path)
+
+    async def get_pages(self, content_key: str, pdf_path: str, start: int, end: int) -> str:
+        """Path of the cached PDF holding pages start..end, splitting it on first request"""
+        out_path = self._path(content_key, start, end)
+        if os.path.exists(out_path):
+            return out_path
+
+        key = (content_key, start, end)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        async with lock:
+            if not os.path.exists(out_path):
+                await asyncio.to_thread(self._split, pdf_path, out_path, start, end)
+                logging.info(f"Cached pages {start}-{end} of {content_key[:12]}")
+        return out_path
+
+    def evict(self, content_key: str):
+        shutil.rmtree(os.path.join(self.cache_dir, content_key), ignore_errors=True)
@@ -1,3 +1,4 @@
+import asyncio
 import PyPDF2
 from pdfminer.high_level import extract_text_to_fp
 from pdfminer.layout import LAParams
@@ -13,6 +14,10 @@ class PDFService:
     
     async def extract_text_from_pdf(self, pdf_content: bytes) -> Dict[str, Any]:
         """Extract text from PDF file"""
+        # Parsing is CPU-bound; run it off the event loop so other requests keep being served
+        return await asyncio.to_thread(self._extract_text, pdf_content)
+    
+    def _extract_text(self, pdf_content: bytes) -> Dict[str, Any]:
         try:
             # Use PyPDF2 for basic extraction
             pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
@@ -67,33 +72,55 @@ class PDFService:
                 raise ValueError(f"Page {page_number} does not exist")
             
             page = pdf_reader.pages[page_number - 1]
-            
-            # Extract all text from the page
-            # In a full implementation, we would:
-            # 1. Use pdfminer.six to get text with exact coordinates
-            # 2. Filter text elements within the specified area
-            # 3. Return only text from the selected region
-            
-            full_text = page.extract_text()
-            
-            # For demo purposes, return a portion of the text based on area size
-            x, y, width, height = coordinates.get('x', 0), coordinates.get('y', 0), coordinates.get('width', 100), coordinates.get('height', 100)
-            
-            # Simple heuristic: if the area is small, return a smaller portion
-            area_ratio = (width * height) / (595 * 842)  # Approximate A4 page size
-            
-            if area_ratio < 0.1:  # Small area
-                words = full_text.split()
-                num_words = max(10, int(len(words) * area_ratio * 2))
-                start_word = int((y / 842) * len(words))
-                return " ".join(words[start_word:start_word + num_words])
-            else:
-                return full_text
+            return self._area_text(page.extract_text(), coordinates)
                 
         except Exception as e:
             logging.error(f"Error extracting text from area: {e}")
             return ""
     
+    def _area_text(self, full_text: str, coordinates: Dict) -> str:
+        """Portion of a page's text under an area"""
+        # In a full implementation, we would:
+        # 1. Use pdfminer.six to get text with exact coordinates
+        # 2. Filter text elements within the specified area
+        # 3. Return only text from the selected region
+        
+        # For demo purposes, return a portion of the text based on area size
+        x, y, width, height = coordinates.get('x', 0), coordinates.get('y', 0), coordinates.get('width', 100), coordinates.get('height', 100)
+        
+        # Simple heuristic: if the area is small, return a smaller portion
+        area_ratio = (width * height) / (595 * 842)  # Approximate A4 page size
+        
+        if area_ratio < 0.1:  # Small area
+            words = full_text.split()
+            num_words = max(10, int(len(words) * area_ratio * 2))
+            start_word = int((y / 842) * len(words))
+            return " ".join(words[start_word:start_word + num_words])
+        else:
+            return full_text
+    
+    async def extract_text_from_areas(self, pdf_content: bytes, areas: List[Dict]) -> List[str]:
+        """Extract text for many areas ({page_number, coordinates}) from one parse of the PDF"""
+        return await asyncio.to_thread(self._extract_areas, pdf_content, areas)
+    
+    def _extract_areas(self, pdf_content: bytes, areas: List[Dict]) -> List[str]:
+        pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
+        page_texts = {}
+        results = []
+        for area in areas:
+            page_number = area["page_number"]
+            try:
+                if page_number > len(pdf_reader.pages):
+                    raise ValueError(f"Page {page_number} does not exist")
+                # Each page is extracted once however many areas it has
+                if page_number not in page_texts:
+                    page_texts[page_number] = pdf_reader.pages[page_number - 1].extract_text()
+                results.append(self._area_text(page_texts[page_number], area["coordinates"]))
+            except Exception as e:
+                logging.error(f"Error extracting text from area on page {page_number}: {e}")
+                results.append("")
+        return results
+    
     def chunk_text(self, text: str) -> List[str]:
         """Split text into chunks for embedding"""
         chunks = []
@@ -110,9 +137,15 @@ class PDFService:
                 chunk_text = " ".join(current_chunk)
                 chunks.append(chunk_text)
                 
-                # Start new chunk with overlap
-                overlap_words = current_chunk[-self.chunk_overlap:] if len(current_chunk) > self.chunk_overlap else current_chunk
-                current_chunk = overlap_words + [word]
+                # Start new chunk with up to chunk_overlap characters of trailing words
+                overlap_words = []
+                overlap_length = 0
+                for previous in reversed(current_chunk):
+                    if overlap_length + len(previous) + 1 > self.chunk_overlap:
+                        break
+                    overlap_words.append(previous)
+                    overlap_length += len(previous) + 1
+                current_chunk = overlap_words[::-1] + [word]
                 current_length = sum(len(w) + 1 for w in current_chunk)
             else:
                 current_chunk.append(word)
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from typing import Dict
+from config import Config
+from services.admission import INTERACTIVE, BATCH
+from services.metrics import QUOTA_WAIT_SECONDS
+
+class TokenBucket:
+    """Budget of `per_minute` units refilling continuously; per_minute <= 0 means unlimited"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(max(per_minute, 0))
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity == 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, floor: float = 0.0) -> float:
+        """Seconds until `amount` can be taken while leaving at least `floor` behind"""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        return max(0.0, (amount + floor - self.level) / self.rate)
+
+    def take(self, amount: float):
+        """Spend amount (negative to refund); the level may go below zero after an underestimate"""
+        if not self.unlimited:
+            self._refill()
+            self.level = min(self.capacity, self.level - amount)
+
+    def available(self) -> float:
+        self._refill()
+        return self.level
+
+class ModelQuota:
+    """Requests- and tokens-per-minute budget of one model.
+
+    Interactive calls may spend the whole budget. Batch calls leave QUOTA_INTERACTIVE_RESERVE
+    of each bucket untouched and hold back while an interactive call is waiting, so they
+    spread out over whatever capacity chat and translation leave unused.
+    """
+
+    def __init__(self, model: str, rpm: int, tpm: int):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.waiting = {INTERACTIVE: 0, BATCH: 0}
+        self.throttled_seconds = {INTERACTIVE: 0.0, BATCH: 0.0}
+
+    @staticmethod
+    def _fit(bucket: TokenBucket, amount: float, share: float) -> float:
+        # A single call bigger than the usable budget would never fit; let it drain the bucket
+        return amount if bucket.unlimited else min(amount, bucket.capacity * share)
+
+    async def acquire(self, requests: int, tokens: int, lane: str = INTERACTIVE) -> float:
+        """Wait until the call fits the budget and spend it; returns seconds waited"""
+        reserve = Config.QUOTA_INTERACTIVE_RESERVE if lane == BATCH else 0.0
+        requests = self._fit(self.requests, requests, 1 - reserve)
+        tokens = self._fit(self.tokens, tokens, 1 - reserve)
+        start = time.perf_counter()
+        self.waiting[lane] += 1
+        try:
+            while True:
+                wait = max(self.requests.wait_time(requests, self.requests.capacity * reserve),
+                           self.tokens.wait_time(tokens, self.tokens.capacity * reserve))
+                if lane == BATCH and self.waiting[INTERACTIVE]:
+                    wait = max(wait, Config.QUOTA_POLL_SECONDS)
+                if wait <= 0:
+                    self.requests.take(requests)
+                    self.tokens.take(tokens)
+                    break
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            self.waiting[lane] -= 1
+
+        waited = time.perf_counter() - start
+        QUOTA_WAIT_SECONDS.observe(waited, model=self.model, lane=lane)
+        self.throttled_seconds[lane] += waited
+        return waited
+
+    def refund(self, requests: int, tokens: int):
+        """Give back budget acquired for a call that was never sent"""
+        self.requests.take(-requests)
+        self.tokens.take(-tokens)
+
+    def settle(self, tokens: int):
+        """Correct the token budget once a call's real size is known (negative refunds)"""
+        self.tokens.take(tokens)
+
+    def snapshot(self) -> Dict:
+        def budget(bucket: TokenBucket) -> Dict:
+            if bucket.unlimited:
+                return {"limit": None}
+            available = bucket.available()
+            return {"limit": int(bucket.capacity), "available": round(available, 1),
+                    "used_percent": round(100 * (1 - available / bucket.capacity), 1)}
+        return {
+            "requests_per_minute": budget(self.requests),
+            "tokens_per_minute": budget(self.tokens),
+            "waiting": dict(self.waiting),
+            "throttled_seconds": {lane: round(seconds, 3) for lane, seconds in self.throttled_seconds.items()}
+        }
+
+class QuotaScheduler:
+    """Process-wide quota accounting for every outgoing model call, one budget per model"""
+
+    def __init__(self):
+        self.quotas: Dict[str, ModelQuota] = {}
+
+    def quota(self, model: str, kind: str) -> ModelQuota:
+        """Budget of a "generate" or "embed" model, created with that kind's configured limits"""
+        if model not in self.quotas:
+            if kind == "embed":
+                self.quotas[model] = ModelQuota(model, Config.QUOTA_EMBED_RPM, Config.QUOTA_EMBED_TPM)
+            else:
+                self.quotas[model] = ModelQuota(model, Config.QUOTA_GENERATE_RPM, Config.QUOTA_GENERATE_TPM)
+        return self.quotas[model]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {model: quota.snapshot() for model, quota in self.quotas.items()}
+
+# Global quota scheduler instance
+quota_scheduler = QuotaScheduler()
@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Dict, Any, List, Callable, Optional
+from config import Config
+from services.area_pairing import area_vector_metadata
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class ReindexService:
+    """Bring stored chunks and vectors up to the current pipeline version.
+
+    Content is re-chunked from its stored text and chunks are matched by content hash, so
+    only new or changed chunks are embedded again (all of them if the embedding model
+    changed). New vectors are written before the old ones are deleted, so search keeps
+    using the old index for a document until its swap. Problem/solution area vectors from
+    another embedding model are re-embedded from their stored content in place, and the
+    file's pairs rebuilt.
+    """
+
+    def __init__(self, pdf_service, gemini_service, vector_service, text_storage, db,
+                 lock_for: Optional[Callable[[str], asyncio.Lock]] = None, area_pairing=None):
+        self.pdf_service = pdf_service
+        self.gemini_service = gemini_service
+        self.vector_service = vector_service
+        self.text_storage = text_storage
+        self.db = db
+        self.area_pairing = area_pairing
+        # Serialises the swap with uploads and deletes of the same content
+        self.lock_for = lock_for or (lambda content_key: asyncio.Lock())
+        self.batch_size = Config.REINDEX_BATCH_SIZE
+        self.pause = Config.REINDEX_PAUSE_SECONDS
+        self._task: Optional[asyncio.Task] = None
+        self.status: Dict[str, Any] = {"state": "idle"}
+
+    def stale_content(self, force: bool = False) -> List[Dict]:
+        version = Config.pipeline_version()
+        return [item for item in self.db.list_indexed_content()
+                if force or item["pipeline_version"] != version]
+
+    async def stale_area_files(self, force: bool = False) -> List[str]:
+        """Files with area vectors that are missing or from another embedding model"""
+        areas = self.db.list_embeddable_areas()
+        if not areas:
+            return []
+        version = Config.embedding_version()
+        stored = await self.vector_service.search_by_metadata(
+            {"chunk_type": {"$in": ["problem_area", "solution_area"]}}, n_results=None
+        )
+        current = {metadata.get("area_id") for metadata in stored["metadatas"]
+                   if metadata.get("embedding_version") == version}
+        return sorted({area["file_id"] for area in areas if force or area["id"] not in current})
+
+    async def check_dimension(self):
+        """Raise ValueError if the configured embedding dimension differs from the stored vectors.
+
+        All vectors share one Chroma collection, which only takes vectors of one length, so
+        such a change can't be re-indexed in place.
+        """
+        stored = await self.vector_service.stored_dimension()
+        if stored is not None and stored != Config.EMBEDDING_DIMENSION:
+            raise ValueError(f"Stored vectors have {stored} dimensions but EMBEDDING_DIMENSION is "
+                             f"{Config.EMBEDDING_DIMENSION}. Move {Config.CHROMADB_PATH} aside and "
+                             f"re-index to rebuild every vector with the new model")
+
+    async def _source_text(self, content_key: str) -> str:
+        text = self.text_storage.get_source_text(content_key)
+        if text is not None:
+            return text
+
+        # Uploaded before source text was kept: extract once from the stored PDF
+        pdf_path = os.path.join(Config.UPLOAD_DIR, f"{content_key}.pdf")
+        if not os.path.exists(pdf_path):
+            raise FileNotFoundError(f"No stored text or PDF for {content_key}")
+        with open(pdf_path, "rb") as f:
+            pdf_data = await self.pdf_service.extract_text_from_pdf(f.read())
+        self.text_storage.store_source_text(content_key, pdf_data["total_text"])
+        return pdf_data["total_text"]
+
+    async def _embed_missing(self, chunks: List[str], counter: str = "chunks_embedded") -> List[List[float]]:
+        """Embed in small batches with a pause between them, counting them in status[counter]"""
+        embeddings = []
+        for i in range(0, len(chunks), self.batch_size):
+            embeddings.extend(await self.gemini_service.generate_embeddings(chunks[i:i + self.batch_size]))
+            self.status[counter] = self.status.get(counter, 0) + len(chunks[i:i + self.batch_size])
+            if i + self.batch_size < len(chunks):
+                await asyncio.sleep(self.pause)
+        return embeddings
+
+    async def reindex_content(self, item: Dict) -> Dict[str, int]:
+        """Re-chunk one stored content and swap in its updated vectors"""
+        content_key = item["content_key"]
+        # Pre-deduplication content is keyed by its file_id in vector metadata
+        key_field = "blob_id" if item["shared"] else "file_id"
+        version = Config.pipeline_version()
+        embedding_version = Config.embedding_version()
+
+        text = await self._source_text(content_key)
+        chunks = self.pdf_service.chunk_text(text)
+        hashes = [chunk_hash(chunk) for chunk in chunks]
+        stats = {"chunks": len(chunks), "reused": 0, "embedded": 0, "removed": 0}
+
+        old = {"ids": []}
+        embeddings = None
+        if item["embedded"]:
+            old = await self.vector_service.get_chunks(
+                {"$and": [{key_field: content_key}, {"chunk_type": "general_text"}]}
+            )
+            reusable = {}
+            for document, metadata, embedding in zip(old["documents"], old["metadatas"], old["embeddings"]):
+                # Untagged vectors came from an unknown model, so they can't be reused
+                if metadata.get("embedding_version") == embedding_version:
+                    reusable[metadata.get("chunk_hash") or chunk_hash(document)] = embedding
+
+            # Identical chunks (repeated headers, boilerplate) are embedded once
+            first_index = {}
+            for i, h in enumerate(hashes):
+                first_index.setdefault(h, i)
+            missing = [h for h in first_index if h not in reusable]
+            by_hash = dict(zip(missing, await self._embed_missing([chunks[first_index[h]] for h in missing])))
+            by_hash.update(reusable)
+            embeddings = [by_hash[h] for h in hashes]
+            stats["embedded"] = len(missing)
+            stats["reused"] = sum(1 for h in hashes if h in reusable)
+
+        async with self.lock_for(content_key):
+            if not self.db.content_in_use(content_key):
+                logging.info(f"Skipping re-index of {content_key}: deleted while re-indexing")
+                return stats
+
+            if embeddings is not None:
+                metadata = [
+                    {
+                        key_field: content_key,
+                        "filename": item["filename"],
+                        "chunk_index": i,
+                        "chunk_type": "general_text",
+                        "chunk_hash": hashes[i],
+                        "pipeline_version": version,
+                        "embedding_version": embedding_version
+                    }
+                    for i in range(len(chunks))
+                ]
+                await self.vector_service.add_documents(chunks, embeddings, metadata)
+                await self.vector_service.delete_ids(old["ids"])
+                stats["removed"] = len(old["ids"])
+
+            self.text_storage.store_text_chunks(content_key, chunks)
+            self.db.set_index_version(content_key, version, len(chunks))
+
+        return stats
+
+    async def reindex_areas(self, file_id: str, force: bool = False) -> int:
+        """Re-embed a file's areas whose vector is missing or stale, then re-pair them"""
+        version = Config.embedding_version()
+        stored = await self.vector_service.search_by_metadata(
+            {"$and": [{"file_id": file_id}, {"chunk_type": {"$in": ["problem_area", "solution_area"]}}]},
+            n_results=None
+        )
+        current = {metadata.get("area_id") for metadata in stored["metadatas"]
+                   if metadata.get("embedding_version") == version}
+        stale = [area for area in self.db.get_document_areas(file_id)
+                 if (area["content"] or "").strip() and (force or area["id"] not in current)]
+        if not stale:
+            return 0
+
+        embeddings = await self._embed_missing([area["content"] for area in stale], "areas_embedded")
+        # Areas deleted while embedding must not come back
+        live = {area["id"] for area in self.db.get_document_areas(file_id)}
+        kept = [(area, embedding) for area, embedding in zip(stale, embeddings) if area["id"] in live]
+        if kept:
+            # Area vectors are keyed by area ID, so the upsert replaces each one in place
+            await self.vector_service.upsert_documents(
+                [area["id"] for area, _ in kept],
+                [area["content"] for area, _ in kept],
+                [embedding for _, embedding in kept],
+                [area_vector_metadata(file_id, area["id"], area["area_type"], area["page_number"],
+                                      area["coordinates"]) for area, _ in kept]
+            )
+        if self.area_pairing:
+            # Pairing scores compare area embeddings, which must all come from one model
+            await self.area_pairing.rebuild(file_id)
+        return len(kept)
+
+    async def run(self, force: bool = False) -> Dict[str, Any]:
+        """Re-index every stale content, one document at a time, then stale area vectors"""
+        try:
+            await self.check_dimension()
+        except ValueError as e:
+            logging.error(f"Not re-indexing: {e}")
+            self.status = {"state": "failed", "error": str(e), "finished_at": time.time()}
+            return self.status
+
+        stale = self.stale_content(force)
+        area_files = await self.stale_area_files(force)
+        self.status = {
+            "state": "running",
+            "pipeline_version": Config.pipeline_version(),
+            "total": len(stale),
+            "processed": 0,
+            "chunks_reused": 0,
+            "chunks_embedded": 0,
+            "area_files": len(area_files),
+            "areas_embedded": 0,
+            "errors": [],
+            "started_at": time.time()
+        }
+        logging.info(f"Re-indexing {len(stale)} documents and the areas of {len(area_files)} files "
+                     f"to {self.status['pipeline_version']}")
+
+        for item in stale:
+            try:
+                stats = await self.reindex_content(item)
+                self.status["chunks_reused"] += stats["reused"]
+                logging.info(f"Re-indexed {item['filename']} ({item['content_key'][:12]}): {stats}")
+            except Exception as e:
+                logging.error(f"Error re-indexing {item['content_key']}: {e}")
+                self.status["errors"].append({"content_key": item["content_key"], "error": str(e)})
+            self.status["processed"] += 1
+
+        for file_id in area_files:
+            try:
+                await self.reindex_areas(file_id, force)
+            except Exception as e:
+                logging.error(f"Error re-indexing areas of {file_id}: {e}")
+                self.status["errors"].append({"file_id": file_id, "error": str(e)})
+
+        self.status["state"] = "completed"
+        self.status["finished_at"] = time.time()
+        return self.status
+
+    def start(self, force: bool = False) -> bool:
+        """Run in the background; returns False if a run is already in progress"""
+        if self._task and not self._task.done():
+            return False
+        self.status = {"state": "starting"}
+        self._task = asyncio.create_task(self.run(force))
+        return True
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+async def _main(args) -> int:
+    from services.pdf_service import PDFService
+    from services.gemini_service import GeminiService
+    from services.vector_service import VectorService
+    from models.text_storage import TextStorage
+    from models.database import DatabaseManager
+    from services.area_pairing import AreaPairingService
+
+    db = DatabaseManager()
+    vector_service = VectorService()
+    service = ReindexService(PDFService(), GeminiService(), vector_service, TextStorage(), db,
+                             area_pairing=AreaPairingService(db, vector_service))
+    try:
+        await service.check_dimension()
+    except ValueError as e:
+        print(e)
+        return 2
+
+    stale = service.stale_content(args.force)
+    area_files = await service.stale_area_files(args.force)
+    print(f"Pipeline version {Config.pipeline_version()}: {len(stale)} of "
+          f"{len(db.list_indexed_content())} documents to re-index, areas of {len(area_files)} files")
+    for item in stale:
+        print(f"  {item['filename']} ({item['content_key'][:12]}) built with {item['pipeline_version'] or 'unknown'}")
+    if args.dry_run or not (stale or area_files):
+        return 0
+
+    status = await service.run(args.force)
+    print(f"Re-indexed {status['processed']} documents: {status['chunks_embedded']} chunks embedded, "
+          f"{status['chunks_reused']} reused, {status['areas_embedded']} areas embedded, "
+          f"{len(status['errors'])} errors")
+    return 1 if status["errors"] else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-index stored documents after chunking or embedding settings change")
+    parser.add_argument("--force", action="store_true", help="Re-index everything, not only stale documents")
+    parser.add_argument("--dry-run", action="store_true", help="Only list what would be re-indexed")
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
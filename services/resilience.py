@@ -0,0 +1,270 @@
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from config import Config
+from services.metrics import (MODEL_CALL_OUTCOMES, MODEL_CALL_ATTEMPTS, MODEL_HEDGES, MODEL_CIRCUIT_STATE,
+                             MODEL_COALESCED)
+
+# Upstream errors worth another attempt, by class name so the Google client needn't be imported
+RETRYABLE_ERROR_NAMES = {
+    "ServiceUnavailable", "ResourceExhausted", "TooManyRequests", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "Aborted", "Unknown", "FakeProviderError"
+}
+
+class CircuitOpenError(RuntimeError):
+    """The model provider is failing; calls are rejected until the breaker lets a probe through"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Model provider unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+class CircuitBreaker:
+    """Opens after CIRCUIT_FAILURE_THRESHOLD consecutive failed attempts and rejects calls for
+    CIRCUIT_RESET_SECONDS; then one probe call decides whether it closes again"""
+
+    def __init__(self, name: str, failure_threshold: int = None, reset_seconds: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or Config.CIRCUIT_FAILURE_THRESHOLD
+        self.reset_seconds = reset_seconds or Config.CIRCUIT_RESET_SECONDS
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        MODEL_CIRCUIT_STATE.set(0, upstream=name)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logging.warning(f"Circuit for {self.name} is now {state}")
+        self.state = state
+        MODEL_CIRCUIT_STATE.set({"closed": 0, "half_open": 1, "open": 2}[state], upstream=self.name)
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def check(self):
+        """Raise CircuitOpenError if a call would certainly be rejected now; claims nothing"""
+        with self._lock:
+            if self.state == "open" and self.retry_after() > 0:
+                raise CircuitOpenError(self.retry_after())
+            if self._probing:
+                raise CircuitOpenError(self.reset_seconds)
+
+    def allow(self) -> bool:
+        """Raise CircuitOpenError unless a call may go ahead; True if the call is the probe"""
+        with self._lock:
+            if self.state == "closed":
+                return False
+            if self.state == "open" and self.retry_after() > 0:
+                raise CircuitOpenError(self.retry_after())
+            # Cool-down over: let exactly one probe through
+            if self._probing:
+                raise CircuitOpenError(self.reset_seconds)
+            self._set_state("half_open")
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._set_state("closed")
+
+    def end_probe(self, cancelled: bool):
+        """The probe ended without a retryable failure. An answer, even an error response,
+        closes the breaker; a cancelled probe reopens it with the cool-down already over so
+        the next caller probes instead."""
+        with self._lock:
+            if not self._probing:
+                return
+            self._probing = False
+            if cancelled:
+                self.opened_at = time.monotonic() - self.reset_seconds
+                self._set_state("open")
+            else:
+                self.failures = 0
+                self._set_state("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self._probing = False
+                self.opened_at = time.monotonic()
+                self._set_state("open")
+
+class LatencyWindow:
+    """Recent successful call latencies, for the hedging threshold"""
+
+    def __init__(self, size: int = 200):
+        self._samples = collections.deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if len(self._samples) < Config.MODEL_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+class ResilientCaller:
+    """Wraps model calls with timeouts, retries (exponential backoff, full jitter), optional
+    hedging after the latency percentile of the operation, and a shared circuit breaker"""
+
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+        self.breaker = CircuitBreaker(upstream)
+        self.latency: Dict[str, LatencyWindow] = collections.defaultdict(LatencyWindow)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(Config.MODEL_RETRY_MAX_DELAY, Config.MODEL_RETRY_BASE_DELAY * 2 ** attempt))
+
+    async def _attempt(self, operation: str, call: Callable[[], Awaitable[Any]],
+                       admit: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        # Waiting for quota isn't upstream latency: keep it out of the timeout and the percentile
+        if admit:
+            await admit()
+        start = time.perf_counter()
+        result = await asyncio.wait_for(call(), timeout=Config.MODEL_CALL_TIMEOUT_SECONDS)
+        self.latency[operation].add(time.perf_counter() - start)
+        return result
+
+    async def _hedged(self, operation: str, call: Callable[[], Awaitable[Any]],
+                      admit: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """Send a duplicate request if the first is slower than usual; the first success wins"""
+        threshold = self.latency[operation].percentile(Config.MODEL_HEDGE_PERCENTILE)
+        # The primary was admitted by call(), so a quota wait doesn't itself trigger a hedge
+        primary = asyncio.create_task(self._attempt(operation, call))
+        if threshold is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=threshold)
+        if done:
+            return primary.result()
+
+        hedge = asyncio.create_task(self._attempt(operation, call, admit))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        MODEL_HEDGES.inc(operation=operation, winner="hedge" if task is hedge else "primary")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, operation: str, call: Callable[[], Awaitable[Any]],
+                   admit: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """Run call() until it succeeds, fails with a non-retryable error or runs out of attempts.
+
+        admit(), if given, is awaited before every attempt (hedges and retries included) and
+        may return a callback that undoes it, used when the breaker then rejects the attempt.
+        """
+        hedge = operation in Config.MODEL_HEDGE_OPERATIONS
+        attempts = Config.MODEL_RETRY_ATTEMPTS
+        for attempt in range(attempts):
+            # Fail fast while degraded rather than wait for quota only to be short-circuited
+            try:
+                self.breaker.check()
+            except CircuitOpenError:
+                MODEL_CALL_OUTCOMES.inc(operation=operation, outcome="short_circuit")
+                raise
+            # Quota before claiming, so a half-open probe never holds the only probe slot while it waits
+            undo_admit = await admit() if admit else None
+            try:
+                probe = self.breaker.allow()
+            except CircuitOpenError:
+                if undo_admit:
+                    undo_admit()
+                MODEL_CALL_OUTCOMES.inc(operation=operation, outcome="short_circuit")
+                raise
+
+            try:
+                result = await (self._hedged(operation, call, admit) if hedge
+                                else self._attempt(operation, call))
+            except Exception as e:
+                retryable = is_retryable(e)
+                MODEL_CALL_ATTEMPTS.inc(operation=operation, result="retryable_error" if retryable else "error")
+                # Bad requests say nothing about upstream health
+                if retryable:
+                    self.breaker.record_failure()
+                elif probe:
+                    self.breaker.end_probe(cancelled=False)
+                if not retryable or attempt == attempts - 1:
+                    MODEL_CALL_OUTCOMES.inc(operation=operation, outcome="failure")
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning(f"{self.upstream} {operation} failed ({e}); retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled (deadline, last single-flight waiter gone, client disconnect)
+                if probe:
+                    self.breaker.end_probe(cancelled=True)
+                raise
+
+            self.breaker.record_success()
+            MODEL_CALL_ATTEMPTS.inc(operation=operation, result="success")
+            MODEL_CALL_OUTCOMES.inc(operation=operation, outcome="success" if attempt == 0 else "retried_success")
+            return result
+
+def call_key(operation: str, model: str, inputs: Any) -> str:
+    """Stable hash of (operation, model, inputs) identifying duplicate calls"""
+    payload = json.dumps([operation, model, inputs], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class SingleFlight:
+    """Coalesces identical concurrent calls: the first caller makes the call, duplicates
+    arriving while it is in flight await the same result (or exception).
+
+    A caller that is cancelled stops waiting without affecting the others; the shared
+    call itself is only cancelled once every caller has gone.
+    """
+
+    def __init__(self):
+        # (event loop, key) -> [task, waiters]
+        self._calls: Dict[Tuple[int, str], list] = {}
+
+    async def do(self, operation: str, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        flight_key = (id(asyncio.get_running_loop()), key)
+        entry = self._calls.get(flight_key)
+        if entry is None or entry[0].done():
+            entry = [asyncio.ensure_future(call()), 0]
+            self._calls[flight_key] = entry
+            entry[0].add_done_callback(lambda _: self._forget(flight_key, entry))
+        else:
+            MODEL_COALESCED.inc(operation=operation)
+
+        entry[1] += 1
+        try:
+            # Shielded so one caller's cancellation doesn't cancel the call for everyone
+            return await asyncio.shield(entry[0])
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not entry[0].done():
+                self._forget(flight_key, entry)
+                entry[0].cancel()
+
+    def _forget(self, flight_key: Tuple[int, str], entry: list):
+        if self._calls.get(flight_key) is entry:
+            del self._calls[flight_key]
+
+    def in_flight(self) -> int:
+        return len(self._calls)
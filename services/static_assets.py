@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # gzip only; brotli is a nice-to-have
+    brotli = None
+
+# Text-like assets worth compressing; images and fonts are already compressed
+COMPRESSIBLE_TYPES = (".js", ".css", ".html", ".svg", ".json", ".map", ".bcmap", ".txt")
+# Directories fingerprinted as one unit because clients build file URLs from a base path
+BUNDLE_DIRS = ("cmaps",)
+
+_HTML_URL = re.compile(r"/static/([\w./-]+)")
+
+def fingerprinted(path: str, digest: str) -> str:
+    """js/app.js -> js/app.<digest>.js"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest}{ext}"
+
+def accepted_encodings(accept_encoding: str) -> List[str]:
+    """Encodings from an Accept-Encoding header that we can serve, best first"""
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip().lower()] = q
+    return [encoding for encoding in ("br", "gzip") if offered.get(encoding, 0) > 0]
+
+class StaticAssets:
+    """Content-hashed URLs and precompressed variants for everything under static/.
+
+    Assets are served at /static/<name>.<hash>.<ext> (bundle directories at
+    /static/<dir>.<hash>/...) with immutable caching, from gzip or brotli files written
+    once into STATIC_BUILD_DIR. Variants are named by content hash, so a restart only
+    re-hashes the sources.
+    """
+
+    def __init__(self, static_dir: str = "static", build_dir: str = None):
+        self.static_dir = static_dir
+        self.build_dir = build_dir or Config.STATIC_BUILD_DIR
+        # fingerprinted path -> (source path, {encoding: variant path})
+        self._assets: Dict[str, Tuple[str, Dict[str, str]]] = {}
+        self._urls: Dict[str, str] = {}
+        self._index: Optional[Tuple[str, Dict[str, bytes]]] = None
+        self._lock = threading.Lock()
+        self._built = False
+
+    @staticmethod
+    def _compressors():
+        compressors = {"gzip": lambda data: gzip.compress(data, Config.STATIC_GZIP_LEVEL, mtime=0)}
+        if brotli:
+            compressors["br"] = lambda data: brotli.compress(data, quality=Config.STATIC_BROTLI_QUALITY)
+        return compressors
+
+    def _compress(self, source: str, digest: str, relative: str) -> Dict[str, str]:
+        """Write (or reuse) the compressed variants of one asset; returns {encoding: path}"""
+        variants = {}
+        if not relative.endswith(COMPRESSIBLE_TYPES):
+            return variants
+        content = None
+        for encoding, compress in self._compressors().items():
+            path = os.path.join(self.build_dir, encoding, fingerprinted(relative, digest))
+            # An empty marker records a variant rejected on an earlier start
+            skip_path = f"{path}.skip"
+            if os.path.exists(skip_path):
+                continue
+            if not os.path.exists(path):
+                if content is None:
+                    with open(source, "rb") as f:
+                        content = f.read()
+                data = compress(content)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Not worth a Content-Encoding if it barely shrinks
+                if len(data) > len(content) * 0.9:
+                    open(skip_path, "wb").close()
+                    continue
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            variants[encoding] = path
+        return variants
+
+    def _source_files(self) -> List[str]:
+        files = []
+        for root, _, names in os.walk(self.static_dir):
+            for name in names:
+                files.append(os.path.relpath(os.path.join(root, name), self.static_dir).replace(os.sep, "/"))
+        return sorted(files)
+
+    def build(self):
+        """Hash every asset and write missing compressed variants; safe to call more than once"""
+        with self._lock:
+            if self._built:
+                return
+            start = time.perf_counter()
+            assets, urls = {}, {}
+            digests = {}
+            for relative in self._source_files():
+                with open(os.path.join(self.static_dir, relative), "rb") as f:
+                    digests[relative] = hashlib.sha256(f.read()).hexdigest()[:12]
+
+            for bundle in BUNDLE_DIRS:
+                members = [relative for relative in digests if relative.startswith(f"{bundle}/")]
+                if members:
+                    bundle_digest = hashlib.sha256(
+                        "".join(f"{relative}:{digests[relative]}" for relative in members).encode()
+                    ).hexdigest()[:12]
+                    urls[f"{bundle}/"] = f"{bundle}.{bundle_digest}/"
+                    for relative in members:
+                        served = f"{bundle}.{bundle_digest}/{relative[len(bundle) + 1:]}"
+                        source = os.path.join(self.static_dir, relative)
+                        assets[served] = (source, self._compress(source, digests[relative], relative))
+
+            for relative, digest in digests.items():
+                if relative.split("/")[0] in BUNDLE_DIRS:
+                    continue
+                served = fingerprinted(relative, digest)
+                source = os.path.join(self.static_dir, relative)
+                assets[served] = (source, self._compress(source, digest, relative))
+                urls[relative] = served
+
+            self._assets, self._urls = assets, urls
+            self._index = None
+            self._built = True
+            compressed = sum(1 for _, variants in assets.values() if variants)
+            logging.info(f"Static assets: {len(assets)} files ({compressed} precompressed, "
+                         f"brotli {'on' if brotli else 'off'}) in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    @property
+    def is_built(self) -> bool:
+        return self._built
+
+    def url(self, path: str) -> str:
+        """Cache-busting URL for a path under static/, e.g. url("js/app.js")"""
+        self.build()
+        return f"/static/{self._urls.get(path, path)}"
+
+    def manifest(self) -> Dict[str, str]:
+        """Source path (or bundle directory) -> fingerprinted path"""
+        self.build()
+        return dict(self._urls)
+
+    def lookup(self, served: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        self.build()
+        return self._assets.get(served)
+
+    def render_index(self) -> Tuple[str, Dict[str, bytes]]:
+        """index.html with its /static/ URLs fingerprinted, as (content digest, {encoding: body})"""
+        self.build()
+        if self._index is None:
+            with open(os.path.join(self.static_dir, "index.html"), encoding="utf-8") as f:
+                html = _HTML_URL.sub(lambda match: self.url(match.group(1)), f.read())
+            body = html.encode("utf-8")
+            bodies = {"identity": body}
+            for encoding, compress in self._compressors().items():
+                bodies[encoding] = compress(body)
+            self._index = (hashlib.sha256(body).hexdigest()[:16], bodies)
+        return self._index
+
+class FingerprintedStaticFiles(StaticFiles):
+    """StaticFiles that serves fingerprinted URLs from precompressed variants with immutable
+    caching; plain paths still work with ordinary revalidation"""
+
+    def __init__(self, assets: StaticAssets, **kwargs):
+        super().__init__(directory=assets.static_dir, **kwargs)
+        self.assets = assets
+
+    async def get_response(self, path: str, scope) -> Response:
+        if not self.assets.is_built:
+            await asyncio.to_thread(self.assets.build)
+        asset = self.assets.lookup(path.replace(os.sep, "/"))
+        if asset is None:
+            return await super().get_response(path, scope)
+
+        source, variants = asset
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        encoding = next((e for e in accepted_encodings(headers.get("accept-encoding", "")) if e in variants), None)
+        response_headers = {
+            "Cache-Control": f"public, max-age={Config.STATIC_CACHE_MAX_AGE}, immutable",
+            "Vary": "Accept-Encoding",
+            "ETag": f'"{path}-{encoding or "identity"}"'
+        }
+        if headers.get("if-none-match") == response_headers["ETag"]:
+            return Response(status_code=304, headers=response_headers)
+
+        media_type = mimetypes.guess_type(source)[0] or "application/octet-stream"
+        if encoding:
+            response_headers["Content-Encoding"] = encoding
+            return FileResponse(variants[encoding], media_type=media_type, headers=response_headers)
+        return FileResponse(source, media_type=media_type, headers=response_headers)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompress static assets ahead of deployment")
+    parser.add_argument("--static-dir", default="static")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    assets = StaticAssets(args.static_dir)
+    assets.build()
+    for path, served in sorted(assets.manifest().items()):
+        print(f"{path} -> {served}")
@@ -0,0 +1,275 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import hmac
+import itertools
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as StackCounter
+from typing import Dict, List, Any, Optional
+from config import Config
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+_current_root: contextvars.ContextVar = contextvars.ContextVar("current_root", default=None)
+
+class Span:
+    """One timed operation within a request's trace"""
+
+    __slots__ = ("name", "start", "end", "children", "error")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+        self.error: Optional[str] = None
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.end = time.perf_counter()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        end = self.end if self.end is not None else time.perf_counter()
+        data = {
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "children": [child.to_dict(origin) for child in self.children]
+        }
+        if self.error:
+            data["error"] = self.error
+        return data
+
+def _open_span(name: str):
+    """Start a child of the current span, or return None when no live request trace is active"""
+    parent = _current_span.get()
+    root = _current_root.get()
+    # Background tasks inherit the request context; don't grow a trace that's already stored
+    if parent is None or root is None or root.end is not None:
+        return None, None
+    span = Span(name)
+    parent.children.append(span)
+    return span, _current_span.set(span)
+
+def trace_method(obj: Any, name: str, span_name: str):
+    """Replace obj.name in place so each call inside a request records a span"""
+    original = getattr(obj, name)
+
+    if asyncio.iscoroutinefunction(original):
+        @functools.wraps(original)
+        async def wrapper(*args, **kwargs):
+            span, token = _open_span(span_name)
+            if span is None:
+                return await original(*args, **kwargs)
+            error = None
+            try:
+                return await original(*args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                span.finish(error)
+                _current_span.reset(token)
+    else:
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            span, token = _open_span(span_name)
+            if span is None:
+                return original(*args, **kwargs)
+            error = None
+            try:
+                return original(*args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                span.finish(error)
+                _current_span.reset(token)
+
+    setattr(obj, name, wrapper)
+
+class SamplingProfiler:
+    """Sample one thread's Python stack at a fixed interval into folded (flame graph) stacks"""
+
+    def __init__(self, thread_id: int, interval_ms: float):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.samples = StackCounter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self) -> str:
+        """Stop sampling and return stacks in the folded format used by flamegraph.pl and speedscope"""
+        self._stop.set()
+        self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+class TraceStore:
+    """Keep the slowest N request traces, plus captured CPU profiles"""
+
+    def __init__(self, capacity: int, profile_capacity: int):
+        self.capacity = capacity
+        self.profile_capacity = profile_capacity
+        self._heap: List = []  # min-heap of (duration_ms, seq, trace) so the fastest is evicted first
+        self._profiles: Dict[str, str] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def would_keep(self, duration_ms: float) -> bool:
+        """Cheap pre-check so fast requests don't pay for serializing their span tree"""
+        with self._lock:
+            return len(self._heap) < self.capacity or duration_ms > self._heap[0][0]
+
+    def add(self, trace: Dict[str, Any]):
+        entry = (trace["duration_ms"], next(self._seq), trace)
+        with self._lock:
+            if len(self._heap) < self.capacity:
+                heapq.heappush(self._heap, entry)
+            elif entry[0] > self._heap[0][0]:
+                heapq.heapreplace(self._heap, entry)
+
+    def add_profile(self, trace_id: str, folded: str):
+        with self._lock:
+            self._profiles[trace_id] = folded
+            while len(self._profiles) > self.profile_capacity:
+                self._profiles.pop(next(iter(self._profiles)))
+
+    def slowest(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = sorted(self._heap, key=lambda e: e[0], reverse=True)
+        return [entry[2] for entry in entries]
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for _, _, trace in self._heap:
+                if trace["trace_id"] == trace_id:
+                    return trace
+        return None
+
+    def get_profile(self, trace_id: str) -> Optional[str]:
+        with self._lock:
+            return self._profiles.get(trace_id)
+
+# Global trace store instance
+trace_store = TraceStore(Config.TRACE_SLOWEST_N, Config.PROFILE_KEEP_N)
+
+def debug_token_valid(token: Optional[str]) -> bool:
+    """Whether a client-supplied token unlocks traces and profiles; never without DEBUG_TOKEN"""
+    if not Config.DEBUG_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), Config.DEBUG_TOKEN.encode())
+
+class TracingMiddleware:
+    """ASGI middleware that records a span tree per request and profiles requests on demand.
+
+    With REQUEST_PROFILING on, send `X-Profile: 1` and the debug token in `X-Debug-Token` to
+    sample the event loop thread for the duration of that request; the response then
+    carries an `X-Profile-Url` header pointing at the folded stacks. The profile is
+    process-wide: it includes whatever else the event loop ran meanwhile.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/debug/"):
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = uuid.uuid4().hex
+        root = Span(f"{scope['method']} {scope['path']}")
+        span_token = _current_span.set(root)
+        root_token = _current_root.set(root)
+
+        profiler = None
+        headers = dict(scope.get("headers") or [])
+        if (Config.REQUEST_PROFILING and headers.get(b"x-profile", b"").lower() in (b"1", b"true")
+                and debug_token_valid(headers.get(b"x-debug-token", b"").decode("latin-1"))):
+            profiler = SamplingProfiler(threading.get_ident(), Config.PROFILE_SAMPLE_INTERVAL_MS)
+            profiler.start()
+
+        status = [500]
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                extra = [(b"x-trace-id", trace_id.encode())]
+                if profiler is not None:
+                    extra.append((b"x-profile-url", f"/debug/profiles/{trace_id}".encode()))
+                message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+
+        error = None
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            root.finish(error)
+            _current_span.reset(span_token)
+            _current_root.reset(root_token)
+            if profiler is not None:
+                trace_store.add_profile(trace_id, profiler.stop())
+            duration_ms = round((root.end - root.start) * 1000, 3)
+            if trace_store.would_keep(duration_ms):
+                trace_store.add({
+                    "trace_id": trace_id,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": getattr(scope.get("route"), "path", None),
+                    "status": status[0],
+                    "timestamp": time.time(),
+                    "duration_ms": duration_ms,
+                    "profiled": profiler is not None,
+                    "root": root.to_dict(root.start)
+                })
+
+# Spans recorded per service, as (method, span name)
+SERVICE_SPANS = {
+    "pdf_service": (("extract_text_from_pdf", "pdf.extract"), ("chunk_text", "pdf.chunk"),
+                    ("extract_text_from_area", "pdf.extract_area"), ("extract_text_from_areas", "pdf.extract_areas")),
+    "gemini_service": (("generate_embeddings", "embed.documents"), ("generate_query_embedding", "embed.query"),
+                       ("generate_text", "generate.text"), ("generate_text_with_image", "generate.image")),
+    "vector_service": (("add_documents", "vector.add"), ("upsert_documents", "vector.upsert"), ("search_similar", "vector.query"),
+                       ("search_by_metadata", "vector.get"), ("delete_document_chunks", "vector.delete"),
+                       ("delete_by_metadata", "vector.delete")),
+}
+# SQLite-backed services and their span name prefix
+SQLITE_SPAN_PREFIXES = {"db": "db", "text_storage": "text_storage", "chat_manager": "chat",
+                        "translation_cache": "translation_cache"}
+
+def trace_service(name: str, service: Any):
+    """Wrap one of the app's service objects in place as it is built so its calls show up as spans"""
+    for method, span_name in SERVICE_SPANS.get(name, ()):
+        trace_method(service, method, span_name)
+
+    if name == "gemini_service":
+        provider = service.provider
+        trace_method(provider, "embed", f"{provider.name}.embed")
+        trace_method(provider, "embed_batch", f"{provider.name}.embed_batch")
+        trace_method(provider, "generate", f"{provider.name}.generate")
+
+    if name in SQLITE_SPAN_PREFIXES:
+        prefix = SQLITE_SPAN_PREFIXES[name]
+        for method in dir(service):
+            if not method.startswith("_") and callable(getattr(service, method)):
+                trace_method(service, method, f"sqlite.{prefix}.{method}")
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import logging
+import re
+from typing import List, Dict, Any, Tuple
+from config import Config
+
+# Paragraph breaks are kept as separators so the translated text keeps its layout
+_PARAGRAPH_SPLIT = re.compile(r"(\n\s*\n)")
+# Sentence boundaries (Latin and CJK punctuation) for paragraphs that are too long
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?。！？])(\s+)")
+# Markers used to number segments inside a batched prompt
+_SEGMENT_MARKER = re.compile(r"\[\[(\d+)\]\]")
+
+class TranslationService:
+    """Segment text, serve repeated segments from cache and translate misses in concurrent batches"""
+
+    def __init__(self, gemini_service, cache):
+        self.gemini_service = gemini_service
+        self.cache = cache
+        self.max_segment_chars = Config.TRANSLATION_MAX_SEGMENT_CHARS
+        self.batch_chars = Config.TRANSLATION_BATCH_CHARS
+        self.batch_segments = Config.TRANSLATION_BATCH_SEGMENTS
+        self.concurrency = Config.TRANSLATION_CONCURRENCY
+
+    @staticmethod
+    def segment_hash(segment: str) -> str:
+        """Stable cache key for a segment"""
+        return hashlib.sha256(segment.encode("utf-8")).hexdigest()
+
+    def segment_text(self, text: str) -> List[Tuple[str, bool]]:
+        """Split text into (piece, is_segment) tuples; non-segment pieces are whitespace kept verbatim"""
+        pieces = []
+        for paragraph in _PARAGRAPH_SPLIT.split(text):
+            if not paragraph.strip():
+                if paragraph:
+                    pieces.append((paragraph, False))
+                continue
+
+            if len(paragraph) > self.max_segment_chars:
+                parts = _SENTENCE_SPLIT.split(paragraph)
+            else:
+                parts = [paragraph]
+
+            for part in parts:
+                stripped = part.strip()
+                if not stripped:
+                    if part:
+                        pieces.append((part, False))
+                    continue
+
+                # Keep surrounding whitespace out of the cache key
+                leading = part[:len(part) - len(part.lstrip())]
+                trailing = part[len(part.rstrip()):]
+                if leading:
+                    pieces.append((leading, False))
+                pieces.append((stripped, True))
+                if trailing:
+                    pieces.append((trailing, False))
+
+        return pieces
+
+    def _build_batches(self, segments: List[str]) -> List[List[str]]:
+        """Pack segments into batches bounded by character count and segment count"""
+        batches = []
+        current = []
+        current_chars = 0
+
+        for segment in segments:
+            if current and (current_chars + len(segment) > self.batch_chars
+                            or len(current) >= self.batch_segments):
+                batches.append(current)
+                current = []
+                current_chars = 0
+            current.append(segment)
+            current_chars += len(segment)
+
+        if current:
+            batches.append(current)
+
+        return batches
+
+    async def _translate_single(self, segment: str, target_language: str) -> str:
+        """Translate one segment with a plain prompt"""
+        prompt = f"Translate the following text into {target_language}:\n\n{segment}"
+        translated = await self.gemini_service.generate_text(prompt)
+        return translated.strip()
+
+    async def _translate_batch(self, batch: List[str], target_language: str) -> List[str]:
+        """Translate a batch of segments in one prompt, falling back to single calls for anything unparsed"""
+        if len(batch) == 1:
+            return [await self._translate_single(batch[0], target_language)]
+
+        numbered = "\n".join(f"[[{i + 1}]]\n{segment}" for i, segment in enumerate(batch))
+        prompt = (
+            f"Translate each numbered segment below into {target_language}.\n"
+            f"Reply with every segment's marker (e.g. [[1]]) on its own line followed by its translation, "
+            f"in the same order. Output only the markers and translations.\n\n{numbered}"
+        )
+        response = await self.gemini_service.generate_text(prompt)
+
+        # Split the response on markers: ['', '1', 'text', '2', 'text', ...]
+        parsed = {}
+        parts = _SEGMENT_MARKER.split(response)
+        for i in range(1, len(parts) - 1, 2):
+            index = int(parts[i]) - 1
+            translated = parts[i + 1].strip()
+            if 0 <= index < len(batch) and translated:
+                parsed[index] = translated
+
+        results = []
+        for i, segment in enumerate(batch):
+            if i in parsed:
+                results.append(parsed[i])
+            else:
+                logging.warning(f"Batched translation missed segment {i + 1}/{len(batch)}, retrying alone")
+                results.append(await self._translate_single(segment, target_language))
+        return results
+
+    async def translate_many(self, texts: List[str], target_language: str) -> Dict[str, Any]:
+        """Translate several texts, sharing the cache and batches across all of them"""
+        segmented = [self.segment_text(text) for text in texts]
+
+        # Unique segments across every text, in first-seen order
+        unique_segments = {}
+        for pieces in segmented:
+            for piece, is_segment in pieces:
+                if is_segment:
+                    unique_segments.setdefault(self.segment_hash(piece), piece)
+
+        cached = self.cache.get_many(list(unique_segments), target_language)
+        misses = [(h, s) for h, s in unique_segments.items() if h not in cached]
+
+        translations = dict(cached)
+        if misses:
+            batches = self._build_batches([segment for _, segment in misses])
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def run(batch):
+                async with semaphore:
+                    return await self._translate_batch(batch, target_language)
+
+            batch_results = await asyncio.gather(*(run(batch) for batch in batches))
+
+            new_entries = []
+            translated_iter = (t for results in batch_results for t in results)
+            for (segment_hash, segment), translated in zip(misses, translated_iter):
+                translations[segment_hash] = translated
+                new_entries.append((segment_hash, segment, translated))
+            self.cache.put_many(new_entries, target_language)
+
+            logging.info(f"Translated {len(misses)} segments in {len(batches)} batches "
+                         f"({len(cached)} cache hits)")
+
+        translated_texts = [
+            "".join(translations[self.segment_hash(piece)] if is_segment else piece
+                    for piece, is_segment in pieces)
+            for pieces in segmented
+        ]
+
+        return {
+            "translated_texts": translated_texts,
+            "total_segments": len(unique_segments),
+            "cache_hits": len(cached),
+            "segments_translated": len(misses)
+        }
+
+    async def translate(self, text: str, target_language: str) -> Dict[str, Any]:
+        """Translate a single text"""
+        result = await self.translate_many([text], target_language)
+        return {
+            "translated_text": result["translated_texts"][0],
+            "total_segments": result["total_segments"],
+            "cache_hits": result["cache_hits"],
+            "segments_translated": result["segments_translated"]
+        }
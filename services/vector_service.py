@@ -1,12 +1,14 @@
-import chromadb
-from chromadb.config import Settings
 from typing import List, Dict, Any, Optional
+import asyncio
 import uuid
 import logging
 from config import Config
 
 class VectorService:
     def __init__(self):
+        # chromadb pulls in onnxruntime and friends; import on construction rather than at startup
+        import chromadb
+        from chromadb.config import Settings
         self.client = chromadb.PersistentClient(
             path=Config.CHROMADB_PATH,
             settings=Settings(anonymized_telemetry=False)
@@ -30,12 +32,15 @@ class VectorService:
         try:
             document_ids = [str(uuid.uuid4()) for _ in texts]
             
-            self.collection.add(
-                documents=texts,
-                embeddings=embeddings,
-                metadatas=metadata,
-                ids=document_ids
-            )
+            # Chroma rejects batches over its max batch size (~5k with the default SQLite backend)
+            batch_size = self.client.get_max_batch_size()
+            for i in range(0, len(texts), batch_size):
+                self.collection.add(
+                    documents=texts[i:i + batch_size],
+                    embeddings=embeddings[i:i + batch_size],
+                    metadatas=metadata[i:i + batch_size],
+                    ids=document_ids[i:i + batch_size]
+                )
             
             logging.info(f"Added {len(texts)} documents to vector database")
             return document_ids
@@ -43,13 +48,35 @@ class VectorService:
             logging.error(f"Error adding documents to vector database: {e}")
             raise
     
+    async def upsert_documents(self, ids: List[str], texts: List[str], embeddings: List[List[float]],
+                               metadata: List[Dict[str, Any]]) -> List[str]:
+        """Insert or replace documents under caller-chosen IDs"""
+        try:
+            batch_size = self.client.get_max_batch_size()
+            for i in range(0, len(texts), batch_size):
+                self.collection.upsert(
+                    documents=texts[i:i + batch_size],
+                    embeddings=embeddings[i:i + batch_size],
+                    metadatas=metadata[i:i + batch_size],
+                    ids=ids[i:i + batch_size]
+                )
+            
+            logging.info(f"Upserted {len(texts)} documents to vector database")
+            return ids
+        except Exception as e:
+            logging.error(f"Error upserting documents to vector database: {e}")
+            raise
+    
     async def search_similar(self, query_embedding: List[float], 
-                           n_results: int = 5) -> Dict[str, Any]:
-        """Search for similar documents"""
+                           n_results: int = 5, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Search for similar documents, optionally only among those matching a metadata filter"""
         try:
-            results = self.collection.query(
+            # Off the event loop, so searches for several documents can run side by side
+            results = await asyncio.to_thread(
+                self.collection.query,
                 query_embeddings=[query_embedding],
                 n_results=n_results,
+                where=where,
                 include=["documents", "metadatas", "distances"]
             )
             
@@ -80,6 +107,46 @@ class VectorService:
             logging.error(f"Error searching by metadata: {e}")
             raise
     
+    async def get_chunks(self, where_clause: Dict[str, Any]) -> Dict[str, Any]:
+        """Get all matching chunks with their stored embeddings"""
+        try:
+            results = await asyncio.to_thread(
+                self.collection.get,
+                where=where_clause,
+                include=["documents", "metadatas", "embeddings"]
+            )
+            embeddings = results["embeddings"] if results["embeddings"] is not None else []
+            return {
+                "ids": results["ids"],
+                "documents": results["documents"],
+                "metadatas": results["metadatas"],
+                "embeddings": [list(embedding) for embedding in embeddings]
+            }
+        except Exception as e:
+            logging.error(f"Error getting chunks: {e}")
+            raise
+    
+    async def stored_dimension(self) -> Optional[int]:
+        """Length of the stored vectors, or None while the collection is empty"""
+        try:
+            results = self.collection.get(limit=1, include=["embeddings"])
+            embeddings = results["embeddings"]
+            if embeddings is None or len(embeddings) == 0:
+                return None
+            return len(embeddings[0])
+        except Exception as e:
+            logging.error(f"Error reading vector dimension: {e}")
+            raise
+    
+    async def delete_ids(self, ids: List[str]):
+        """Delete chunks by ID"""
+        try:
+            if ids:
+                self.collection.delete(ids=ids)
+        except Exception as e:
+            logging.error(f"Error deleting chunks by ID: {e}")
+            raise
+    
     async def delete_document_chunks(self, file_id: str):
         """Delete all chunks for a specific document"""
         try:
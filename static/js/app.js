@@ -1,3 +1,6 @@
+// Set by index.html; the server rewrites it to the fingerprinted CMap bundle
+const CMAP_URL = window.CMAP_URL || '/static/cmaps/';
+
 class LLMAssistant {
     constructor() {
         this.apiBaseUrl = 'http://localhost:8000';
@@ -197,7 +200,7 @@ class LLMAssistant {
         if (typeof pdfjsLib !== 'undefined') {
             pdfjsLib.GlobalWorkerOptions.workerSrc = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.worker.min.js';
             // Set cMapUrl for CJK font support
-            pdfjsLib.GlobalWorkerOptions.cMapUrl = '/static/cmaps/'; // Updated to local path
+            pdfjsLib.GlobalWorkerOptions.cMapUrl = CMAP_URL;
             pdfjsLib.GlobalWorkerOptions.cMapPacked = true;
         }
     }
@@ -895,11 +898,14 @@ You can upload more documents or start chatting! Use "Start Chat" for this docum
             // Reset scale for new document - will be adjusted in renderPage
             this.scale = 1.0;
 
-            // Load PDF using PDF.js
+            // Load PDF using PDF.js, fetching only the byte ranges the visible page needs
             const loadingTask = pdfjsLib.getDocument({
                 url: pdfUrl,
-                cMapUrl: '/static/cmaps/',
+                cMapUrl: CMAP_URL,
                 cMapPacked: true,
+                disableAutoFetch: true,
+                disableStream: true,
+                rangeChunkSize: 256 * 1024,
             });
             this.currentPdfDoc = await loadingTask.promise;
             this.totalPages = this.currentPdfDoc.numPages;